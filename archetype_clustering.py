@@ -0,0 +1,531 @@
+"""
+Archetype discovery by clustering similar decklists.
+
+Decklists matching none of `ARCHETYPE_RULES` are "unown", so a new archetype stays invisible until a rule is written
+for it. Here, the decklists are rows of a sparse card-count matrix, and similar decklists are grouped without
+comparing every pair:
+    1. every decklist becomes the set of the Pokémon it plays, and gets a MinHash signature: the share of equal values
+       of two signatures estimates the Jaccard similarity of the sets. Like the rules, only which Pokémon are played
+       makes the archetype: trainers, energies and the Pokémon played by most decklists are shared by every
+       archetype, and would make all the decklists look alike.
+    2. the signatures are cut into bands. Decklists with the same values in a band land in the same bucket, and are
+       linked to the first decklist of the bucket if their signatures are similar enough.
+    3. the connected components of the links are split around leaders: the most linked decklist of a component takes
+       every decklist of the component similar enough to it, then the most linked of the others, and so on. Links
+       alone would chain distinct archetypes sharing a Pokémon into one cluster.
+A cluster is described by its defining cards: the cards played by most of its decklists, and more than elsewhere.
+A cluster of mostly unown decklists is a new archetype candidate.
+
+Unown decklists can also be labelled by the nearest known archetype, by cosine similarity with the average
+decklist of every archetype.
+
+Cards are compared by name, so the same Pokémon from two sets counts as one card.
+
+Usage:
+    python archetype_clustering.py
+Proposes the clusters of the decklists of `RK9_URL_LIST`, and labels their unown decklists.
+"""
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+from archetype_parser import UNKNOWN_ARCHETYPE
+from card_catalog import CARD_ID_DTYPE, QUANTITY_DTYPE, PlayerRecord, card_catalog
+
+MINHASH_BANDS = 16
+MINHASH_ROWS_PER_BAND = 4
+# Copies of a card beyond this count as the same token. Like the rules, a Pokémon counts once, so archetypes told
+# apart by a single Pokémon are not merged by the copies of the Pokémon they share
+MAX_COPIES_PER_CARD = 1
+# Pokémon played by a bigger share of the decklists are staples, left out of the signatures
+MAX_SIGNATURE_CARD_SHARE = 0.5
+SIMILARITY_THRESHOLD = 0.5
+MIN_CLUSTER_SIZE = 5
+NB_DEFINING_CARDS = 8
+# Share of the decklists of a cluster a card must be played in to define it
+MIN_DEFINING_CARD_SHARE = 0.5
+# Share of the decklists of a cluster the known archetype must have to name it
+MIN_KNOWN_ARCHETYPE_SHARE = 0.25
+MIN_NEAREST_ARCHETYPE_SIMILARITY = 0.6
+# Number of decklists hashed at once, to bound the memory of the `(tokens, hashes)` array
+MINHASH_CHUNK_SIZE = 2048
+_HASH_PRIME = (1 << 31) - 1
+_POKEMON_NAME_SUFFIXES = re.compile(r"\s+(ex|EX|GX|V|VSTAR|VMAX|V-UNION)$")
+
+
+class CardCountMatrix:
+    """
+    The quantity of every card in every decklist, as a sparse matrix in CSR form: the cards of decklist i are the
+    elements `indptr[i]` to `indptr[i + 1]` of `card_indices` and `counts`.
+    """
+
+    def __init__(self, indptr: np.ndarray, card_indices: np.ndarray, counts: np.ndarray,
+                 cardname_list: List[str], is_pokemon_list: List[bool]):
+        """
+        Args:
+            indptr (np.ndarray): The `(nb_decklists + 1,)` offsets of the decklists.
+            card_indices (np.ndarray): The column of every element, an index in cardname_list.
+            counts (np.ndarray): The quantity of every element.
+            cardname_list (List[str]): The name of the card of every column.
+            is_pokemon_list (List[bool]): Whether the card of every column is a Pokémon.
+        """
+        self.indptr = indptr
+        self.card_indices = card_indices
+        self.counts = counts
+        self.cardname_list = cardname_list
+        self.is_pokemon_list = is_pokemon_list
+
+    @classmethod
+    def from_records(cls, record_list: List[PlayerRecord]) -> "CardCountMatrix":
+        """
+        Args:
+            record_list (List[PlayerRecord]): The decklists, one row each.
+
+        Returns:
+            CardCountMatrix: The matrix. Cards of the same name are one column.
+        """
+        column_per_cardname: Dict[str, int] = {}
+        is_pokemon_list = []
+        column_per_card_id = np.zeros(len(card_catalog), dtype=np.int64)
+        for card_id, (card_name, card_set, card_type) in enumerate(card_catalog.card_list):
+            column = column_per_cardname.get(card_name)
+            if column is None:
+                column = column_per_cardname[card_name] = len(column_per_cardname)
+                is_pokemon_list.append(card_type == "pokemon")
+            column_per_card_id[card_id] = column
+
+        indptr = np.zeros(len(record_list) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(record.card_ids) for record in record_list])
+        card_ids = np.concatenate(
+            [np.frombuffer(record.card_ids, dtype=CARD_ID_DTYPE) for record in record_list] or [np.zeros(0, int)]
+        )
+        quantities = np.concatenate(
+            [np.frombuffer(record.quantities, dtype=QUANTITY_DTYPE) for record in record_list] or [np.zeros(0, int)]
+        )
+        return cls(indptr, column_per_card_id[card_ids], quantities.astype(np.int64),
+                   list(column_per_cardname.keys()), is_pokemon_list)
+
+    @property
+    def nb_decklists(self) -> int:
+        return len(self.indptr) - 1
+
+    @property
+    def nb_cards(self) -> int:
+        return len(self.cardname_list)
+
+    def get_row_indices(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The decklist of every element.
+        """
+        return np.repeat(np.arange(self.nb_decklists), np.diff(self.indptr))
+
+    def select_cards(self, card_mask: np.ndarray) -> "CardCountMatrix":
+        """
+        Args:
+            card_mask (np.ndarray): Whether every column is kept.
+
+        Returns:
+            CardCountMatrix: The same decklists with only the kept cards. The columns do not change.
+        """
+        is_kept = card_mask[self.card_indices]
+        indptr = np.zeros(self.nb_decklists + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(self.get_row_indices()[is_kept], minlength=self.nb_decklists))
+        return CardCountMatrix(indptr, self.card_indices[is_kept], self.counts[is_kept],
+                               self.cardname_list, self.is_pokemon_list)
+
+    def get_normalized_counts(self) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The counts divided by the norm of their row, for cosine similarities.
+        """
+        row_norms = np.sqrt(np.bincount(self.get_row_indices(), weights=self.counts ** 2,
+                                        minlength=self.nb_decklists))
+        return self.counts / np.maximum(row_norms, 1e-12)[self.get_row_indices()]
+
+
+class ArchetypeCluster(NamedTuple):
+    """
+    Decklists similar enough to be an archetype.
+    """
+    decklist_indices: np.ndarray
+    # (cardname, share of the decklists of the cluster playing it, average quantity when played)
+    defining_cards: List[Tuple[str, float, float]]
+    archetype_counter: Counter
+    proposed_archetype: str
+
+
+def get_signature_card_mask(matrix: CardCountMatrix,
+                            max_card_share: float = MAX_SIGNATURE_CARD_SHARE) -> np.ndarray:
+    """
+    Args:
+        matrix (CardCountMatrix): The decklists.
+        max_card_share (float, optional): Pokémon played by a bigger share of the decklists are left out.
+
+    Returns:
+        np.ndarray: Whether every card tells the archetype of a decklist: the Pokémon that are not staples.
+    """
+    card_share = np.bincount(matrix.card_indices, minlength=matrix.nb_cards) / max(matrix.nb_decklists, 1)
+    return np.array(matrix.is_pokemon_list, dtype=bool).reshape(-1) & (card_share <= max_card_share)
+
+
+def compute_minhash_signatures(matrix: CardCountMatrix,
+                               nb_hashes: int = MINHASH_BANDS * MINHASH_ROWS_PER_BAND,
+                               seed: int = 0) -> np.ndarray:
+    """
+    Args:
+        matrix (CardCountMatrix): The decklists.
+        nb_hashes (int, optional): The length of the signatures.
+        seed (int, optional): The seed drawing the hash functions.
+
+    Returns:
+        np.ndarray: The `(nb_decklists, nb_hashes)` MinHash signatures of the `(card, copy)` tokens of the decklists.
+            Empty decklists get the maximum value everywhere.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _HASH_PRIME, nb_hashes, dtype=np.int64)
+    b = rng.integers(0, _HASH_PRIME, nb_hashes, dtype=np.int64)
+
+    # Token (card, copy) for every copy of every card, up to MAX_COPIES_PER_CARD
+    nb_copies = np.minimum(matrix.counts, MAX_COPIES_PER_CARD)
+    element_indices = np.repeat(np.arange(len(nb_copies)), nb_copies)
+    copy_indices = np.arange(len(element_indices)) - np.repeat(np.cumsum(nb_copies) - nb_copies, nb_copies)
+    tokens = matrix.card_indices[element_indices] * MAX_COPIES_PER_CARD + copy_indices
+    token_indptr = np.zeros(matrix.nb_decklists + 1, dtype=np.int64)
+    token_indptr[1:] = np.cumsum(np.bincount(matrix.get_row_indices()[element_indices], minlength=matrix.nb_decklists))
+
+    signatures = np.full((matrix.nb_decklists, nb_hashes), _HASH_PRIME, dtype=np.int64)
+    for start in range(0, matrix.nb_decklists, MINHASH_CHUNK_SIZE):
+        end = min(start + MINHASH_CHUNK_SIZE, matrix.nb_decklists)
+        chunk_tokens = tokens[token_indptr[start]:token_indptr[end]]
+        if len(chunk_tokens) == 0:
+            continue
+        hashes = (chunk_tokens[:, None] * a[None, :] + b[None, :]) % _HASH_PRIME
+        chunk_indptr = token_indptr[start:end + 1] - token_indptr[start]
+        is_non_empty = chunk_indptr[1:] > chunk_indptr[:-1]
+        signatures[start:end][is_non_empty] = np.minimum.reduceat(hashes, chunk_indptr[:-1][is_non_empty], axis=0)
+    return signatures
+
+
+def find_similar_pairs(signatures: np.ndarray,
+                       nb_bands: int = MINHASH_BANDS,
+                       similarity_threshold: float = SIMILARITY_THRESHOLD) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Links decklists sharing a band of their signatures, by locality-sensitive hashing. Every decklist of a bucket is
+    compared with the first decklist of the bucket only, so big buckets cost linear time. Empty decklists are not
+    linked.
+
+    Args:
+        signatures (np.ndarray): The `(nb_decklists, nb_hashes)` signatures, nb_hashes divisible by nb_bands.
+        nb_bands (int, optional): The number of bands.
+        similarity_threshold (float, optional): The minimum share of equal signature values to link two decklists.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The indices of the two decklists of every link.
+    """
+    nb_decklists = len(signatures)
+    is_empty = (signatures == _HASH_PRIME).all(axis=1)
+    first_list, second_list = [], []
+    for band in np.split(signatures, nb_bands, axis=1):
+        _, bucket_indices = np.unique(band, axis=0, return_inverse=True)
+        bucket_indices = bucket_indices.reshape(-1)
+        # The first decklist of every bucket leads it
+        leader_per_bucket = np.full(bucket_indices.max(initial=-1) + 1, nb_decklists, dtype=np.int64)
+        np.minimum.at(leader_per_bucket, bucket_indices, np.arange(nb_decklists))
+        leaders = leader_per_bucket[bucket_indices]
+        is_follower = (leaders != np.arange(nb_decklists)) & ~is_empty
+        followers, leaders = np.flatnonzero(is_follower), leaders[is_follower]
+        similarities = (signatures[followers] == signatures[leaders]).mean(axis=1)
+        is_similar = similarities >= similarity_threshold
+        first_list.append(followers[is_similar])
+        second_list.append(leaders[is_similar])
+    if not first_list:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(first_list), np.concatenate(second_list)
+
+
+def get_connected_components(nb_nodes: int, first_indices: np.ndarray, second_indices: np.ndarray) -> np.ndarray:
+    """
+    Args:
+        nb_nodes (int): The number of nodes.
+        first_indices (np.ndarray): The first node of every link.
+        second_indices (np.ndarray): The second node of every link.
+
+    Returns:
+        np.ndarray: The component of every node, as the smallest node of the component.
+    """
+    labels = np.arange(nb_nodes)
+    while True:
+        previous_labels = labels.copy()
+        link_labels = np.minimum(labels[first_indices], labels[second_indices])
+        np.minimum.at(labels, first_indices, link_labels)
+        np.minimum.at(labels, second_indices, link_labels)
+        # Pointer jumping: every node takes the label of its label
+        labels = labels[labels]
+        if np.array_equal(labels, previous_labels):
+            return labels
+
+
+def split_around_leaders(signatures: np.ndarray,
+                         decklist_indices: np.ndarray,
+                         first_indices: np.ndarray,
+                         second_indices: np.ndarray,
+                         similarity_threshold: float = SIMILARITY_THRESHOLD,
+                         min_cluster_size: int = MIN_CLUSTER_SIZE) -> List[np.ndarray]:
+    """
+    Splits a connected component into clusters whose decklists are all similar to the leader of their cluster.
+    The most linked decklist leads the first cluster, then the most linked of the decklists left, until a leader
+    gathers fewer than min_cluster_size decklists.
+
+    Args:
+        signatures (np.ndarray): The signatures of all the decklists.
+        decklist_indices (np.ndarray): The decklists of the component.
+        first_indices (np.ndarray): The first decklist of every link of the component.
+        second_indices (np.ndarray): The second decklist of every link of the component.
+        similarity_threshold (float, optional): The minimum estimated similarity with the leader.
+        min_cluster_size (int, optional): Smaller clusters are left out.
+
+    Returns:
+        List[np.ndarray]: The decklists of every cluster, the first found first.
+    """
+    cluster_list = []
+    is_left = np.zeros(len(signatures), dtype=bool)
+    is_left[decklist_indices] = True
+    while is_left.sum() >= min_cluster_size:
+        is_left_link = is_left[first_indices] & is_left[second_indices]
+        nb_links = np.bincount(np.concatenate((first_indices[is_left_link], second_indices[is_left_link])),
+                               minlength=len(signatures))
+        left_indices = np.flatnonzero(is_left)
+        leader = left_indices[np.argmax(nb_links[left_indices])]
+        similarities = (signatures[left_indices] == signatures[leader]).mean(axis=1)
+        cluster_indices = left_indices[similarities >= similarity_threshold]
+        if len(cluster_indices) < min_cluster_size:
+            break
+        cluster_list.append(cluster_indices)
+        is_left[cluster_indices] = False
+    return cluster_list
+
+
+def get_defining_cards(matrix: CardCountMatrix, decklist_indices: np.ndarray,
+                       nb_defining_cards: int = NB_DEFINING_CARDS) -> List[Tuple[str, float, float]]:
+    """
+    The cards played by most of the decklists of a cluster, and more than by the other decklists.
+
+    Args:
+        matrix (CardCountMatrix): All the decklists.
+        decklist_indices (np.ndarray): The decklists of the cluster.
+        nb_defining_cards (int, optional): The number of cards to return.
+
+    Returns:
+        List[Tuple[str, float, float]]: `(cardname, share of the decklists of the cluster playing it,
+            average quantity when played)`, the most defining first.
+    """
+    row_indices = matrix.get_row_indices()
+    is_in_cluster = np.zeros(matrix.nb_decklists, dtype=bool)
+    is_in_cluster[decklist_indices] = True
+    element_in_cluster = is_in_cluster[row_indices]
+
+    nb_decklists_per_card = np.bincount(matrix.card_indices, minlength=matrix.nb_cards)
+    nb_cluster_decklists_per_card = np.bincount(matrix.card_indices[element_in_cluster], minlength=matrix.nb_cards)
+    quantity_per_card = np.bincount(matrix.card_indices[element_in_cluster], weights=matrix.counts[element_in_cluster],
+                                    minlength=matrix.nb_cards)
+    share_in_cluster = nb_cluster_decklists_per_card / max(len(decklist_indices), 1)
+    nb_other_decklists = max(matrix.nb_decklists - len(decklist_indices), 1)
+    share_elsewhere = (nb_decklists_per_card - nb_cluster_decklists_per_card) / nb_other_decklists
+
+    score = share_in_cluster * (share_in_cluster - share_elsewhere)
+    card_indices = [
+        card_index for card_index in np.argsort(-score)
+        if score[card_index] > 0 and share_in_cluster[card_index] >= MIN_DEFINING_CARD_SHARE
+    ][:nb_defining_cards]
+    return [
+        (matrix.cardname_list[card_index], float(share_in_cluster[card_index]),
+         float(quantity_per_card[card_index] / nb_cluster_decklists_per_card[card_index]))
+        for card_index in card_indices
+    ]
+
+
+def _get_pokemon_slug(cardname: str) -> str:
+    """
+    Args:
+        cardname (str): The name of a Pokémon card, e.g. "Roaring Moon ex".
+
+    Returns:
+        str: The name as in the archetypes of the rules, e.g. "roaring-moon".
+    """
+    cardname = _POKEMON_NAME_SUFFIXES.sub("", cardname)
+    return re.sub(r"[^a-z0-9]+", "-", cardname.lower()).strip("-")
+
+
+def _propose_archetype(matrix: CardCountMatrix, defining_cards: List[Tuple[str, float, float]],
+                       archetype_counter: Counter) -> str:
+    """
+    Returns:
+        str: The most common known archetype of a cluster if it has enough of its decklists, or a name made of its
+            two most defining Pokémon.
+    """
+    unown = ", ".join(UNKNOWN_ARCHETYPE)
+    known_archetype_counter = Counter({
+        archetype: count for archetype, count in archetype_counter.items() if archetype != unown
+    })
+    if known_archetype_counter:
+        archetype, count = known_archetype_counter.most_common(1)[0]
+        if count >= MIN_KNOWN_ARCHETYPE_SHARE * sum(archetype_counter.values()):
+            return archetype
+    card_index = {cardname: index for index, cardname in enumerate(matrix.cardname_list)}
+    pokemon_list = [
+        _get_pokemon_slug(cardname) for cardname, _, _ in defining_cards if matrix.is_pokemon_list[card_index[cardname]]
+    ]
+    return ", ".join(list(dict.fromkeys(pokemon_list))[:2]) or "unknown"
+
+
+def propose_archetype_clusters(matrix: CardCountMatrix,
+                               archetype_list: List[List[str]],
+                               similarity_threshold: float = SIMILARITY_THRESHOLD,
+                               min_cluster_size: int = MIN_CLUSTER_SIZE,
+                               seed: int = 0) -> List[ArchetypeCluster]:
+    """
+    Groups decklists with similar Pokémon into clusters.
+
+    Args:
+        matrix (CardCountMatrix): The decklists.
+        archetype_list (List[List[str]]): The archetype of every decklist given by the rules.
+        similarity_threshold (float, optional): The minimum estimated similarity to link two decklists.
+        min_cluster_size (int, optional): Smaller clusters are left out.
+        seed (int, optional): The seed of the MinHash functions.
+
+    Returns:
+        List[ArchetypeCluster]: The clusters, the biggest first.
+    """
+    signatures = compute_minhash_signatures(matrix.select_cards(get_signature_card_mask(matrix)), seed=seed)
+    first_indices, second_indices = find_similar_pairs(signatures, similarity_threshold=similarity_threshold)
+    labels = get_connected_components(matrix.nb_decklists, first_indices, second_indices)
+
+    unique_labels, component_sizes = np.unique(labels, return_counts=True)
+    decklist_indices_list = []
+    for label in unique_labels[component_sizes >= min_cluster_size]:
+        is_component_link = labels[first_indices] == label
+        decklist_indices_list += split_around_leaders(
+            signatures, np.flatnonzero(labels == label), first_indices[is_component_link],
+            second_indices[is_component_link], similarity_threshold, min_cluster_size,
+        )
+
+    cluster_list = []
+    for decklist_indices in sorted(decklist_indices_list, key=len, reverse=True):
+        defining_cards = get_defining_cards(matrix, decklist_indices)
+        archetype_counter = Counter(", ".join(archetype_list[index]) for index in decklist_indices)
+        cluster_list.append(ArchetypeCluster(
+            decklist_indices, defining_cards, archetype_counter,
+            _propose_archetype(matrix, defining_cards, archetype_counter),
+        ))
+    return cluster_list
+
+
+def label_unown_decklists(matrix: CardCountMatrix,
+                          archetype_list: List[List[str]],
+                          min_similarity: float = MIN_NEAREST_ARCHETYPE_SIMILARITY) -> List[List[str]]:
+    """
+    Labels the unown decklists by the known archetype whose average decklist is the most similar, by cosine
+    similarity. Decklists too far from every archetype stay unown.
+
+    Args:
+        matrix (CardCountMatrix): The decklists.
+        archetype_list (List[List[str]]): The archetype of every decklist given by the rules.
+        min_similarity (float, optional): The minimum cosine similarity to take the archetype.
+
+    Returns:
+        List[List[str]]: The archetype of every decklist, with the unown decklists labelled.
+    """
+    joined_archetype_list = [", ".join(archetype) for archetype in archetype_list]
+    known_archetype_list = sorted(set(joined_archetype_list) - {", ".join(UNKNOWN_ARCHETYPE)})
+    if not known_archetype_list:
+        return [list(archetype) for archetype in archetype_list]
+    known_archetype_index = {archetype: index for index, archetype in enumerate(known_archetype_list)}
+    archetype_index_per_decklist = np.array(
+        [known_archetype_index.get(archetype, -1) for archetype in joined_archetype_list], dtype=np.int64
+    )
+
+    row_indices = matrix.get_row_indices()
+    normalized_counts = matrix.get_normalized_counts()
+    element_archetype_indices = archetype_index_per_decklist[row_indices]
+    is_known = element_archetype_indices >= 0
+    centroids = np.zeros((len(known_archetype_list), matrix.nb_cards))
+    np.add.at(centroids, (element_archetype_indices[is_known], matrix.card_indices[is_known]),
+              normalized_counts[is_known])
+    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+    unown_indices = np.flatnonzero(archetype_index_per_decklist < 0)
+    is_unown_element = archetype_index_per_decklist[row_indices] < 0
+    # Similarity of every unown decklist with every centroid: sum over its cards of count * centroid weight
+    similarities = np.zeros((matrix.nb_decklists, len(known_archetype_list)))
+    np.add.at(similarities, row_indices[is_unown_element],
+              normalized_counts[is_unown_element, None] * centroids[:, matrix.card_indices[is_unown_element]].T)
+
+    labelled_archetype_list = [list(archetype) for archetype in archetype_list]
+    for index in unown_indices:
+        best_index = int(similarities[index].argmax())
+        if similarities[index, best_index] >= min_similarity:
+            labelled_archetype_list[index] = known_archetype_list[best_index].split(", ")
+    return labelled_archetype_list
+
+
+def load_season_decklists(url_list: List[str]) -> Tuple[List[Tuple[str, str]], List[PlayerRecord], List[List[str]]]:
+    """
+    Args:
+        url_list (List[str]): List of RK9 URLs.
+
+    Returns:
+        Tuple[List[Tuple[str, str]], List[PlayerRecord], List[List[str]]]: The `(tournament_url, playername)`,
+            the decklist and the archetype of every player with a valid decklist.
+    """
+    from generate_matchup_table import (
+        get_archetype_per_player_from_tournament_url,
+        get_decklist_database_from_tournament_url,
+    )
+
+    player_list, record_list, archetype_list = [], [], []
+    for url in url_list:
+        decklist_database = get_decklist_database_from_tournament_url(url)
+        archetype_per_player = get_archetype_per_player_from_tournament_url(url, decklist_database)
+        for playername, record in decklist_database["player_record_per_player"].items():
+            player_list.append((url, playername))
+            record_list.append(record)
+            archetype_list.append(archetype_per_player[playername])
+    return player_list, record_list, archetype_list
+
+
+def print_clusters(cluster_list: List[ArchetypeCluster], only_unown: bool = False) -> None:
+    """
+    Args:
+        cluster_list (List[ArchetypeCluster]): The clusters to print.
+        only_unown (bool, optional): Print only the clusters whose proposed archetype is not a known one.
+    """
+    for cluster in cluster_list:
+        is_new = cluster.proposed_archetype not in cluster.archetype_counter
+        if only_unown and not is_new:
+            continue
+        print(f"{cluster.proposed_archetype}{' (new)' if is_new else ''}: {len(cluster.decklist_indices)} decklists, "
+              f"labelled {dict(cluster.archetype_counter.most_common(3))}")
+        for cardname, share, average_quantity in cluster.defining_cards:
+            print(f"    {share:4.0%} x{average_quantity:.1f} {cardname}")
+
+
+if __name__ == "__main__":
+    from generate_matchup_table import RK9_URL_LIST
+
+    player_list, record_list, archetype_list = load_season_decklists(RK9_URL_LIST)
+    matrix = CardCountMatrix.from_records(record_list)
+    print(f"Clustering {matrix.nb_decklists} decklists...")
+    print_clusters(propose_archetype_clusters(matrix, archetype_list))
+
+    labelled_archetype_list = label_unown_decklists(matrix, archetype_list)
+    unown = list(UNKNOWN_ARCHETYPE)
+    nb_unown = sum(archetype == unown for archetype in archetype_list)
+    nb_labelled = sum(archetype == unown and labelled != unown
+                      for archetype, labelled in zip(archetype_list, labelled_archetype_list))
+    print(f"{nb_labelled} of the {nb_unown} unown decklists labelled by their nearest archetype:")
+    for (url, playername), archetype, labelled in zip(player_list, archetype_list, labelled_archetype_list):
+        if archetype == unown and labelled != unown:
+            print(f"    {playername} ({url}): {', '.join(labelled)}")
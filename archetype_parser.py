@@ -3,7 +3,12 @@ decklist_parser.py
 
 This module provides utility functions for analyzing a decklist and determining archetypes
 based on the cards it contains. It supports checking for the presence and quantity of cards
-in a decklist, as well as parsing decklists into archetypes using predefined logic.
+in a decklist, as well as parsing decklists into archetypes using predefined rules.
+
+The rules are data, in `ARCHETYPE_RULES`: a rule gives the archetype of a decklist containing at least a minimum
+quantity of each of its cards. The first matching rule, by priority, wins. A card of a rule matches every card of
+the decklist whose name contains it, e.g. "Roaring Moon" also matches "Roaring Moon ex TEF 124".
+The rules are compiled once into an `ArchetypeClassifier`, which classifies whole batches of decklists.
 
 Functions:
     is_in_decklist(cardname: str, decklist: List[Tuple[str, int]]) -> bool:
@@ -12,12 +17,21 @@ Functions:
     is_in_decklist_with_quantity(cardname: str, quantity: int, decklist: List[Tuple[str, int]]) -> bool:
         Checks if a card is present in the decklist with at least the specified quantity.
 
-    contains(decklist: List[Tuple[str, int]], *card_list: str) -> bool:
-        Checks if all specified cards are present in the decklist.
+    classify_decklists(decklist_list: List[List[Tuple[str, int]]]) -> List[List[str]]:
+        Determines the archetype of every decklist of a batch.
+
+    classify_player_records(record_list: List[PlayerRecord]) -> List[List[str]]:
+        Same as `classify_decklists`, for the compact decklists of the card catalog, all at once with NumPy.
 
     parse_decklist_into_archetype(decklist: List[Tuple[str, int]]) -> List[str]:
         Parses a decklist to determine its archetype(s) based on included cards.
 
+    parse_decklist_into_archetype_reference(decklist: List[Tuple[str, int]]) -> List[str]:
+        Same as `parse_decklist_into_archetype`, by evaluating the rules one by one. Used to check the classifier.
+
+    get_rules_version() -> str:
+        Identifies the current archetype rules, so that archetypes computed with older rules can be detected.
+
 Example Usage:
     decklist = [
         ("Charizard ex", 2),
@@ -25,14 +39,60 @@ Example Usage:
         ("Snorlax PGO", 3),
     ]
     archetypes = parse_decklist_into_archetype(decklist)
-    print(archetypes)  # Output: ['charizard', 'pidgeot']
+    print(archetypes)  # Output: ['charizard']
 
 Dependencies:
     - Python 3.5+
     - typing module for type hints (List, Tuple)
 """
 
-from typing import List, Tuple
+import hashlib
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+import instrumentation
+from card_catalog import CARD_ID_DTYPE, QUANTITY_DTYPE, PlayerRecord, card_catalog
+
+UNKNOWN_ARCHETYPE = ["unown"]
+
+
+class ArchetypeRule(NamedTuple):
+    """
+    A decklist containing at least `quantity` copies of every `(cardname, quantity)` of `cards` has the archetype
+    `archetype`, unless a rule with a lower `priority` matches first.
+    """
+    cards: Tuple[Tuple[str, int], ...]
+    archetype: Tuple[str, ...]
+    priority: int
+
+
+ARCHETYPE_RULES = [
+    ArchetypeRule((("Charizard ex", 2), ("Pidgeot ex", 1)), ("charizard",), 10),
+    ArchetypeRule((("Chien-Pao ex", 1),), ("chien-pao",), 20),
+    ArchetypeRule((("Gardevoir ex", 1), ("Drifloon", 1)), ("gardevoir",), 30),
+    ArchetypeRule((("Gardevoir ex", 1), ("Munkidori", 1)), ("gardevoir",), 30),
+    ArchetypeRule((("Roaring Moon ex", 1), ("Squawkabilly ex", 1)), ("roaring-moon", "squawkabilly"), 40),
+    ArchetypeRule((("Roaring Moon", 1), ("Dundunsparce", 1)), ("roaring-moon", "dundunsparce"), 50),
+    ArchetypeRule((("Wellspring Mask Ogerpon ex", 1), ("Noctowl", 1)), ("noctowl", "ogerpon-wellspring"), 60),
+    ArchetypeRule((("Ceruledge ex", 3),), ("ceruledge",), 70),
+    ArchetypeRule((("Roaring Moon", 1),), ("roaring-moon",), 80),
+    ArchetypeRule((("Mega Absol ex", 1), ("Mega Kangaskhan ex", 1)), ("absol-mega", "kangaskhan-mega"), 90),
+    ArchetypeRule((("Gholdengo ex", 1),), ("gholdengo",), 100),
+    ArchetypeRule((("Miraidon ex", 1), ("Joltik", 1)), ("miraidon", "joltik"), 110),
+    ArchetypeRule((("Dragapult ex", 1), ("Pidgeot ex", 1)), ("dragapult", "pidgeot"), 120),
+    ArchetypeRule((("Dragapult ex", 1), ("Dusknoir", 1)), ("dragapult", "dusknoir"), 130),
+    ArchetypeRule((("Raging Bolt ex", 1), ("Noctowl", 1)), ("raging-bolt", "noctowl"), 140),
+    ArchetypeRule((("Crustle", 3),), ("crustle",), 150),
+    ArchetypeRule((("Iron Thorns ex", 4),), ("iron-thorns",), 160),
+    ArchetypeRule((("Noivern ex", 1), ("Cornerstone Mask Ogerpon ex", 1)), ("ogerpon-cornerstone", "noivern"), 170),
+    ArchetypeRule((("Marnie's Grimmsnarl", 1), ("Froslass", 1)), ("grimmsnarl", "froslass"), 180),
+    ArchetypeRule((("Flareon ex", 1),), ("flareon",), 190),
+    ArchetypeRule((("N's Zoroark", 1), ("Reshiram", 1)), ("zoroark",), 200),
+    ArchetypeRule((("Milotic ex", 1), ("Cornerstone Mask Ogerpon ex", 1)), ("milotic",), 210),
+    ArchetypeRule((("Pidgeot ex", 1), ("Elgyem", 1), ("Mist Energy", 1)), ("pidgeot",), 220),
+]
 
 
 def is_in_decklist(cardname: str, decklist: List[Tuple[str, int]]) -> bool:
@@ -62,6 +122,205 @@ def is_in_decklist_with_quantity(cardname: str, quantity: int, decklist: List[Tu
     """
     return sum(quantity_ for cardname_, quantity_ in decklist if cardname in cardname_) >= quantity
 
+
+class ArchetypeClassifier:
+    """
+    The archetype rules compiled for batch classification.
+
+    Every distinct (card, quantity) condition of the rules gets a bit, and every rule becomes the bitmask of its
+    conditions. The cards of the rules each get an index, and the indices matched by a card name of a decklist are
+    computed once per distinct card name. Classifying a decklist then costs one pass over its cards to count the
+    quantity of each rule card, then one mask test per rule, instead of a substring scan of the decklist per
+    condition.
+    """
+
+    def __init__(self, rule_list: List[ArchetypeRule]):
+        """
+        Args:
+            rule_list (List[ArchetypeRule]): The rules to compile.
+        """
+        self.rule_list = sorted(rule_list, key=lambda rule: rule.priority)
+        self.condition_list = []
+        rule_cardname_indices = {}
+        condition_bits = {}
+
+        self.compiled_rule_list = []
+        for rule in self.rule_list:
+            rule_mask = 0
+            for cardname, quantity in rule.cards:
+                cardname_index = rule_cardname_indices.setdefault(cardname, len(rule_cardname_indices))
+                condition = (cardname_index, quantity)
+                if condition not in condition_bits:
+                    condition_bits[condition] = len(condition_bits)
+                    self.condition_list.append(condition)
+                rule_mask |= 1 << condition_bits[condition]
+            self.compiled_rule_list.append((rule_mask, list(rule.archetype)))
+        self.rule_cardname_list = list(rule_cardname_indices.keys())
+        self._rule_cardname_indices_per_cardname: Dict[str, Tuple[int, ...]] = {}
+
+        # The same, as arrays: the rule card and quantity of every condition, and the conditions of every rule
+        self.condition_cardname_indices = np.array([index for index, _ in self.condition_list], dtype=np.int64)
+        self.condition_quantities = np.array([quantity for _, quantity in self.condition_list], dtype=np.int64)
+        self.rule_condition_matrix = np.array([
+            [(rule_mask >> bit) & 1 for bit in range(len(self.condition_list))]
+            for rule_mask, _ in self.compiled_rule_list
+        ], dtype=np.int64).reshape(len(self.compiled_rule_list), len(self.condition_list))
+        self.nb_conditions_per_rule = self.rule_condition_matrix.sum(axis=1)
+        # Rule card indices of every card of the catalog, as `(card_id, rule_cardname_index)` pairs
+        self._nb_catalog_cards_indexed = 0
+        self._card_id_list: List[int] = []
+        self._rule_cardname_index_list: List[int] = []
+
+    def _get_rule_cardname_indices(self, cardname: str) -> Tuple[int, ...]:
+        """
+        Args:
+            cardname (str): The name of a card of a decklist.
+
+        Returns:
+            Tuple[int, ...]: The indices of the rule cards contained in this card name.
+        """
+        indices = self._rule_cardname_indices_per_cardname.get(cardname)
+        if indices is None:
+            indices = tuple(
+                index for index, rule_cardname in enumerate(self.rule_cardname_list) if rule_cardname in cardname
+            )
+            self._rule_cardname_indices_per_cardname[cardname] = indices
+        return indices
+
+    def get_condition_mask(self, decklist: List[Tuple[str, int]]) -> int:
+        """
+        Args:
+            decklist (List[Tuple[str, int]]): A list of (cardname, quantity) tuples representing the decklist.
+
+        Returns:
+            int: The bitmask of the conditions met by the decklist.
+        """
+        quantity_per_rule_cardname = [0] * len(self.rule_cardname_list)
+        for cardname, quantity in decklist:
+            for index in self._get_rule_cardname_indices(cardname):
+                quantity_per_rule_cardname[index] += quantity
+
+        condition_mask = 0
+        for bit, (cardname_index, quantity) in enumerate(self.condition_list):
+            if quantity_per_rule_cardname[cardname_index] >= quantity:
+                condition_mask |= 1 << bit
+        return condition_mask
+
+    def classify(self, decklist_list: List[List[Tuple[str, int]]]) -> List[List[str]]:
+        """
+        Determines the archetype of every decklist of a batch.
+
+        Args:
+            decklist_list (List[List[Tuple[str, int]]]): The decklists to classify.
+
+        Returns:
+            List[List[str]]: The archetype of every decklist, in the same order.
+        """
+        archetype_list = []
+        for decklist in decklist_list:
+            condition_mask = self.get_condition_mask(decklist)
+            for rule_mask, archetype in self.compiled_rule_list:
+                if condition_mask & rule_mask == rule_mask:
+                    archetype_list.append(list(archetype))
+                    break
+            else:
+                archetype_list.append(list(UNKNOWN_ARCHETYPE))
+        return archetype_list
+
+    def _get_rule_cardname_pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: The card ids of the catalog matching a rule card, and the index of the
+                rule card they match, one pair per match.
+        """
+        for card_id in range(self._nb_catalog_cards_indexed, len(card_catalog)):
+            for index in self._get_rule_cardname_indices(card_catalog.get_cardname(card_id)):
+                self._card_id_list.append(card_id)
+                self._rule_cardname_index_list.append(index)
+        self._nb_catalog_cards_indexed = len(card_catalog)
+        return np.array(self._card_id_list, dtype=np.int64), np.array(self._rule_cardname_index_list, dtype=np.int64)
+
+    def classify_records(self, record_list: List[PlayerRecord]) -> List[List[str]]:
+        """
+        Determines the archetype of every record of a batch, with array operations over the whole batch:
+        the quantity of every rule card in every decklist, then the conditions met, then the first rule met.
+
+        Args:
+            record_list (List[PlayerRecord]): The decklists to classify.
+
+        Returns:
+            List[List[str]]: The archetype of every decklist, in the same order.
+        """
+        if not record_list:
+            return []
+        nb_rule_cardnames = len(self.rule_cardname_list)
+        card_ids = np.concatenate([np.frombuffer(record.card_ids, dtype=CARD_ID_DTYPE) for record in record_list])
+        quantities = np.concatenate([np.frombuffer(record.quantities, dtype=QUANTITY_DTYPE) for record in record_list])
+        record_indices = np.repeat(np.arange(len(record_list)), [len(record.card_ids) for record in record_list])
+
+        # Every card line matching rule cards becomes one line per rule card it matches
+        pair_card_ids, pair_rule_cardname_indices = self._get_rule_cardname_pairs()
+        pair_order = np.argsort(pair_card_ids, kind="stable")
+        pair_card_ids, pair_rule_cardname_indices = pair_card_ids[pair_order], pair_rule_cardname_indices[pair_order]
+        pair_starts = np.searchsorted(pair_card_ids, card_ids, side="left")
+        nb_pairs = np.searchsorted(pair_card_ids, card_ids, side="right") - pair_starts
+        line_indices = np.repeat(np.arange(len(card_ids)), nb_pairs)
+        pair_indices = np.repeat(pair_starts - np.cumsum(nb_pairs) + nb_pairs, nb_pairs) + np.arange(len(line_indices))
+
+        quantity_per_rule_cardname = np.bincount(
+            record_indices[line_indices] * nb_rule_cardnames + pair_rule_cardname_indices[pair_indices],
+            weights=quantities[line_indices],
+            minlength=len(record_list) * nb_rule_cardnames,
+        ).reshape(len(record_list), nb_rule_cardnames)
+
+        is_condition_met = quantity_per_rule_cardname[:, self.condition_cardname_indices] >= self.condition_quantities
+        is_rule_met = is_condition_met.astype(np.int64) @ self.rule_condition_matrix.T == self.nb_conditions_per_rule
+        first_rule_indices = is_rule_met.argmax(axis=1)
+        return [
+            list(self.compiled_rule_list[rule_index][1]) if is_any_rule_met else list(UNKNOWN_ARCHETYPE)
+            for rule_index, is_any_rule_met in zip(first_rule_indices.tolist(), is_rule_met.any(axis=1).tolist())
+        ]
+
+
+@lru_cache(maxsize=None)
+def get_archetype_classifier() -> ArchetypeClassifier:
+    """
+    Returns:
+        ArchetypeClassifier: The classifier compiled from `ARCHETYPE_RULES`, compiled on first use.
+    """
+    return ArchetypeClassifier(ARCHETYPE_RULES)
+
+
+@instrumentation.timed("classify.batch")
+def classify_decklists(decklist_list: List[List[Tuple[str, int]]]) -> List[List[str]]:
+    """
+    Determines the archetype of every decklist of a batch.
+
+    Args:
+        decklist_list (List[List[Tuple[str, int]]]): The decklists to classify.
+
+    Returns:
+        List[List[str]]: The archetype of every decklist, in the same order.
+    """
+    instrumentation.count("decklists.classified", len(decklist_list))
+    return get_archetype_classifier().classify(decklist_list)
+
+
+@instrumentation.timed("classify.batch")
+def classify_player_records(record_list: List[PlayerRecord]) -> List[List[str]]:
+    """
+    Determines the archetype of every record of a batch.
+
+    Args:
+        record_list (List[PlayerRecord]): The decklists to classify, as records of the card catalog.
+
+    Returns:
+        List[List[str]]: The archetype of every decklist, in the same order.
+    """
+    instrumentation.count("decklists.classified", len(record_list))
+    return get_archetype_classifier().classify_records(record_list)
+
+
 def parse_decklist_into_archetype(decklist: List[Tuple[str, int]]) -> List[str]:
     """
     Parses a decklist to determine its archetype based on included cards.
@@ -72,60 +331,33 @@ def parse_decklist_into_archetype(decklist: List[Tuple[str, int]]) -> List[str]:
     Returns:
         List[str]: A list of strings representing the archetype(s) inferred from the decklist.
     """
-    def contains(*card_list: str) -> bool:
-        """
-        Checks if all specified cards are present in the decklist.
+    return classify_decklists([decklist])[0]
 
-        Args:
-            card_list (str): A list of card names to check.
 
-        Returns:
-            bool: True if all specified cards are in the decklist, False otherwise.
-        """
-        return all(is_in_decklist(card, decklist) for card in card_list)
-
-    if contains("Charizard ex", "Pidgeot ex") and is_in_decklist_with_quantity("Charizard ex", 2, decklist):
-        return ["charizard"]
-    if contains("Chien-Pao ex"):
-        return ["chien-pao"]
-    if contains("Gardevoir ex", "Drifloon") or contains("Gardevoir ex", "Munkidori"):
-        return ["gardevoir"]
-    if contains("Roaring Moon ex", "Squawkabilly ex"):
-        return ["roaring-moon", "squawkabilly"]
-    if contains("Roaring Moon", "Dundunsparce"):
-        return ["roaring-moon", "dundunsparce"]
-    if contains("Wellspring Mask Ogerpon ex", "Noctowl"):
-        return ["noctowl", "ogerpon-wellspring"]
-    if is_in_decklist_with_quantity("Ceruledge ex", 3, decklist):
-        return ["ceruledge"]
-    if contains("Roaring Moon"):
-        return ["roaring-moon"]
-    if contains("Mega Absol ex", "Mega Kangaskhan ex"):
-        return ["absol-mega", "kangaskhan-mega"]
-    if contains("Gholdengo ex"):
-        return ["gholdengo"]
-    if contains("Miraidon ex", "Joltik"):
-        return ["miraidon", "joltik"]
-    if contains("Dragapult ex", "Pidgeot ex"):
-        return ["dragapult", "pidgeot"]
-    if contains("Dragapult ex", "Dusknoir"):
-        return ["dragapult", "dusknoir"]
-    if contains("Raging Bolt ex", "Noctowl"):
-        return ["raging-bolt", "noctowl"]
-    if is_in_decklist_with_quantity("Crustle", 3, decklist):
-        return ["crustle"]
-    if is_in_decklist_with_quantity("Iron Thorns ex", 4, decklist):
-        return ["iron-thorns"]
-    if contains("Noivern ex", "Cornerstone Mask Ogerpon ex"):
-        return ["ogerpon-cornerstone", "noivern"]
-    if contains("Marnie's Grimmsnarl", "Froslass"):
-        return ["grimmsnarl", "froslass"]
-    if contains("Flareon ex"):
-        return ["flareon"]
-    if contains("N's Zoroark", "Reshiram"):
-        return ["zoroark"]
-    if contains("Milotic ex", "Cornerstone Mask Ogerpon ex"):
-        return ["milotic"]
-    if contains("Pidgeot ex", "Elgyem", "Mist Energy"):
-        return ["pidgeot"]
-    return ["unown"]
+def parse_decklist_into_archetype_reference(decklist: List[Tuple[str, int]]) -> List[str]:
+    """
+    Parses a decklist to determine its archetype by evaluating the rules one by one, without compiling them.
+    This is the straightforward definition of the rules, used to check `ArchetypeClassifier`.
+
+    Args:
+        decklist (List[Tuple[str, int]]): A list of (cardname, quantity) tuples representing the decklist.
+
+    Returns:
+        List[str]: A list of strings representing the archetype(s) inferred from the decklist.
+    """
+    for rule in sorted(ARCHETYPE_RULES, key=lambda rule: rule.priority):
+        if all(is_in_decklist_with_quantity(cardname, quantity, decklist) for cardname, quantity in rule.cards):
+            return list(rule.archetype)
+    return list(UNKNOWN_ARCHETYPE)
+
+
+@lru_cache(maxsize=None)
+def get_rules_version() -> str:
+    """
+    Identifies the current archetype rules by hashing `ARCHETYPE_RULES`.
+    Any edit of the rules gives a new version.
+
+    Returns:
+        str: The version of the archetype rules.
+    """
+    return hashlib.sha1(repr(ARCHETYPE_RULES).encode("utf-8")).hexdigest()
@@ -0,0 +1,226 @@
+"""
+Batch job building the artifacts of many tournaments at once.
+
+Running the scripts tournament after tournament waits for the pages of each tournament before asking for the
+next ones. Here, the pages of all the tournaments are fetched together, in two waves: the tournament and roster
+pages first, then every decklist and pairings page they link to. Every request goes through the one budget of
+requests in flight of `download_manager`, and a URL asked for again while it is being fetched is only fetched once.
+
+Artifacts already complete in the processed database are skipped: decklists never change once saved, and pairings
+are complete when none of the pages they were parsed from changed.
+
+Artifacts:
+    players: the decklist and archetype of every player, in the processed database.
+    pairings: the matches of every round, in the processed database.
+    matchup_table: the matchup table of all the tournaments, as a compact HTML page.
+    best_deck: the expected points of every archetype against the metagame of the tournaments.
+
+Usage:
+    python batch_runner.py [URL ...] [--url-file urls.txt] [--artifacts players pairings matchup_table best_deck]
+        [--concurrency 10] [--from-round 8] [--output matchups.html]
+Without URLs, the tournaments of `RK9_URL_LIST` are processed.
+"""
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import instrumentation
+from calculate_best_deck_of_tournament import get_repartition_of_archetypes
+from download_manager import NB_CONCURRENCY, download_urls, set_request_budget
+from generate_matchup_table import (
+    RK9_URL_LIST,
+    discover_pairing_rounds,
+    get_decklist_database_from_tournament_url,
+    get_decklist_url_per_player,
+    get_encoded_pairings,
+    get_matchup_table,
+    get_processed_database_path,
+    get_roster_url,
+    load_saved_pairings,
+    read_url_file,
+)
+from matchup_html import export_matchup_table_html
+from metagame_solver import MetagameSolver
+
+ARTIFACTS = ("players", "pairings", "matchup_table", "best_deck")
+MATCHUP_TABLE_PATH = "matchups.html"
+
+
+def get_tournament_artifacts(artifact_list: List[str]) -> List[str]:
+    """
+    Args:
+        artifact_list (List[str]): The artifacts wanted, among `ARTIFACTS`.
+
+    Returns:
+        List[str]: The artifacts needed from every tournament to build them: "players" and/or "pairings".
+    """
+    tournament_artifact_list = [artifact for artifact in ("players", "pairings") if artifact in artifact_list]
+    if "matchup_table" in artifact_list or "best_deck" in artifact_list:
+        tournament_artifact_list = ["players", "pairings"]
+    return tournament_artifact_list
+
+
+def get_missing_artifacts(url: str, tournament_artifact_list: List[str]) -> List[str]:
+    """
+    Checks what the processed database already has of a tournament.
+    Checking the pairings may revalidate the pages they were parsed from.
+
+    Args:
+        url (str): The URL of the tournament.
+        tournament_artifact_list (List[str]): The artifacts wanted from the tournament: "players" and/or "pairings".
+
+    Returns:
+        List[str]: The artifacts of the tournament that are missing or outdated.
+    """
+    missing_artifact_list = []
+    if "players" in tournament_artifact_list and not os.path.exists(get_processed_database_path(url, ".decklists.pkl")):
+        missing_artifact_list.append("players")
+    if "pairings" in tournament_artifact_list and load_saved_pairings(url) is None:
+        missing_artifact_list.append("pairings")
+    return missing_artifact_list
+
+
+def _get_pages_of_tournament(url: str, missing_artifact_list: List[str]) -> List[str]:
+    """
+    Args:
+        url (str): The URL of the tournament, whose tournament and roster pages are already downloaded.
+        missing_artifact_list (List[str]): The artifacts of the tournament to build.
+
+    Returns:
+        List[str]: The decklist and pairings pages needed to build them.
+    """
+    page_url_list = []
+    if "players" in missing_artifact_list:
+        page_url_list += get_decklist_url_per_player(url).values()
+    if "pairings" in missing_artifact_list:
+        round_url_list, match_list_per_embedded_round = discover_pairing_rounds(url)
+        page_url_list += [
+            round_url for round_index, round_url in enumerate(round_url_list)
+            if round_index not in match_list_per_embedded_round
+        ]
+    return page_url_list
+
+
+def run_batch(url_list: List[str],
+              artifact_list: List[str] = ARTIFACTS,
+              nb_concurrency: int = NB_CONCURRENCY,
+              from_round_n: int = 0,
+              output_path: str = MATCHUP_TABLE_PATH) -> Dict:
+    """
+    Builds the artifacts of a list of tournaments, fetching the pages of all of them together.
+
+    Args:
+        url_list (List[str]): List of RK9 URLs. Duplicates are ignored.
+        artifact_list (List[str], optional): The artifacts to build, among `ARTIFACTS`. Defaults to all of them.
+        nb_concurrency (int, optional): The maximum number of requests in flight, for the whole batch.
+        from_round_n (int, optional): Same as in `get_matchup_table`. Defaults to 0.
+        output_path (str, optional): The HTML file of the matchup table.
+
+    Returns:
+        Dict: What was built, as `{"skipped": [url], "failures": [url]}`, plus `"matchup_table"`
+            and `"score_per_archetype"` when asked for.
+    """
+    unknown_artifact_list = [artifact for artifact in artifact_list if artifact not in ARTIFACTS]
+    if unknown_artifact_list:
+        raise ValueError(f"Unknown artifacts: {unknown_artifact_list}. Expected some of {ARTIFACTS}")
+    # The same tournament given twice is processed, and counted in the matchup table, once
+    url_list = list(dict.fromkeys(url_list))
+    set_request_budget(nb_concurrency)
+    tournament_artifact_list = get_tournament_artifacts(artifact_list)
+
+    print(f"Checking the processed database for {len(url_list)} tournaments...")
+    with ThreadPoolExecutor(nb_concurrency) as executor:
+        missing_artifacts_per_url: Dict[str, List[str]] = dict(zip(
+            url_list, executor.map(lambda url: get_missing_artifacts(url, tournament_artifact_list), url_list)
+        ))
+    skipped_url_list = [url for url, missing_artifact_list in missing_artifacts_per_url.items()
+                        if not missing_artifact_list]
+    missing_artifacts_per_url = {url: missing_artifact_list
+                                 for url, missing_artifact_list in missing_artifacts_per_url.items()
+                                 if missing_artifact_list}
+    instrumentation.count("batch.tournaments_skipped", len(skipped_url_list))
+    print(f"{len(skipped_url_list)} tournaments already complete, {len(missing_artifacts_per_url)} to process")
+
+    failure_list = []
+    with instrumentation.stage("batch download"):
+        # Rosters are needed to know the decklists, and tournament pages to know the rounds
+        failure_list += download_urls(
+            [get_roster_url(url) for url, missing_artifact_list in missing_artifacts_per_url.items()
+             if "players" in missing_artifact_list]
+            + [url for url, missing_artifact_list in missing_artifacts_per_url.items()
+               if "pairings" in missing_artifact_list],
+            nb_concurrency,
+        )
+        page_url_list = []
+        for url, missing_artifact_list in missing_artifacts_per_url.items():
+            page_url_list += _get_pages_of_tournament(url, missing_artifact_list)
+        print(f"Downloading {len(page_url_list)} pages of {len(missing_artifacts_per_url)} tournaments...")
+        failure_list += download_urls(page_url_list, nb_concurrency)
+    if failure_list:
+        print(f"{len(failure_list)} pages could not be downloaded, they will be retried while parsing")
+
+    with instrumentation.stage("batch parse"):
+        for url, missing_artifact_list in missing_artifacts_per_url.items():
+            print(f"Parsing {', '.join(missing_artifact_list)} of {url}")
+            if "players" in missing_artifact_list:
+                get_decklist_database_from_tournament_url(url)
+            if "pairings" in missing_artifact_list:
+                get_encoded_pairings(url)
+
+    result = {"skipped": skipped_url_list, "failures": failure_list}
+    if "matchup_table" in artifact_list or "best_deck" in artifact_list:
+        with instrumentation.stage("batch matchup table"):
+            matchup_table = get_matchup_table(url_list, from_round_n=from_round_n)
+        result["matchup_table"] = matchup_table
+        if "matchup_table" in artifact_list:
+            export_matchup_table_html(matchup_table, output_path, title=f"Matchups of {len(url_list)} tournaments")
+            print(f"Matchup table saved in {output_path}")
+    if "best_deck" in artifact_list:
+        archetype_repartition = get_repartition_of_archetypes(url_list)
+        result["score_per_archetype"] = MetagameSolver(result["matchup_table"]).get_score_per_archetype(
+            archetype_repartition
+        )
+    return result
+
+
+def print_scores(score_per_archetype: Dict[str, float]) -> None:
+    """
+    Prints the archetypes from the best expected points to the worst.
+
+    Args:
+        score_per_archetype (Dict[str, float]): As returned by `MetagameSolver.get_score_per_archetype`.
+    """
+    score_list: List[Tuple[str, float]] = sorted(score_per_archetype.items(), key=lambda x: x[1], reverse=True)
+    print("archetype                 | score")
+    for archetype, score in score_list:
+        print(f"{archetype:25} |  {score:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="*", help="URLs of the tournaments.")
+    parser.add_argument("--url-file", help="Text file with one tournament URL per line.")
+    parser.add_argument("--artifacts", nargs="+", choices=ARTIFACTS, default=list(ARTIFACTS),
+                        help="Artifacts to build. Defaults to all of them.")
+    parser.add_argument("--concurrency", type=int, default=NB_CONCURRENCY,
+                        help="Maximum number of requests in flight, for the whole batch.")
+    parser.add_argument("--from-round", type=int, default=8, help="Only the rounds before this one are counted.")
+    parser.add_argument("--output", default=MATCHUP_TABLE_PATH, help="HTML file of the matchup table.")
+    args = parser.parse_args()
+
+    url_list = list(args.urls)
+    if args.url_file is not None:
+        url_list += read_url_file(args.url_file)
+    if not url_list:
+        url_list = RK9_URL_LIST
+
+    with instrumentation.profile(instrumentation.get_profile_path()):
+        result = run_batch(url_list, args.artifacts, args.concurrency, args.from_round, args.output)
+    if "score_per_archetype" in result:
+        print_scores(result["score_per_archetype"])
+    instrumentation.dump_json("instrumentation.json")
+
+
+if __name__ == "__main__":
+    main()
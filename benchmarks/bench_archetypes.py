@@ -0,0 +1,156 @@
+"""
+Benchmark of the archetype classifier of `archetype_parser`.
+
+Random decklists are built from the cards of the archetype rules and filler cards. The script checks that the
+compiled classifier, its NumPy path over card catalog records used by `classify_player_records`, and the rules
+evaluated one by one give the same archetype as `parse_decklist_into_archetype` before the rules were written as data,
+frozen here as `parse_decklist_into_archetype_baseline`, and prints the throughput of all four. The baseline does not read `ARCHETYPE_RULES`, so a mistake in the rules shows as a mismatch:
+when the rules change on purpose, change the baseline the same way.
+
+Usage:
+    python benchmarks/bench_archetypes.py [nb_decklists]
+"""
+import os
+import random
+import sys
+import time
+from typing import List, Tuple
+
+# Adding the parent directory to the sys.path, like the scripts of `mischief`.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from archetype_parser import (
+    ARCHETYPE_RULES,
+    ArchetypeClassifier,
+    classify_player_records,
+    parse_decklist_into_archetype_reference,
+)
+from card_catalog import PlayerRecord
+
+FILLER_CARDS = [
+    "Iono", "Boss's Orders", "Ultra Ball", "Nest Ball", "Rare Candy", "Arven", "Professor's Research",
+    "Super Rod", "Night Stretcher", "Counter Catcher", "Buddy-Buddy Poffin", "Earthen Vessel",
+    "Basic Psychic Energy", "Basic Fire Energy", "Jet Energy", "Fezandipiti ex SFA 38", "Lillie's Clefairy ex JTG 56",
+]
+
+
+def parse_decklist_into_archetype_baseline(decklist: List[Tuple[str, int]]) -> List[str]:
+    """
+    The archetype of a decklist as given by `parse_decklist_into_archetype` before `ARCHETYPE_RULES`.
+    """
+    def is_in_decklist_with_quantity(cardname: str, quantity: int) -> bool:
+        return sum(quantity_ for cardname_, quantity_ in decklist if cardname in cardname_) >= quantity
+
+    def contains(*card_list: str) -> bool:
+        return all(any(card in cardname_ for cardname_, _ in decklist) for card in card_list)
+
+    if contains("Charizard ex", "Pidgeot ex") and is_in_decklist_with_quantity("Charizard ex", 2):
+        return ["charizard"]
+    if contains("Chien-Pao ex"):
+        return ["chien-pao"]
+    if contains("Gardevoir ex", "Drifloon") or contains("Gardevoir ex", "Munkidori"):
+        return ["gardevoir"]
+    if contains("Roaring Moon ex", "Squawkabilly ex"):
+        return ["roaring-moon", "squawkabilly"]
+    if contains("Roaring Moon", "Dundunsparce"):
+        return ["roaring-moon", "dundunsparce"]
+    if contains("Wellspring Mask Ogerpon ex", "Noctowl"):
+        return ["noctowl", "ogerpon-wellspring"]
+    if is_in_decklist_with_quantity("Ceruledge ex", 3):
+        return ["ceruledge"]
+    if contains("Roaring Moon"):
+        return ["roaring-moon"]
+    if contains("Mega Absol ex", "Mega Kangaskhan ex"):
+        return ["absol-mega", "kangaskhan-mega"]
+    if contains("Gholdengo ex"):
+        return ["gholdengo"]
+    if contains("Miraidon ex", "Joltik"):
+        return ["miraidon", "joltik"]
+    if contains("Dragapult ex", "Pidgeot ex"):
+        return ["dragapult", "pidgeot"]
+    if contains("Dragapult ex", "Dusknoir"):
+        return ["dragapult", "dusknoir"]
+    if contains("Raging Bolt ex", "Noctowl"):
+        return ["raging-bolt", "noctowl"]
+    if is_in_decklist_with_quantity("Crustle", 3):
+        return ["crustle"]
+    if is_in_decklist_with_quantity("Iron Thorns ex", 4):
+        return ["iron-thorns"]
+    if contains("Noivern ex", "Cornerstone Mask Ogerpon ex"):
+        return ["ogerpon-cornerstone", "noivern"]
+    if contains("Marnie's Grimmsnarl", "Froslass"):
+        return ["grimmsnarl", "froslass"]
+    if contains("Flareon ex"):
+        return ["flareon"]
+    if contains("N's Zoroark", "Reshiram"):
+        return ["zoroark"]
+    if contains("Milotic ex", "Cornerstone Mask Ogerpon ex"):
+        return ["milotic"]
+    if contains("Pidgeot ex", "Elgyem", "Mist Energy"):
+        return ["pidgeot"]
+    return ["unown"]
+
+
+def generate_decklists(nb_decklists, seed=0):
+    """
+    Builds random decklists mixing a few cards of the rules, with versions from different sets, and filler cards.
+    """
+    rng = random.Random(seed)
+    rule_cardname_list = sorted({cardname for rule in ARCHETYPE_RULES for cardname, _ in rule.cards})
+    decklist_list = []
+    for _ in range(nb_decklists):
+        decklist = {}
+        for cardname in rng.sample(rule_cardname_list, rng.randint(0, 5)):
+            decklist[f"{cardname} {rng.choice(['SVI', 'PAL', 'OBF', 'TWM'])} {rng.randint(1, 200)}"] = rng.randint(1, 4)
+        for cardname in rng.sample(FILLER_CARDS, 10):
+            decklist[cardname] = rng.randint(1, 4)
+        decklist_list.append(list(decklist.items()))
+    return decklist_list
+
+
+def main(nb_decklists=20000):
+    decklist_list = generate_decklists(nb_decklists)
+
+    start = time.perf_counter()
+    baseline_archetype_list = [parse_decklist_into_archetype_baseline(decklist) for decklist in decklist_list]
+    baseline_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference_archetype_list = [parse_decklist_into_archetype_reference(decklist) for decklist in decklist_list]
+    reference_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    classifier = ArchetypeClassifier(ARCHETYPE_RULES)
+    archetype_list = classifier.classify(decklist_list)
+    classifier_elapsed = time.perf_counter() - start
+
+    record_list = [
+        PlayerRecord.from_decklist(f"Player {index}", None, decklist) for index, decklist in enumerate(decklist_list)
+    ]
+    start = time.perf_counter()
+    record_archetype_list = classify_player_records(record_list)
+    record_elapsed = time.perf_counter() - start
+
+    nb_unknown = sum(archetype == ["unown"] for archetype in baseline_archetype_list)
+    print(f"{nb_decklists} decklists, {nb_decklists - nb_unknown} with a known archetype")
+    print(f"Baseline if-chain:   {nb_decklists / baseline_elapsed:10.0f} decks/s")
+    print(f"Rules one by one:    {nb_decklists / reference_elapsed:10.0f} decks/s")
+    print(f"Compiled classifier: {nb_decklists / classifier_elapsed:10.0f} decks/s (compilation included)")
+    print(f"Records with NumPy:  {nb_decklists / record_elapsed:10.0f} decks/s")
+    is_parity_ok = True
+    for name, classified_archetype_list in (("rules one by one", reference_archetype_list),
+                                            ("compiled classifier", archetype_list),
+                                            ("NumPy classifier of records", record_archetype_list)):
+        nb_mismatches = sum(
+            baseline_archetype != archetype
+            for baseline_archetype, archetype in zip(baseline_archetype_list, classified_archetype_list)
+        )
+        if nb_mismatches:
+            print(f"ERROR: {nb_mismatches} decklists are classified differently by the {name} than by the baseline")
+            is_parity_ok = False
+    if not is_parity_ok:
+        sys.exit(1)
+    print("Parity: OK")
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
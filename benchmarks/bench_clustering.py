@@ -0,0 +1,72 @@
+"""
+Benchmark of the archetype discovery of `archetype_clustering`.
+
+Decklists are generated like the decklists of the benchmark tournaments: the cards of an archetype rule, then filler
+Pokémon, trainers and energies shared by every archetype. The script checks that the archetypes come back as
+separate clusters: no cluster mixes two known archetypes, and every archetype played enough has its cluster.
+It prints the throughput of the clustering.
+
+Usage:
+    python benchmarks/bench_clustering.py [nb_decklists]
+"""
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+# Adding the parent directory to the sys.path, like the scripts of `mischief`.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from archetype_clustering import MIN_CLUSTER_SIZE, CardCountMatrix, propose_archetype_clusters
+from archetype_parser import UNKNOWN_ARCHETYPE, classify_player_records
+from benchmarks.fixtures import generate_decklist
+from card_catalog import PlayerRecord
+
+# Share of the decklists of a cluster that may have another known archetype than the main one
+MAX_MIXED_SHARE = 0.05
+
+
+def main(nb_decklists=2000):
+    rng = random.Random(0)
+    record_list = [
+        PlayerRecord.from_card_lines(f"Player {index}", None, generate_decklist(rng)) for index in range(nb_decklists)
+    ]
+    archetype_list = classify_player_records(record_list)
+    matrix = CardCountMatrix.from_records(record_list)
+
+    start = time.perf_counter()
+    cluster_list = propose_archetype_clusters(matrix, archetype_list)
+    elapsed = time.perf_counter() - start
+
+    unown = ", ".join(UNKNOWN_ARCHETYPE)
+    archetype_counter = Counter(", ".join(archetype) for archetype in archetype_list)
+    clustered_archetype_set = set()
+    nb_errors = 0
+    for cluster in cluster_list:
+        known_archetype_counter = Counter({
+            archetype: count for archetype, count in cluster.archetype_counter.items() if archetype != unown
+        })
+        if not known_archetype_counter:
+            continue
+        archetype, count = known_archetype_counter.most_common(1)[0]
+        clustered_archetype_set.add(archetype)
+        if count < (1 - MAX_MIXED_SHARE) * sum(known_archetype_counter.values()):
+            print(f"ERROR: a cluster of {len(cluster.decklist_indices)} decklists mixes archetypes "
+                  f"{dict(known_archetype_counter.most_common(3))}")
+            nb_errors += 1
+    for archetype, count in archetype_counter.items():
+        if archetype != unown and count >= 2 * MIN_CLUSTER_SIZE and archetype not in clustered_archetype_set:
+            print(f"ERROR: the {count} decklists of {archetype} have no cluster")
+            nb_errors += 1
+
+    print(f"{nb_decklists} decklists, {len(archetype_counter) - (unown in archetype_counter)} known archetypes, "
+          f"{len(cluster_list)} clusters")
+    print(f"Clustering: {nb_decklists / elapsed:10.0f} decks/s")
+    if nb_errors:
+        sys.exit(1)
+    print("Separate archetypes: OK")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,118 @@
+"""
+Benchmark of the page extractors of `page_parser` against the full BeautifulSoup parse they replace.
+
+Every page of the page store is parsed both ways. The script checks that both give the same result,
+and prints the average parse time per page type.
+
+Usage:
+    python benchmarks/bench_parsing.py [max_pages_per_type]
+"""
+import os
+import sys
+import time
+from collections import defaultdict
+
+# Adding the parent directory to the sys.path, like the scripts of `mischief`.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from bs4 import BeautifulSoup
+
+import download_manager
+from page_parser import PARSER_FEATURES, parse_decklist_page, parse_pairings_page, parse_roster_page
+
+
+def legacy_parse_decklist_page(content):
+    soup = BeautifulSoup(content, "html.parser")
+    table = soup.find_all("table")[0]
+    return [
+        (card["data-cardname"], card["data-setnum"], int(card["data-quantity"]), card["data-cardtype"])
+        for card in table.find_all("li")
+    ]
+
+
+def legacy_parse_roster_page(content):
+    soup = BeautifulSoup(content, "html.parser")
+    roster_table = soup.find_all("div", class_="card-body")[0].find_all("tbody")[0]
+    row_list = []
+    for row in roster_table.find_all("tr"):
+        row_infos = row.find_all("td")
+        decklist_slot = row_infos[5]
+        decklist_status = decklist_slot.text.strip()
+        decklist_href = decklist_slot.find_all("a")[0]["href"] if decklist_status == "View" else None
+        row_list.append((
+            row_infos[1].text.strip(),
+            row_infos[2].text.strip(),
+            row_infos[3].text.strip(),
+            row_infos[4].text.strip(),
+            decklist_status,
+            decklist_href,
+        ))
+    return row_list
+
+
+def legacy_parse_pairings_page(content):
+    soup = BeautifulSoup(content, "html.parser")
+    match_list = []
+    for div_match in soup.find_all("div", class_="match"):
+        div_player1, div_table_number, div_player2 = div_match.find_all("div")
+        if div_table_number.text == "Table #":
+            continue
+        player_name1 = div_player1.find("span").text
+        player_name2 = "" if div_player2.text.strip() == "" else div_player2.find("span").text
+        if "winner" in div_player1["class"]:
+            winner_tag = "P1"
+        elif "tie" in div_player1["class"]:
+            winner_tag = "TIE"
+        elif "winner" in div_player2["class"]:
+            winner_tag = "P2"
+        else:
+            continue
+        match_list.append((player_name1, player_name2, winner_tag))
+    return match_list
+
+
+PARSERS_PER_PAGE_TYPE = {
+    "decklist": (legacy_parse_decklist_page, parse_decklist_page),
+    "roster": (legacy_parse_roster_page, parse_roster_page),
+    "pairings": (legacy_parse_pairings_page, parse_pairings_page),
+}
+
+
+def get_page_type(url):
+    for page_type in PARSERS_PER_PAGE_TYPE:
+        if f"/{page_type}/" in url:
+            return page_type
+    return None
+
+
+def main(max_pages_per_type=200):
+    url_list_per_page_type = defaultdict(list)
+    for url in download_manager.page_store.urls():
+        page_type = get_page_type(url)
+        if page_type is not None and len(url_list_per_page_type[page_type]) < max_pages_per_type:
+            url_list_per_page_type[page_type].append(url)
+
+    print(f"Fast parser backend: {PARSER_FEATURES}")
+    print("page type | nb pages | before (ms/page) | after (ms/page) | speedup")
+    for page_type, (legacy_parser, fast_parser) in PARSERS_PER_PAGE_TYPE.items():
+        url_list = url_list_per_page_type[page_type]
+        if not url_list:
+            print(f"{page_type:9} | no page in the cache")
+            continue
+        content_list = [download_manager.page_store.get(url) for url in url_list]
+
+        elapsed_per_parser = []
+        result_per_parser = []
+        for parser in (legacy_parser, fast_parser):
+            start = time.perf_counter()
+            result_per_parser.append([parser(content) for content in content_list])
+            elapsed_per_parser.append(time.perf_counter() - start)
+        if result_per_parser[0] != result_per_parser[1]:
+            print(f"WARNING: the fast {page_type} parser does not give the same result as the legacy one")
+
+        before, after = (1000 * elapsed / len(content_list) for elapsed in elapsed_per_parser)
+        print(f"{page_type:9} | {len(content_list):8} | {before:16.2f} | {after:15.2f} | x{before / after:.1f}")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
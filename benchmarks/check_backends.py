@@ -0,0 +1,106 @@
+"""
+Parity check of the ways to build a matchup table.
+
+Tournaments are generated and served by a local `FakeRK9Server`, and the matchup table of `get_matchup_table` is
+compared with the one of every other backend. The list of tournaments repeats one of them: a repeated tournament
+is counted once. Every backend starts from an empty page store and processed database, so nothing is reused.
+    get_matchup_table: `generate_matchup_table.get_matchup_table`, given the repeated list
+    season dataset: `season_dataset.build_season_dataset`, then `SeasonDataset.get_matchup_table`
+    streaming: `pipeline.get_matchup_table_streaming`
+    warehouse: `tournament_warehouse.TournamentWarehouse.ingest`, then `TournamentWarehouse.get_matchup_table`
+
+Usage:
+    python benchmarks/check_backends.py [nb_tournaments] [nb_players]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from typing import Callable, Iterator, List
+
+import numpy as np
+
+# Adding the parent directory to the sys.path, like the scripts of `mischief`.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import download_manager
+from benchmarks.fake_rk9 import start_server
+from benchmarks.fixtures import CORPUS_HOST, generate_tournament
+from generate_matchup_table import get_matchup_table
+from matchup_tensor import MatchupTable
+from page_store import SQLitePageStore
+from pipeline import get_matchup_table_streaming
+from season_dataset import build_season_dataset
+from tournament_warehouse import TournamentWarehouse
+
+NB_ROUNDS = 9
+FROM_ROUND_N = 6
+
+
+@contextlib.contextmanager
+def _fresh_directory() -> Iterator[None]:
+    """
+    Runs in a temporary directory, with an empty page store and processed database, and without printing.
+    """
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        os.chdir(temporary_directory)
+        download_manager.set_page_store(SQLitePageStore(os.path.join(temporary_directory, "page_store.sqlite")))
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                yield
+        finally:
+            os.chdir(working_directory)
+
+
+def _build(get_table: Callable[[List[str]], MatchupTable], url_list: List[str]) -> MatchupTable:
+    with _fresh_directory():
+        return get_table(url_list)
+
+
+def _get_warehouse_matchup_table(url_list: List[str]) -> MatchupTable:
+    warehouse = TournamentWarehouse(os.path.join(os.getcwd(), "warehouse.sqlite"))
+    warehouse.ingest(url_list)
+    return warehouse.get_matchup_table(url_list, FROM_ROUND_N)
+
+
+def main(nb_tournaments=2, nb_players=120):
+    with tempfile.TemporaryDirectory() as corpus_directory:
+        corpus = SQLitePageStore(os.path.join(corpus_directory, "corpus.sqlite"))
+        tournament_url_list = [
+            generate_tournament(corpus, code=f"CHECK{index:02d}", nb_players=nb_players, nb_rounds=NB_ROUNDS,
+                                seed=index)
+            for index in range(nb_tournaments)
+        ]
+        server = start_server(corpus)
+        try:
+            url_list = [server.base_url + url[len(CORPUS_HOST):] for url in tournament_url_list]
+            repeated_url_list = url_list + url_list[:1]
+            expected = _build(lambda urls: get_matchup_table(urls, FROM_ROUND_N), url_list)
+            table_per_backend = {
+                "get_matchup_table": _build(lambda urls: get_matchup_table(urls, FROM_ROUND_N), repeated_url_list),
+                "season dataset": _build(
+                    lambda urls: build_season_dataset(urls).get_matchup_table(urls, FROM_ROUND_N), repeated_url_list
+                ),
+                "streaming": _build(lambda urls: get_matchup_table_streaming(urls, FROM_ROUND_N), repeated_url_list),
+                "warehouse": _build(_get_warehouse_matchup_table, repeated_url_list),
+            }
+        finally:
+            server.shutdown()
+
+    print(f"{nb_tournaments} tournaments of {nb_players} players, the first one repeated, "
+          f"{len(expected.archetype_list)} archetypes")
+    nb_errors = 0
+    for backend, matchup_table in table_per_backend.items():
+        if matchup_table.archetype_list != expected.archetype_list \
+                or not np.array_equal(matchup_table.counts, expected.counts):
+            print(f"ERROR: the matchup table of {backend} differs from the one of get_matchup_table without repeats")
+            nb_errors += 1
+    if nb_errors:
+        sys.exit(1)
+    print("Parity: OK")
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,137 @@
+"""
+Local HTTP server standing in for rk9.gg, serving the pages of a fixture corpus.
+
+Every request waits for a configurable latency, and fails with a 503 at a configurable rate, so the retries and
+the concurrency of `download_manager` are exercised as against the real website. Pages missing from the corpus
+get a 404.
+
+Usage:
+    python benchmarks/fake_rk9.py --corpus benchmarks/corpus/worlds.sqlite [--port 8009] [--latency-ms 80]
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+# Adding the parent directory to the sys.path, like the scripts of `mischief`.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from benchmarks.fixtures import CORPUS_HOST
+from page_store import PageStore, SQLitePageStore
+
+
+class FakeRK9Server(ThreadingHTTPServer):
+    """
+    Serves the pages of a corpus, with latency and errors.
+    """
+    daemon_threads = True
+
+    def __init__(self, corpus: PageStore, port: int = 0, latency_ms: float = 0., latency_jitter_ms: float = 0.,
+                 error_rate: float = 0., seed: int = 0):
+        """
+        Args:
+            corpus (PageStore): The pages to serve, keyed by their rk9.gg URL.
+            port (int, optional): The port to listen on, on localhost. Defaults to any free port.
+            latency_ms (float, optional): The average time to answer a request.
+            latency_jitter_ms (float, optional): The maximum deviation from the average time to answer.
+            error_rate (float, optional): The share of the requests answered with a 503.
+            seed (int, optional): The seed of the random generator drawing the latencies and errors.
+        """
+        super().__init__(("127.0.0.1", port), _FakeRK9RequestHandler)
+        self.corpus = corpus
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.nb_requests = 0
+        self.nb_errors = 0
+
+    @property
+    def base_url(self) -> str:
+        """
+        Returns:
+            str: The URL of the server, replacing https://rk9.gg in the URLs of the corpus.
+        """
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def draw_request(self) -> Tuple[float, bool]:
+        """
+        Returns:
+            Tuple[float, bool]: The latency of a request, in seconds, and whether it fails.
+        """
+        with self.rng_lock:
+            self.nb_requests += 1
+            latency_ms = self.latency_ms + self.rng.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)
+            is_error = self.rng.random() < self.error_rate
+            self.nb_errors += is_error
+        return max(latency_ms, 0.) / 1000, is_error
+
+
+class _FakeRK9RequestHandler(BaseHTTPRequestHandler):
+    server: FakeRK9Server
+
+    def do_GET(self):
+        latency, is_error = self.server.draw_request()
+        time.sleep(latency)
+        if is_error:
+            self._send(503, b"Service Unavailable")
+            return
+        content = self.server.corpus.get(CORPUS_HOST + self.path)
+        if content is None:
+            self._send(404, b"Not Found")
+        else:
+            self._send(200, content)
+
+    def _send(self, status_code: int, content: bytes) -> None:
+        self.send_response(status_code)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(corpus: PageStore, **kwargs) -> FakeRK9Server:
+    """
+    Starts a server in a background thread.
+
+    Args:
+        corpus (PageStore): The pages to serve.
+        **kwargs: The options of `FakeRK9Server`.
+
+    Returns:
+        FakeRK9Server: The running server. Call `shutdown()` to stop it.
+    """
+    server = FakeRK9Server(corpus, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True, help="Path of the corpus.")
+    parser.add_argument("--port", type=int, default=8009, help="Port to listen on.")
+    parser.add_argument("--latency-ms", type=float, default=0., help="Average time to answer a request.")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0., help="Maximum deviation of the latency.")
+    parser.add_argument("--error-rate", type=float, default=0., help="Share of the requests failing with a 503.")
+    args = parser.parse_args()
+
+    server = FakeRK9Server(SQLitePageStore(args.corpus), args.port, args.latency_ms, args.latency_jitter_ms,
+                           args.error_rate)
+    print(f"Serving {args.corpus} on {server.base_url}, in place of {CORPUS_HOST}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+"""
+Fixture corpus of RK9.gg pages for the offline benchmarks.
+
+A corpus is a `SQLitePageStore` file holding every page of one or more tournaments, keyed by their rk9.gg URL:
+the tournament pairings page, the roster, the pairing page of every round and every decklist.
+`fake_rk9` serves a corpus over HTTP in place of rk9.gg.
+
+A corpus is either recorded from rk9.gg, or generated: the synthetic generator writes pages with the same markup
+as rk9.gg, for a field of any size, with decklists built from the archetype rules and swiss pairings.
+
+Usage:
+    python benchmarks/fixtures.py generate --corpus benchmarks/corpus/worlds.sqlite [--players 1300] [--rounds 15]
+    python benchmarks/fixtures.py record --corpus benchmarks/corpus/naic.sqlite https://rk9.gg/pairings/...
+"""
+import argparse
+import html
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Adding the parent directory to the sys.path, like the scripts of `mischief`.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from archetype_parser import ARCHETYPE_RULES
+from page_store import PageEntry, PageStore, SQLitePageStore, get_digest
+
+CORPUS_HOST = "https://rk9.gg"
+WORLDS_NB_PLAYERS = 1300
+WORLDS_NB_ROUNDS = 15
+# Share of the decklists that don't match any archetype rule
+UNKNOWN_DECKLIST_RATE = 0.05
+TIE_RATE = 0.05
+
+TRAINER_CARDS = [
+    ("Iono", "PAL 185"), ("Boss's Orders", "PAL 172"), ("Ultra Ball", "SVI 196"), ("Nest Ball", "SVI 181"),
+    ("Rare Candy", "SVI 191"), ("Arven", "SVI 166"), ("Professor's Research", "SVI 189"), ("Super Rod", "PAL 188"),
+    ("Night Stretcher", "SFA 61"), ("Counter Catcher", "PAR 160"), ("Buddy-Buddy Poffin", "TEF 144"),
+    ("Earthen Vessel", "PAR 163"),
+]
+FILLER_POKEMON = [("Fezandipiti ex", "SFA 38"), ("Lillie's Clefairy ex", "JTG 56"), ("Pidgey", "MEW 16")]
+ENERGY_CARDS = [("Basic Psychic Energy", "SVE 5"), ("Basic Fire Energy", "SVE 2"), ("Basic Lightning Energy", "SVE 4")]
+COUNTRIES = ["US", "CA", "BR", "FR", "DE", "GB", "JP", "MX", "CL", "AU", "IT", "ES"]
+SETS = ["SVI", "PAL", "OBF", "PAR", "TEF", "TWM", "SFA", "SCR", "SSP", "JTG"]
+
+
+def _page(body: str) -> bytes:
+    return f"<!DOCTYPE html><html><head><title>RK9 Labs</title></head><body>{body}</body></html>".encode("utf-8")
+
+
+def render_decklist_page(card_list: List[Tuple[str, str, int, str]]) -> bytes:
+    """
+    Args:
+        card_list (List[Tuple[str, str, int, str]]): The `(card_name, card_set, quantity, card_type)` of the decklist.
+
+    Returns:
+        bytes: A decklist page, as https://rk9.gg/decklist/public/...
+    """
+    card_lines = "".join(
+        f'<li data-cardname="{html.escape(card_name)}" data-setnum="{card_set}" data-quantity="{quantity}" '
+        f'data-cardtype="{card_type}">{quantity} {html.escape(card_name)} {card_set}</li>'
+        for card_name, card_set, quantity, card_type in card_list
+    )
+    return _page(f'<div class="container"><table class="decklist"><tr><td><ul>{card_lines}</ul></td></tr></table></div>')
+
+
+def render_roster_page(row_list: List[Tuple[str, str, str, str, Optional[str]]]) -> bytes:
+    """
+    Args:
+        row_list (List[Tuple[str, str, str, str, Optional[str]]]): The
+            `(first_name, last_name, country, division, decklist_href)` of every player.
+
+    Returns:
+        bytes: A roster page, as https://rk9.gg/roster/...
+    """
+    rows = []
+    for index, (first_name, last_name, country, division, decklist_href) in enumerate(row_list, start=1):
+        decklist_slot = "Submitted" if decklist_href is None else f'<a href="{decklist_href}">View</a>'
+        rows.append(
+            f"<tr><td>{index}</td><td>{first_name}</td><td>{last_name}</td><td>{country}</td><td>{division}</td>"
+            f"<td>{decklist_slot}</td></tr>"
+        )
+    rows = "".join(rows)
+    return _page(
+        '<div class="card"><div class="card-body"><table class="table"><thead><tr><th>ID</th><th>First name</th>'
+        '<th>Last name</th><th>Country</th><th>Division</th><th>Deck List</th></tr></thead>'
+        f'<tbody>{rows}</tbody></table></div></div>'
+    )
+
+
+def _render_match_divs(match_list: List[Tuple[str, str, str]]) -> str:
+    player_classes_per_winner_tag = {
+        "P1": ("winner", "loser"),
+        "P2": ("loser", "winner"),
+        "TIE": ("tie", "tie"),
+    }
+    match_divs = [
+        '<div class="row match"><div class="col-5 player"><span>Player 1</span></div>'
+        '<div class="col-2 tablenumber">Table #</div><div class="col-5 player"><span>Player 2</span></div></div>'
+    ]
+    for table_number, (player_name1, player_name2, winner_tag) in enumerate(match_list, start=1):
+        player1_class, player2_class = player_classes_per_winner_tag[winner_tag]
+        player2_span = f"<span>{player_name2}</span>" if player_name2 else ""
+        match_divs.append(
+            f'<div class="row match no-gutter complete"><div class="col-5 player {player1_class}">'
+            f'<span>{player_name1}</span></div><div class="col-2 tablenumber">{table_number}</div>'
+            f'<div class="col-5 player {player2_class}">{player2_span}</div></div>'
+        )
+    return "".join(match_divs)
+
+
+def render_pairings_page(match_list: List[Tuple[str, str, str]]) -> bytes:
+    """
+    Args:
+        match_list (List[Tuple[str, str, str]]): The `(player_name1, player_name2, winner_tag)` of the round.
+
+    Returns:
+        bytes: The pairing page of a round, as https://rk9.gg/pairings/...?pod=2&rnd=N
+    """
+    return _page(f'<div class="container">{_render_match_divs(match_list)}</div>')
+
+
+def render_tournament_page(nb_rounds: int,
+                           match_list_per_embedded_round: Optional[Dict[int, List[Tuple[str, str, str]]]] = None) \
+        -> bytes:
+    """
+    Args:
+        nb_rounds (int): The number of rounds played so far.
+        match_list_per_embedded_round (Optional[Dict[int, List[Tuple[str, str, str]]]]): The matches of the rounds
+            embedded in the page, per round number. Defaults to none.
+
+    Returns:
+        bytes: A tournament pairings page, as https://rk9.gg/pairings/..., with a tab per round.
+    """
+    match_list_per_embedded_round = match_list_per_embedded_round or {}
+    round_tabs = "".join(
+        f'<div class="tab-pane" id="P2R{round_n}">'
+        f'{_render_match_divs(match_list_per_embedded_round[round_n]) if round_n in match_list_per_embedded_round else ""}'
+        '</div>'
+        for round_n in range(1, nb_rounds + 1)
+    )
+    return _page(f'<div class="tab-content">{round_tabs}</div>')
+
+
+def generate_decklist(rng: random.Random) -> List[Tuple[str, str, int, str]]:
+    """
+    Builds a 60-card decklist around a random archetype rule, or a rogue decklist matching none of them.
+
+    Args:
+        rng (random.Random): The random generator.
+
+    Returns:
+        List[Tuple[str, str, int, str]]: The `(card_name, card_set, quantity, card_type)` of the decklist.
+    """
+    card_list = []
+    if rng.random() >= UNKNOWN_DECKLIST_RATE:
+        rule = rng.choice(ARCHETYPE_RULES)
+        for card_name, quantity in rule.cards:
+            card_list.append((card_name, f"{rng.choice(SETS)} {rng.randint(1, 200)}", max(quantity, rng.randint(1, 4)),
+                              "pokemon"))
+    for card_name, card_set in rng.sample(FILLER_POKEMON, 2):
+        card_list.append((card_name, card_set, rng.randint(1, 2), "pokemon"))
+    for card_name, card_set in rng.sample(TRAINER_CARDS, 8):
+        card_list.append((card_name, card_set, rng.randint(1, 4), "trainer"))
+    card_name, card_set = rng.choice(ENERGY_CARDS)
+    card_list.append((card_name, card_set, 60 - sum(quantity for _, _, quantity, _ in card_list), "energy"))
+    return card_list
+
+
+def generate_swiss_rounds(player_name_list: List[str], nb_rounds: int, rng: random.Random) \
+        -> List[List[Tuple[str, str, str]]]:
+    """
+    Pairs players with the same score, round after round, and draws the results.
+
+    Args:
+        player_name_list (List[str]): The players, as displayed in the pairings.
+        nb_rounds (int): The number of rounds.
+        rng (random.Random): The random generator.
+
+    Returns:
+        List[List[Tuple[str, str, str]]]: The `(player_name1, player_name2, winner_tag)` of every round.
+    """
+    points_per_player = {player_name: 0 for player_name in player_name_list}
+    round_history = []
+    for _ in range(nb_rounds):
+        standings = sorted(player_name_list, key=lambda player_name: (-points_per_player[player_name], rng.random()))
+        match_list = []
+        for index in range(0, len(standings) - 1, 2):
+            player_name1, player_name2 = standings[index], standings[index + 1]
+            draw = rng.random()
+            winner_tag = "TIE" if draw < TIE_RATE else ("P1" if draw < (1 + TIE_RATE) / 2 else "P2")
+            match_list.append((player_name1, player_name2, winner_tag))
+            if winner_tag == "TIE":
+                points_per_player[player_name1] += 1
+                points_per_player[player_name2] += 1
+            else:
+                points_per_player[player_name1 if winner_tag == "P1" else player_name2] += 3
+        if len(standings) % 2 == 1:
+            match_list.append((standings[-1], "", "P1"))
+            points_per_player[standings[-1]] += 3
+        round_history.append(match_list)
+    return round_history
+
+
+def generate_tournament(corpus: PageStore,
+                        code: str = "BENCH01",
+                        nb_players: int = WORLDS_NB_PLAYERS,
+                        nb_rounds: int = WORLDS_NB_ROUNDS,
+                        embed_rounds: bool = False,
+                        seed: int = 0) -> str:
+    """
+    Generates every page of a synthetic tournament into a corpus.
+
+    Args:
+        corpus (PageStore): The corpus to fill.
+        code (str, optional): The code of the tournament in its URLs.
+        nb_players (int, optional): The number of masters players. Defaults to a Worlds-size field.
+        nb_rounds (int, optional): The number of rounds.
+        embed_rounds (bool, optional): Whether the matches of every round are embedded in the tournament page,
+            instead of being on the page of the round only.
+        seed (int, optional): The seed of the random generator.
+
+    Returns:
+        str: The URL of the tournament.
+    """
+    rng = random.Random(seed)
+    tournament_url = f"{CORPUS_HOST}/pairings/{code}"
+    page_list = []
+
+    roster_row_list = []
+    player_name_list = []
+    for player_index in range(nb_players):
+        first_name, last_name, country = f"Player{player_index}", f"{code}{player_index}", rng.choice(COUNTRIES)
+        decklist_href = f"/decklist/public/{code}/{player_index}"
+        roster_row_list.append((first_name, last_name, country, "Masters", decklist_href))
+        player_name_list.append(f"{first_name} {last_name} [{country}]")
+        page_list.append((CORPUS_HOST + decklist_href, render_decklist_page(generate_decklist(rng))))
+    page_list.append((f"{CORPUS_HOST}/roster/{code}", render_roster_page(roster_row_list)))
+
+    round_history = generate_swiss_rounds(player_name_list, nb_rounds, rng)
+    for round_n, match_list in enumerate(round_history, start=1):
+        page_list.append((f"{tournament_url}?pod=2&rnd={round_n}", render_pairings_page(match_list)))
+    match_list_per_embedded_round = dict(enumerate(round_history, start=1)) if embed_rounds else None
+    page_list.append((tournament_url, render_tournament_page(nb_rounds, match_list_per_embedded_round)))
+
+    _put_pages(corpus, page_list)
+    return tournament_url
+
+
+def record_tournament(tournament_url: str, corpus: PageStore) -> int:
+    """
+    Downloads every page of a tournament with `download_manager`, and copies them into a corpus.
+
+    Args:
+        tournament_url (str): The URL of the tournament on rk9.gg.
+        corpus (PageStore): The corpus to fill.
+
+    Returns:
+        int: The number of pages recorded.
+    """
+    import download_manager
+    from download_tournament import get_urls_of_tournament
+    from generate_matchup_table import get_roster_url
+
+    url_list = [tournament_url, get_roster_url(tournament_url)] + get_urls_of_tournament(tournament_url)
+    failures = download_manager.download_urls(url_list)
+    if failures:
+        print(f"{len(failures)} pages could not be recorded: {list(failures.keys())}")
+    page_list = [
+        (url, download_manager.page_store.get(url)) for url in url_list if url not in failures
+    ]
+    return _put_pages(corpus, page_list)
+
+
+def _put_pages(corpus: PageStore, page_list: List[Tuple[str, bytes]]) -> int:
+    fetched_at = time.time()
+    if isinstance(corpus, SQLitePageStore):
+        return corpus.put_many(
+            (url, PageEntry(content, fetched_at, digest=get_digest(content))) for url, content in page_list
+        )
+    for url, content in page_list:
+        corpus.put(url, content, fetched_at=fetched_at)
+    return len(page_list)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate_parser = subparsers.add_parser("generate", help="Generate a synthetic tournament.")
+    generate_parser.add_argument("--corpus", required=True, help="Path of the corpus.")
+    generate_parser.add_argument("--code", default="BENCH01", help="Code of the tournament in its URLs.")
+    generate_parser.add_argument("--players", type=int, default=WORLDS_NB_PLAYERS, help="Number of players.")
+    generate_parser.add_argument("--rounds", type=int, default=WORLDS_NB_ROUNDS, help="Number of rounds.")
+    generate_parser.add_argument("--embed-rounds", action="store_true",
+                                 help="Embed the matches of every round in the tournament page.")
+    generate_parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator.")
+    record_parser = subparsers.add_parser("record", help="Record a tournament from rk9.gg.")
+    record_parser.add_argument("--corpus", required=True, help="Path of the corpus.")
+    record_parser.add_argument("tournament_url", help="URL of the tournament, https://rk9.gg/pairings/...")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.corpus)), exist_ok=True)
+    corpus = SQLitePageStore(args.corpus)
+    if args.command == "generate":
+        tournament_url = generate_tournament(
+            corpus, args.code, args.players, args.rounds, args.embed_rounds, args.seed
+        )
+        print(f"Generated {tournament_url} into {args.corpus}")
+    elif args.command == "record":
+        nb_pages = record_tournament(args.tournament_url, corpus)
+        print(f"Recorded {nb_pages} pages of {args.tournament_url} into {args.corpus}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+End-to-end offline benchmark, from the download of the pages to the HTML matchup table.
+
+The tournaments of a fixture corpus are served by a local `FakeRK9Server`, and processed like `generate_matchup_table`
+does, in a temporary directory holding the page store and the processed database. Every stage is timed:
+    download: every page of the tournaments, through `download_manager` (pages/s)
+    decklists: parsing and classification of every decklist (decks/s)
+    classification: classification alone of every decklist (decks classified/s)
+    matchups: parsing of the pairings and aggregation into the matchup table (matches/s)
+    aggregation: the matchup table again, reloaded from the processed database. The tournament registry is cleared
+        first, so no tournament is reused from memory (matches aggregated/s)
+    html export: the HTML matchup table
+The results can be saved as JSON, and compared to a previous run to catch regressions.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--corpus benchmarks/corpus/worlds.sqlite] [--latency-ms 50]
+        [--error-rate 0.01] [--json results.json] [--baseline previous_results.json]
+Without a corpus, a Worlds-size tournament is generated.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List
+
+from mlp.html_table import create_html_table
+
+# Adding the parent directory to the sys.path, like the scripts of `mischief`.
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import download_manager
+from archetype_parser import classify_player_records
+from benchmarks.fake_rk9 import start_server
+from benchmarks.fixtures import CORPUS_HOST, WORLDS_NB_PLAYERS, WORLDS_NB_ROUNDS, generate_tournament
+from download_tournament import get_urls_of_tournament
+from generate_matchup_table import (
+    MAX_NUMBER_OF_ROUNDS,
+    get_all_pairings_per_round,
+    get_decklist_database_from_tournament_url,
+    get_matchup_table,
+    parse_matchup_table_into_table_data,
+    remove_low_occurrences,
+)
+from page_store import SQLitePageStore
+from tournament import tournament_registry
+
+# A regression is reported when a rate drops by more than this share of its baseline
+REGRESSION_TOLERANCE = 0.2
+TOURNAMENT_URL_PATTERN = re.compile(re.escape(CORPUS_HOST) + r"/pairings/[^/?]+$")
+
+
+@contextmanager
+def _timed_stage(results: Dict[str, Dict], stage: str, unit: str) -> Iterator[Dict]:
+    """
+    Times a stage. The stage sets the number of items it processed in the yielded dict.
+    """
+    stage_result = {"unit": unit, "items": 0}
+    start = time.perf_counter()
+    yield stage_result
+    stage_result["seconds"] = time.perf_counter() - start
+    stage_result["rate"] = stage_result["items"] / stage_result["seconds"] if stage_result["seconds"] > 0 else 0.
+    results[stage] = stage_result
+
+
+def run_benchmarks(corpus: SQLitePageStore, latency_ms: float = 0., error_rate: float = 0.,
+                   nb_concurrency: int = download_manager.NB_CONCURRENCY) -> Dict[str, Dict]:
+    """
+    Runs every stage on the tournaments of a corpus.
+
+    Args:
+        corpus (SQLitePageStore): The pages of the tournaments.
+        latency_ms (float, optional): Average time for the fake server to answer a request.
+        error_rate (float, optional): Share of the requests failing with a 503.
+        nb_concurrency (int, optional): The maximum number of requests in flight.
+
+    Returns:
+        Dict[str, Dict]: The results per stage: `{"unit", "items", "seconds", "rate"}`.
+    """
+    server = start_server(corpus, latency_ms=latency_ms, latency_jitter_ms=latency_ms / 2, error_rate=error_rate)
+    tournament_url_list = [
+        server.base_url + url[len(CORPUS_HOST):] for url in corpus.urls() if TOURNAMENT_URL_PATTERN.match(url)
+    ]
+    print(f"Serving {len(tournament_url_list)} tournaments on {server.base_url}")
+
+    results = {}
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        # The processed database is relative to the working directory
+        os.chdir(temporary_directory)
+        download_manager.set_page_store(SQLitePageStore(os.path.join(temporary_directory, "page_store.sqlite")))
+        try:
+            end_to_end_start = time.perf_counter()
+
+            with _timed_stage(results, "download", "pages") as stage_result:
+                url_list = list(tournament_url_list)
+                for tournament_url in tournament_url_list:
+                    url_list += get_urls_of_tournament(tournament_url)
+                failures = download_manager.download_urls(url_list, nb_concurrency)
+                stage_result["items"] = len(set(download_manager.page_store.urls()))
+            if failures:
+                print(f"{len(failures)} pages could not be downloaded")
+
+            record_list = []
+            with _timed_stage(results, "decklists", "decks") as stage_result:
+                for tournament_url in tournament_url_list:
+                    decklist_database = get_decklist_database_from_tournament_url(tournament_url)
+                    record_list += decklist_database["player_record_per_player"].values()
+                stage_result["items"] = len(record_list)
+
+            with _timed_stage(results, "classification", "decks") as stage_result:
+                classify_player_records(record_list)
+                stage_result["items"] = len(record_list)
+
+            with _timed_stage(results, "matchups", "matches") as stage_result:
+                matchup_table = get_matchup_table(tournament_url_list, from_round_n=MAX_NUMBER_OF_ROUNDS)
+                stage_result["items"] = sum(
+                    len(match_list)
+                    for tournament_url in tournament_url_list
+                    for match_list in get_all_pairings_per_round(tournament_url)
+                )
+            nb_matches = stage_result["items"]
+
+            tournament_registry.clear()
+            with _timed_stage(results, "aggregation", "matches") as stage_result:
+                matchup_table = get_matchup_table(tournament_url_list, from_round_n=MAX_NUMBER_OF_ROUNDS)
+                stage_result["items"] = nb_matches
+
+            with _timed_stage(results, "html export", "archetypes") as stage_result:
+                matchup_table = remove_low_occurrences(matchup_table, nb_occurence_min=1)
+                create_html_table(parse_matchup_table_into_table_data(matchup_table), "matchups.html")
+                stage_result["items"] = len(matchup_table)
+
+            results["end to end"] = {
+                "unit": "pages",
+                "items": results["download"]["items"],
+                "seconds": time.perf_counter() - end_to_end_start,
+            }
+            results["end to end"]["rate"] = results["end to end"]["items"] / results["end to end"]["seconds"]
+        finally:
+            os.chdir(working_directory)
+            server.shutdown()
+    print(f"{server.nb_requests} requests served, {server.nb_errors} failed on purpose")
+    return results
+
+
+def print_results(results: Dict[str, Dict], baseline: Dict[str, Dict] = None) -> List[str]:
+    """
+    Prints the results, compared to the baseline if given.
+
+    Args:
+        results (Dict[str, Dict]): The results of `run_benchmarks`.
+        baseline (Dict[str, Dict], optional): The results of a previous run.
+
+    Returns:
+        List[str]: The stages whose rate dropped by more than REGRESSION_TOLERANCE from the baseline.
+    """
+    regression_list = []
+    print("stage          |    items | seconds |          rate | vs baseline")
+    for stage, stage_result in results.items():
+        line = (f"{stage:14} | {stage_result['items']:8} | {stage_result['seconds']:7.2f} | "
+                f"{stage_result['rate']:8.0f} {stage_result['unit'] + '/s':>4} |")
+        if baseline is not None and baseline.get(stage, {}).get("rate"):
+            ratio = stage_result["rate"] / baseline[stage]["rate"]
+            line += f" x{ratio:.2f}"
+            if ratio < 1 - REGRESSION_TOLERANCE:
+                line += " REGRESSION"
+                regression_list.append(stage)
+        print(line)
+    return regression_list
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="Path of the corpus. Defaults to a generated Worlds-size tournament.")
+    parser.add_argument("--players", type=int, default=WORLDS_NB_PLAYERS, help="Players of the generated tournament.")
+    parser.add_argument("--rounds", type=int, default=WORLDS_NB_ROUNDS, help="Rounds of the generated tournament.")
+    parser.add_argument("--latency-ms", type=float, default=0., help="Average time to answer a request.")
+    parser.add_argument("--error-rate", type=float, default=0., help="Share of the requests failing with a 503.")
+    parser.add_argument("--concurrency", type=int, default=download_manager.NB_CONCURRENCY,
+                        help="Maximum number of requests in flight.")
+    parser.add_argument("--json", help="Save the results in this JSON file.")
+    parser.add_argument("--baseline", help="Compare the results to this JSON file, saved by a previous run.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus_directory:
+        if args.corpus is None:
+            corpus = SQLitePageStore(os.path.join(corpus_directory, "corpus.sqlite"))
+            print(f"Generating a tournament of {args.players} players and {args.rounds} rounds...")
+            generate_tournament(corpus, nb_players=args.players, nb_rounds=args.rounds)
+        else:
+            corpus = SQLitePageStore(args.corpus)
+        results = run_benchmarks(corpus, args.latency_ms, args.error_rate, args.concurrency)
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regression_list = print_results(results, baseline)
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if regression_list:
+        print(f"Regressions: {regression_list}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,21 @@
 from collections import Counter
 
-from generate_matchup_table import (
-    get_matchup_table,
-    get_players_decklist_infos_from_tournament_url,
-)
+import numpy as np
+
+from generate_matchup_table import MAX_NUMBER_OF_ROUNDS
+from metagame_solver import MetagameSolver
+from tournament import get_tournament
 
 RK9_URL = "https://rk9.gg/pairings/NA01wsS5yrQoQIs3mDtB" # NAIC
 
-WIN_POINTS  = 3
-TIE_POINTS  = 1
-LOSE_POINTS = 0
-NO_MATCH_POINTS = 0
+NB_BOOTSTRAP_SAMPLES = 1000
+SHARE_SHIFT = 0.05
 
 
-def get_archetype_counter(url):
-    players_infos = get_players_decklist_infos_from_tournament_url(url)
-    archetype_list = [", ".join(infos["archetype"]) for infos in players_infos.values()]
-    return Counter(archetype_list)
+def get_archetype_counter(url, season_dataset=None):
+    if season_dataset is not None:
+        return season_dataset.get_archetype_counter([url])
+    return get_tournament(url).archetype_counter
     # return {'chien-pao': 10,
     # 'roaring-moon, koraidon': 5,
     # 'great-tusk': 2,
@@ -38,11 +37,11 @@ def get_archetype_counter(url):
     # 'pidgeot, rotom': 7,
     # 'giratina-origin, comfey': 9}
 
-def get_repartition_of_archetypes(url_list):
+def get_repartition_of_archetypes(url_list, season_dataset=None):
     archetype_repartition = {}
     archetype_counter = Counter()
     for url in url_list:
-        archetype_counter_of_the_tournament = get_archetype_counter(url)
+        archetype_counter_of_the_tournament = get_archetype_counter(url, season_dataset)
         archetype_counter += archetype_counter_of_the_tournament
 
     number_of_archetypes = sum(nb_occurence for nb_occurence in archetype_counter.values())
@@ -51,38 +50,39 @@ def get_repartition_of_archetypes(url_list):
 
 
 def main():
-
+    # The metagame and the matchups of the same tournament, so every archetype played has its row in the table
+    tournament = get_tournament(RK9_URL)
     print("Getting archetype repartition...")
-    archetype_repartition = get_repartition_of_archetypes(RK9_URL_LIST)
+    archetype_repartition = tournament.archetype_repartition
     print("Getting matchup table...")
-    matchup_table = get_matchup_table(RK9_URL)
-    print(matchup_table)
+    matchup_table = tournament.get_matchup_table(from_round_n=MAX_NUMBER_OF_ROUNDS)
 
-    score_per_archetype = {}
-    for archetype, matchup_data in matchup_table.items():
-        archetype_score = 0
-        for archetype_opponent, results in matchup_data.items():
-            nb_wins, nb_ties, nb_loss = results
-            number_of_matches = nb_wins + nb_ties + nb_loss
-            if number_of_matches == 0:
-                average_points = NO_MATCH_POINTS
-            else:
-                average_points = ((nb_wins*WIN_POINTS) + (nb_ties*TIE_POINTS) + (nb_loss*LOSE_POINTS)) / number_of_matches
-            repartition_in_the_tournament = archetype_repartition[archetype_opponent]
-            archetype_score += (repartition_in_the_tournament * average_points)
-        score_per_archetype[archetype] = archetype_score
+    solver = MetagameSolver(matchup_table)
+    shares = solver.get_share_vector(archetype_repartition)
+    expected_points = solver.get_expected_points(shares)
+    low_points, high_points = np.percentile(
+        solver.bootstrap_expected_points(shares, NB_BOOTSTRAP_SAMPLES), [5, 95], axis=0
+    )
+    # Row i: the expected points of every archetype when archetype i rises by SHARE_SHIFT
+    expected_points_if_rising = solver.get_expected_points(solver.get_shifted_shares(shares, SHARE_SHIFT))
+    best_index_if_rising = expected_points_if_rising.argmax(axis=1)
 
-    archetype_counter = get_archetype_counter(RK9_URL)
-    archetype_counter["comfey, iron-hands"] = 15
+    archetype_counter = tournament.archetype_counter
 
-    score_per_archetype = list(score_per_archetype.items())
-    score_per_archetype.sort(key=lambda x: x[1], reverse=True)
+    print(f"archetype                 | score  | 90% interval  | number in the tournament | "
+          f"best deck if it rises by {SHARE_SHIFT:.0%}")
+    for index in np.argsort(-expected_points):
+        archetype = solver.archetype_list[index]
+        print(f"{archetype:25} |  {expected_points[index]:.2f}  | {low_points[index]:.2f} - {high_points[index]:.2f} | "
+              f"{archetype_counter[archetype]:24} | {solver.archetype_list[best_index_if_rising[index]]}")
 
-    print("archetype                 | score  | number in the tournament")
-    for archetype, score in score_per_archetype:
-        print(f"{archetype:25} |  {score:.2f}  | {archetype_counter[archetype]}")
+    equilibrium_shares, exploitability = solver.solve_equilibrium()
+    print(f"Equilibrium metagame (the best deck gets {exploitability:.3f} points more than the field):")
+    for index in np.argsort(-equilibrium_shares):
+        if equilibrium_shares[index] >= 0.01:
+            print(f"{solver.archetype_list[index]:25} | {equilibrium_shares[index]:.0%}")
 
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
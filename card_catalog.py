@@ -0,0 +1,258 @@
+"""
+Interned cards and compact decklists.
+
+A decklist as a list of `(card_name, quantity)` tuples repeats the same few hundred card names in every deck of the
+season, in memory and in every pickle. Here, every `(card_name, card_set, card_type)` of the decklist pages gets a
+small integer id in a `CardCatalog`, and a decklist is two arrays on a `PlayerRecord`: its card ids and their
+quantities. The tuple form, where Pokémon names carry their set, is built on demand.
+
+Ids only mean something in the catalog of the process. Records are saved with `pack_player_records`, which stores
+the cards they use next to them, and loaded with `unpack_player_records`, which interns them again.
+
+Example Usage:
+    record = PlayerRecord.from_card_lines("Player Name [COUNTRY]", decklist_url, parse_decklist_page(content))
+    decklist = record.get_decklist()  # [("Charizard ex OBF 125", 3), ("Rare Candy", 4), ...]
+"""
+import re
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Type codes of the arrays of a record: 4-byte card ids, 1-byte quantities
+CARD_ID_TYPECODE = "I"
+QUANTITY_TYPECODE = "B"
+# The same, as NumPy dtypes, to view the arrays without copies
+CARD_ID_DTYPE = f"u{array(CARD_ID_TYPECODE).itemsize}"
+QUANTITY_DTYPE = f"u{array(QUANTITY_TYPECODE).itemsize}"
+# The set and number a Pokémon name carries in the tuple form of a decklist, e.g. "Charizard ex OBF 125"
+_CARD_SET_SUFFIX = re.compile(r"^(?P<card_name>.+) (?P<card_set>[A-Z][A-Za-z0-9-]* \S*\d\S*)$")
+
+
+class CardCatalog:
+    """
+    Every card seen so far, by id.
+    """
+
+    def __init__(self):
+        self.card_list: List[Tuple[str, str, str]] = []
+        self.cardname_list: List[str] = []
+        self.card_index: Dict[Tuple[str, str, str], int] = {}
+        # The first card of every name of the tuple form
+        self.cardname_index: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.card_list)
+
+    def intern(self, card_name: str, card_set: str, card_type: str) -> int:
+        """
+        Args:
+            card_name (str): The name of the card, e.g. "Charizard ex".
+            card_set (str): The set and number of the card, e.g. "OBF 125".
+            card_type (str): The type of the card: "pokemon", "trainer", "energy"...
+
+        Returns:
+            int: The id of the card, the same for every call with the same card.
+        """
+        card = (card_name, card_set, card_type)
+        card_id = self.card_index.get(card)
+        if card_id is None:
+            card_id = self.card_index[card] = len(self.card_list)
+            self.card_list.append(card)
+            # Pokémon of different sets are different cards in a decklist
+            cardname = f"{card_name} {card_set}" if card_type == "pokemon" else card_name
+            self.cardname_list.append(cardname)
+            self.cardname_index.setdefault(cardname, card_id)
+        return card_id
+
+    def intern_cardname(self, cardname: str) -> int:
+        """
+        Interns a card of the tuple form of a decklist, where only Pokémon names carry their set.
+        A card already seen with this name keeps its id. Otherwise, the set is split from the names that carry one,
+        which are Pokémon, and the other cards are energies or trainers by their name.
+
+        Args:
+            cardname (str): The name of the card, e.g. "Charizard ex OBF 125" or "Rare Candy".
+
+        Returns:
+            int: The id of the card.
+        """
+        card_id = self.cardname_index.get(cardname)
+        if card_id is not None:
+            return card_id
+        match = _CARD_SET_SUFFIX.match(cardname)
+        if match is not None:
+            return self.intern(match["card_name"], match["card_set"], "pokemon")
+        return self.intern(cardname, "", "energy" if cardname.endswith("Energy") else "trainer")
+
+    def get_card(self, card_id: int) -> Tuple[str, str, str]:
+        """
+        Returns:
+            Tuple[str, str, str]: The `(card_name, card_set, card_type)` of the card.
+        """
+        return self.card_list[card_id]
+
+    def get_cardname(self, card_id: int) -> str:
+        """
+        Returns:
+            str: The name of the card in the tuple form of a decklist, e.g. "Charizard ex OBF 125" or "Rare Candy".
+        """
+        return self.cardname_list[card_id]
+
+
+card_catalog = CardCatalog()
+
+
+class PlayerRecord:
+    """
+    The decklist of a player, as the ids of its cards in `card_catalog` and their quantities.
+    """
+    __slots__ = ("playername", "decklist_url", "card_ids", "quantities")
+
+    def __init__(self, playername: str, decklist_url: Optional[str], card_ids: array, quantities: array):
+        """
+        Args:
+            playername (str): The name of the player, e.g. "Player Name [COUNTRY]".
+            decklist_url (Optional[str]): The URL of the decklist page.
+            card_ids (array): The id of every card line of the decklist in `card_catalog`.
+            quantities (array): The quantity of every card line.
+        """
+        self.playername = playername
+        self.decklist_url = decklist_url
+        self.card_ids = card_ids
+        self.quantities = quantities
+
+    @classmethod
+    def from_card_lines(cls, playername: str, decklist_url: Optional[str],
+                        card_line_list: Iterable[Tuple[str, str, int, str]]) -> "PlayerRecord":
+        """
+        Args:
+            playername (str): The name of the player.
+            decklist_url (Optional[str]): The URL of the decklist page.
+            card_line_list (Iterable[Tuple[str, str, int, str]]): The `(card_name, card_set, quantity, card_type)`
+                lines of the decklist page, as returned by `parse_decklist_page`.
+
+        Returns:
+            PlayerRecord: The record.
+        """
+        quantity_per_card_id: Dict[int, int] = {}
+        for card_name, card_set, quantity, card_type in card_line_list:
+            card_id = card_catalog.intern(card_name, card_set, card_type)
+            quantity_per_card_id[card_id] = quantity_per_card_id.get(card_id, 0) + quantity
+        return cls(playername, decklist_url, array(CARD_ID_TYPECODE, quantity_per_card_id.keys()),
+                   array(QUANTITY_TYPECODE, quantity_per_card_id.values()))
+
+    @classmethod
+    def from_decklist(cls, playername: str, decklist_url: Optional[str],
+                      decklist: List[Tuple[str, int]]) -> "PlayerRecord":
+        """
+        Builds a record from the tuple form of a decklist, e.g. of a player database saved before the catalog.
+        Its cards are interned by `CardCatalog.intern_cardname`, so they share the ids of the cards of decklist pages.
+
+        Args:
+            playername (str): The name of the player.
+            decklist_url (Optional[str]): The URL of the decklist page.
+            decklist (List[Tuple[str, int]]): The `(card_name, quantity)` of every card.
+
+        Returns:
+            PlayerRecord: The record.
+        """
+        quantity_per_card_id: Dict[int, int] = {}
+        for cardname, quantity in decklist:
+            card_id = card_catalog.intern_cardname(cardname)
+            quantity_per_card_id[card_id] = quantity_per_card_id.get(card_id, 0) + quantity
+        return cls(playername, decklist_url, array(CARD_ID_TYPECODE, quantity_per_card_id.keys()),
+                   array(QUANTITY_TYPECODE, quantity_per_card_id.values()))
+
+    @property
+    def nb_cards(self) -> int:
+        return sum(self.quantities)
+
+    def get_decklist(self) -> List[Tuple[str, int]]:
+        """
+        Returns:
+            List[Tuple[str, int]]: The tuple form of the decklist, as returned by `get_decklist_from_url`:
+                Pokémon names carry their set, and the other cards of the same name are merged.
+        """
+        quantity_per_cardname: Dict[str, int] = {}
+        for card_id, quantity in zip(self.card_ids, self.quantities):
+            cardname = card_catalog.cardname_list[card_id]
+            quantity_per_cardname[cardname] = quantity_per_cardname.get(cardname, 0) + quantity
+        return list(quantity_per_cardname.items())
+
+
+class DecklistView(Mapping):
+    """
+    The tuple form of the decklists of records, by player name, built on access.
+    Stands for the `decklist_per_player` dict of a decklist database.
+    """
+
+    def __init__(self, record_per_player: Dict[str, PlayerRecord]):
+        self.record_per_player = record_per_player
+
+    def __getitem__(self, playername: str) -> List[Tuple[str, int]]:
+        return self.record_per_player[playername].get_decklist()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.record_per_player)
+
+    def __len__(self) -> int:
+        return len(self.record_per_player)
+
+    def __contains__(self, playername: object) -> bool:
+        return playername in self.record_per_player
+
+
+def pack_player_records(record_per_player: Dict[str, PlayerRecord]) -> Dict:
+    """
+    Prepares records to be saved, as columns: the card ids become indices in the list of the cards they use, and
+    the arrays of all the records are joined.
+
+    Args:
+        record_per_player (Dict[str, PlayerRecord]): The records.
+
+    Returns:
+        Dict: `{"cards": [(card_name, card_set, card_type)], "playernames": [str], "decklist_urls": [str],
+            "offsets": array, "card_ids": array, "quantities": array}`. The cards of record i are the elements
+            offsets[i] to offsets[i + 1] of card_ids and quantities.
+    """
+    local_id_per_card_id: Dict[int, int] = {}
+    offsets = array("q", [0])
+    local_card_ids = array(CARD_ID_TYPECODE)
+    quantities = array(QUANTITY_TYPECODE)
+    for record in record_per_player.values():
+        local_card_ids.extend(
+            local_id_per_card_id.setdefault(card_id, len(local_id_per_card_id)) for card_id in record.card_ids
+        )
+        quantities.extend(record.quantities)
+        offsets.append(len(local_card_ids))
+    if len(local_id_per_card_id) <= 1 << 16:
+        # A tournament uses a few hundred cards: their local ids fit in 2 bytes
+        local_card_ids = array("H", local_card_ids)
+    return {
+        "cards": [card_catalog.card_list[card_id] for card_id in local_id_per_card_id],
+        "playernames": [record.playername for record in record_per_player.values()],
+        "decklist_urls": [record.decklist_url for record in record_per_player.values()],
+        "offsets": offsets,
+        "card_ids": local_card_ids,
+        "quantities": quantities,
+    }
+
+
+def unpack_player_records(packed_records: Dict) -> Dict[str, PlayerRecord]:
+    """
+    Args:
+        packed_records (Dict): Records prepared by `pack_player_records`.
+
+    Returns:
+        Dict[str, PlayerRecord]: The records by player name, with the ids of `card_catalog`.
+    """
+    card_id_per_local_id = [card_catalog.intern(*card) for card in packed_records["cards"]]
+    card_ids = array(CARD_ID_TYPECODE, (card_id_per_local_id[local_id] for local_id in packed_records["card_ids"]))
+    quantities = packed_records["quantities"]
+    offsets = packed_records["offsets"]
+    return {
+        playername: PlayerRecord(playername, decklist_url, card_ids[offsets[i]:offsets[i + 1]],
+                                 quantities[offsets[i]:offsets[i + 1]])
+        for i, (playername, decklist_url) in enumerate(zip(packed_records["playernames"],
+                                                           packed_records["decklist_urls"]))
+    }
@@ -1,72 +1,495 @@
 """
 Goal: Avoid redownloading static pages by caching them on disk.
+
+Pages are cached in `page_store`, a single compressed SQLite file by default.
+Use `set_page_store` to plug in another backend, e.g. `FilePageStore` for the historical file-per-URL layout.
+
+How long a cached page is trusted depends on the first pattern of `CACHE_POLICIES` matching its URL:
+    immutable: The page never changes once published, e.g. a decklist. It is never fetched again.
+    ttl: The page is fetched again once it is older than `max_age` seconds.
+    revalidate: Once older than `max_age` seconds, the page is requested again with `If-None-Match`/
+        `If-Modified-Since`, so an unchanged page costs an empty 304 response instead of a full download.
+A ttl or revalidate page can also be considered final once it has been seen unchanged for `settle_after` seconds,
+e.g. the pairings of a tournament that ended.
+
+All the requests of the process share one budget of `MAX_REQUESTS_IN_FLIGHT` requests in flight, whatever the number
+of concurrent downloads, and a URL requested again while it is being fetched waits for that fetch instead of
+sending another request.
 """
 
-import os
+import asyncio
+import queue
+import random
+import re
+import threading
 import time
-from urllib.parse import quote
+from concurrent.futures import Future, ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 from mlp.bettercoding import print_del
 
+import instrumentation
+from page_store import PageEntry, PageStore, SQLitePageStore, get_digest
+
 
 only_useragent_headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 6.1; Win64; x64; rv:62.0) Gecko/20100101 Firefox/80.0",
 }
+NB_CONCURRENCY = 10
+POOL_MAXSIZE = 32
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 60.
+PAGE_STORE_PATH = "page_store.sqlite"
+MAX_REQUESTS_IN_FLIGHT = POOL_MAXSIZE
+
+page_store: PageStore = SQLitePageStore(PAGE_STORE_PATH)
+
+
+class CachePolicy(NamedTuple):
+    """
+    How long a cached page can be used before asking the server again.
+    `mode` is one of "immutable", "ttl" or "revalidate", and `max_age` is in seconds.
+    When `settle_after` is set, a page seen unchanged for that many seconds is never asked again.
+    """
+    mode: str
+    max_age: float = 0.
+    settle_after: Optional[float] = None
+
+
+IMMUTABLE = CachePolicy("immutable")
+
+# The first pattern found in the URL gives its policy
+CACHE_POLICIES: List[Tuple[str, CachePolicy]] = [
+    (r"/decklist/public/", IMMUTABLE),
+    (r"/pairings/", CachePolicy("revalidate", max_age=5*60, settle_after=24*60*60)),
+    (r"/roster/", CachePolicy("ttl", max_age=60*60)),
+]
+DEFAULT_CACHE_POLICY = IMMUTABLE
+
+# A single adapter is mounted on the session of every thread, so all threads draw from the same pool of
+# keep-alive connections. urllib3 pools are thread-safe, `requests.Session` objects are not.
+_http_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+_thread_local = threading.local()
+_request_budget = threading.BoundedSemaphore(MAX_REQUESTS_IN_FLIGHT)
+# The fetch in progress of every URL being fetched, so other threads asking for the same URL can wait for it
+_in_flight_fetches: Dict[str, Future] = {}
+_in_flight_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the HTTP session of the current thread, creating it on first use.
+    Every session shares the same connection pool, so connections to rk9.gg are reused across threads.
+
+    Returns:
+        requests.Session: The session of the current thread.
+    """
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(only_useragent_headers)
+        session.mount("https://", _http_adapter)
+        session.mount("http://", _http_adapter)
+        _thread_local.session = session
+    return session
+
+
+def _get_backoff_delay(nb_retry: int) -> float:
+    """
+    Computes the jittered exponential backoff before the given retry.
+    Half of the delay is fixed and half is random, so that threads failing together do not retry together.
+
+    Args:
+        nb_retry (int): The number of the retry, starting at 1.
+
+    Returns:
+        float: The number of seconds to wait.
+    """
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (nb_retry - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _get_retry_after_delay(page: requests.Response) -> Optional[float]:
+    """
+    Reads the delay requested by the server in the `Retry-After` header, if any.
+
+    Args:
+        page (requests.Response): The response of the server.
 
+    Returns:
+        Optional[float]: The number of seconds to wait, or None if the header is missing or invalid.
+    """
+    retry_after = page.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(0., float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0., retry_date.timestamp() - time.time())
 
-def get_page_from_url(url: str, max_retries: int = 100) -> requests.Response:
+
+def get_page_from_url(url: str, max_retries: int = 10, headers: Optional[Dict[str, str]] = None) -> requests.Response:
     """
     Downloads a web page from the given URL with retry logic.
+    Network errors and 429/5xx responses are retried with a jittered exponential backoff,
+    or after the delay given by the `Retry-After` header when the server sends one.
 
     Args:
         url (str): The URL of the web page to download.
         max_retries (int): The maximum number of retries.
+        headers (Optional[Dict[str, str]]): Extra headers of the request, e.g. to make it conditional.
 
     Returns:
         requests.Response: The HTTP response object containing the web page content.
+
+    Raises:
+        requests.exceptions.RequestException: If the page still can't be downloaded after `max_retries` tries.
     """
     print(f"Downloading {url}...")
+    session = get_session()
     nb_retry = 1
     while True:
+        instrumentation.count("http.requests")
+        request_start = time.perf_counter()
         try:
-            page = requests.get(url, headers=only_useragent_headers, timeout=120)
-            return page
+            with _request_budget:
+                page = session.get(url, headers=headers, timeout=120)
+            instrumentation.observe("http.request", time.perf_counter() - request_start)
+            if page.status_code not in RETRY_STATUS_CODES:
+                return page
+            if nb_retry >= max_retries:
+                page.raise_for_status()
+            delay = _get_retry_after_delay(page)
+            if delay is None:
+                delay = _get_backoff_delay(nb_retry)
+            error_message = f"HTTP {page.status_code}"
         except requests.exceptions.RequestException as e:
             if nb_retry >= max_retries:
                 raise e
-            if nb_retry > 1:
-                print_del()
-            print(f"{e} | Retrying for the {nb_retry} time")
-            time.sleep(5)
+            delay = _get_backoff_delay(nb_retry)
+            error_message = str(e)
+        if nb_retry > 1:
+            print_del()
+        print(f"{error_message} | Retrying for the {nb_retry} time in {delay:.1f}s")
+        instrumentation.count("http.retries")
+        instrumentation.count("http.retry_wait_seconds", delay)
+        time.sleep(delay)
         nb_retry += 1
 
 
-def get_url(url: str) -> bytes:
+def set_request_budget(max_requests_in_flight: int) -> None:
+    """
+    Sets the number of requests that can be in flight at the same time, across every thread of the process.
+
+    Args:
+        max_requests_in_flight (int): The maximum number of requests in flight.
+    """
+    global _request_budget
+    _request_budget = threading.BoundedSemaphore(max_requests_in_flight)
+
+
+def set_page_store(store: PageStore) -> None:
+    """
+    Replaces the backend used to cache the pages.
+
+    Args:
+        store (PageStore): The new backend.
+    """
+    global page_store
+    page_store = store
+
+
+def get_cache_policy(url: str) -> CachePolicy:
+    """
+    Finds the cache policy of a URL in `CACHE_POLICIES`.
+
+    Args:
+        url (str): The URL of the page.
+
+    Returns:
+        CachePolicy: The policy of the first matching pattern, or `DEFAULT_CACHE_POLICY`.
+    """
+    for pattern, policy in CACHE_POLICIES:
+        if re.search(pattern, url):
+            return policy
+    return DEFAULT_CACHE_POLICY
+
+
+def _is_fresh(entry: PageEntry, policy: CachePolicy) -> bool:
+    """
+    Tells whether a cached page can be used without asking the server.
+
+    Args:
+        entry (PageEntry): The cached page.
+        policy (CachePolicy): The cache policy of the page.
+
+    Returns:
+        bool: True if the cached page can be used as is.
+    """
+    if policy.mode == "immutable":
+        return True
+    if entry.fetched_at is None:
+        return False
+    if time.time() - entry.fetched_at < policy.max_age:
+        return True
+    return (
+        policy.settle_after is not None
+        and entry.changed_at is not None
+        and entry.fetched_at - entry.changed_at >= policy.settle_after
+    )
+
+
+def get_url(url: str, policy: Optional[CachePolicy] = None) -> bytes:
     """
-    Retrieves the content of a URL. If the content is cached locally, loads it from disk.
-    Otherwise, downloads the content and caches it.
+    Retrieves the content of a URL. If the content is cached in the page store and still fresh according to the
+    cache policy of the URL, loads it from there. Otherwise, downloads the content and caches it.
+    If another thread is already fetching the URL, waits for its result instead.
 
     Args:
         url (str): The URL to retrieve content from.
+        policy (Optional[CachePolicy]): Overrides the cache policy of the URL.
 
     Returns:
         bytes: The binary content of the URL.
     """
-    path_on_disk = quote(url.replace("https://", ""), encoding="utf-8")
-    if os.path.exists(path_on_disk):
-        with open(path_on_disk, "rb") as f:
-            content = f.read()
+    if policy is None:
+        policy = get_cache_policy(url)
+    entry = page_store.get_entry(url)
+    if entry is not None and _is_fresh(entry, policy):
+        instrumentation.count("cache.hits")
+        instrumentation.count("bytes.read", len(entry.content))
+        return entry.content
+
+    with _in_flight_lock:
+        fetch = _in_flight_fetches.get(url)
+        is_fetching_thread = fetch is None
+        if is_fetching_thread:
+            fetch = _in_flight_fetches[url] = Future()
+    if not is_fetching_thread:
+        instrumentation.count("cache.deduplicated")
+        return fetch.result()
+
+    try:
+        content = _fetch_into_page_store(url, entry, policy)
+    except BaseException as e:
+        fetch.set_exception(e)
+        raise
+    else:
+        fetch.set_result(content)
         return content
-    page = get_page_from_url(url)
+    finally:
+        with _in_flight_lock:
+            del _in_flight_fetches[url]
+
+
+def _fetch_into_page_store(url: str, entry: Optional[PageEntry], policy: CachePolicy) -> bytes:
+    """
+    Downloads a URL and caches its content, with a conditional request when the policy allows it.
+
+    Args:
+        url (str): The URL to download.
+        entry (Optional[PageEntry]): The cached page, if any.
+        policy (CachePolicy): The cache policy of the URL.
+
+    Returns:
+        bytes: The binary content of the URL.
+    """
+    conditional_headers = {}
+    if entry is not None and policy.mode == "revalidate":
+        if entry.etag is not None:
+            conditional_headers["If-None-Match"] = entry.etag
+        if entry.last_modified is not None:
+            conditional_headers["If-Modified-Since"] = entry.last_modified
+
+    page = get_page_from_url(url, headers=conditional_headers or None)
+    if page.status_code == 304 and entry is not None:
+        instrumentation.count("cache.revalidated")
+        instrumentation.count("bytes.read", len(entry.content))
+        page_store.touch(url)
+        return entry.content
+    instrumentation.count("cache.misses" if entry is None else "cache.refreshed")
     content = page.content
-    os.makedirs(os.path.dirname(path_on_disk), exist_ok=True)
-    with open(path_on_disk, "wb") as f:
-        f.write(content)
+    instrumentation.count("bytes.fetched", len(content))
+    page_store.put(url, content, etag=page.headers.get("ETag"), last_modified=page.headers.get("Last-Modified"))
     return content
 
 
+def get_url_digest(url: str, policy: Optional[CachePolicy] = None) -> str:
+    """
+    Retrieves the digest of the content of a URL, downloading it first if the cached page is missing or not fresh.
+    A fresh cached page is not even read: its digest comes from the metadata of the page store.
+    This is what processed data uses to tell whether the page it was computed from changed.
+
+    Args:
+        url (str): The URL to retrieve the digest of.
+        policy (Optional[CachePolicy]): Overrides the cache policy of the URL.
+
+    Returns:
+        str: The digest of the content of the URL.
+    """
+    if policy is None:
+        policy = get_cache_policy(url)
+    entry = page_store.get_entry(url, with_content=False)
+    if entry is not None and entry.digest is not None and _is_fresh(entry, policy):
+        instrumentation.count("cache.digest_hits")
+        return entry.digest
+    return get_digest(get_url(url, policy))
+
+
+def _fetch_url(url: str, on_page: Optional[Callable[[str, bytes], None]]) -> None:
+    """
+    Ensures a URL is in the cache and hands its content to the optional callback.
+    Runs inside a worker thread of the download engine.
+
+    Args:
+        url (str): The URL to retrieve.
+        on_page (Optional[Callable[[str, bytes], None]]): Called with the URL and its content once retrieved.
+    """
+    content = get_url(url)
+    if on_page is not None:
+        on_page(url, content)
+
+
+async def _download_worker(work_queue: asyncio.Queue,
+                           executor: ThreadPoolExecutor,
+                           on_page: Optional[Callable[[str, bytes], None]],
+                           failures: Dict[str, Exception],
+                           stopped: Optional[threading.Event]) -> None:
+    """
+    Pulls URLs from the work queue until it is empty or the downloads are stopped. A slow URL only holds its own
+    worker, the other workers keep pulling from the queue in the meantime.
+
+    Args:
+        work_queue (asyncio.Queue): The queue of URLs left to download.
+        executor (ThreadPoolExecutor): The executor running the blocking downloads.
+        on_page (Optional[Callable[[str, bytes], None]]): Called with the URL and its content once retrieved.
+        failures (Dict[str, Exception]): Filled with the URLs that could not be downloaded.
+        stopped (Optional[threading.Event]): Once set, the URLs left in the queue are not downloaded.
+    """
+    loop = asyncio.get_running_loop()
+    while not work_queue.empty() and not (stopped is not None and stopped.is_set()):
+        url = work_queue.get_nowait()
+        try:
+            await loop.run_in_executor(executor, _fetch_url, url, on_page)
+        except Exception as e:
+            print(f"Failed to download {url}: {e}")
+            failures[url] = e
+
+
+async def download_urls_async(url_list: Iterable[str],
+                              nb_concurrency: int = NB_CONCURRENCY,
+                              on_page: Optional[Callable[[str, bytes], None]] = None,
+                              stopped: Optional[threading.Event] = None) -> Dict[str, Exception]:
+    """
+    Downloads a list of URLs into the on-disk cache, keeping up to `nb_concurrency` requests in flight.
+    URLs already in the cache are read from disk and do not use any network.
+
+    Args:
+        url_list (Iterable[str]): The URLs to download. Duplicates are only downloaded once.
+        nb_concurrency (int): The maximum number of requests in flight.
+        on_page (Optional[Callable[[str, bytes], None]]): Called with the URL and its content once retrieved.
+            It is called from a worker thread, so it must be thread-safe.
+        stopped (Optional[threading.Event]): Once set, no new download is started. The ones in flight finish.
+
+    Returns:
+        Dict[str, Exception]: The URLs that could not be downloaded, with the error raised for each of them.
+    """
+    work_queue = asyncio.Queue()
+    for url in dict.fromkeys(url_list):
+        work_queue.put_nowait(url)
+
+    failures = {}
+    nb_workers = max(1, min(nb_concurrency, work_queue.qsize()))
+    with ThreadPoolExecutor(max_workers=nb_workers) as executor:
+        await asyncio.gather(*(
+            _download_worker(work_queue, executor, on_page, failures, stopped) for _ in range(nb_workers)
+        ))
+    return failures
+
+
+def download_urls(url_list: Iterable[str],
+                  nb_concurrency: int = NB_CONCURRENCY,
+                  on_page: Optional[Callable[[str, bytes], None]] = None,
+                  stopped: Optional[threading.Event] = None) -> Dict[str, Exception]:
+    """
+    Synchronous entry point of `download_urls_async`, for scripts that are not running an event loop.
+
+    Args:
+        url_list (Iterable[str]): The URLs to download. Duplicates are only downloaded once.
+        nb_concurrency (int): The maximum number of requests in flight.
+        on_page (Optional[Callable[[str, bytes], None]]): Called with the URL and its content once retrieved.
+        stopped (Optional[threading.Event]): Once set, no new download is started. The ones in flight finish.
+
+    Returns:
+        Dict[str, Exception]: The URLs that could not be downloaded, with the error raised for each of them.
+    """
+    with instrumentation.stage("download"):
+        return asyncio.run(download_urls_async(url_list, nb_concurrency, on_page, stopped))
+
+
+def iter_urls(url_list: Iterable[str],
+              nb_concurrency: int = NB_CONCURRENCY,
+              max_pending: Optional[int] = None) -> Iterator[Tuple[str, bytes]]:
+    """
+    Downloads a list of URLs like `download_urls`, and yields every page as soon as it is retrieved,
+    so the caller can process the first pages while the next ones are downloading.
+    At most `max_pending` retrieved pages wait for the caller: past that, the downloads pause.
+
+    Args:
+        url_list (Iterable[str]): The URLs to download. Duplicates are only downloaded once.
+        nb_concurrency (int): The maximum number of requests in flight.
+        max_pending (Optional[int]): The maximum number of pages waiting for the caller.
+            Defaults to twice `nb_concurrency`.
+
+    Yields:
+        Tuple[str, bytes]: The URL and the content of every page, in the order they are retrieved.
+            Pages that could not be downloaded are reported and skipped.
+    """
+    pending_pages = queue.Queue(maxsize=max_pending or 2 * nb_concurrency)
+    stopped = threading.Event()
+    end_of_pages = object()
+
+    def put_pending(item: object) -> None:
+        # Once the caller stopped, nobody takes from the queue anymore: the item is dropped instead of blocking
+        while not stopped.is_set():
+            try:
+                pending_pages.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def on_page(url: str, content: bytes) -> None:
+        put_pending((url, content))
+
+    def download_in_background() -> None:
+        try:
+            download_urls(url_list, nb_concurrency, on_page, stopped)
+        finally:
+            put_pending(end_of_pages)
+
+    thread = threading.Thread(target=download_in_background, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pending_pages.get()
+            if item is end_of_pages:
+                break
+            yield item
+    finally:
+        # If the caller stops early, the downloads left are not started, and the ones in flight are not waited for
+        stopped.set()
+
+
 def get_soup_from_url(url: str) -> BeautifulSoup:
     """
     Retrieves a BeautifulSoup object parsed from the content of a URL.
@@ -2,87 +2,55 @@
 Tournament Data Downloader Module
 
 This module automates downloading tournament-related data from URLs. It retrieves decklist URLs for players
-from an external pairing system and utilizes multithreading to download data efficiently.
+from an external pairing system and downloads every page of the tournament through the asyncio download engine
+of `download_manager`, which keeps a fixed number of requests in flight from a shared work queue.
 
 Constants:
     RK9_URL (str): URL to fetch tournament pairings and decklist information.
-    NB_CONCURRENCY (int): Number of concurrent threads for downloading.
+    NB_CONCURRENCY (int): Number of requests in flight while downloading.
 
 Functions:
-    download_urls(url_list: List[str]) -> None:
-        Downloads content from a list of URLs using the get_url function.
-
-    split(lst: List[str], parts: int) -> List[List[str]]:
-        Divides a list into nearly equal-sized parts for balanced workload distribution.
+    get_urls_of_tournament(url: str) -> List[str]:
+        Lists every page of a tournament: pairing rounds not embedded in the tournament page, and decklists.
 
 Execution:
     When executed directly, the script will download the tournament associated with the RK9_URL constant.
 """
 
-import random
-import threading
 from typing import List
 
-from download_manager import get_url
-from generate_matchup_table import get_decklist_url_per_player
+from download_manager import download_urls
+from generate_matchup_table import discover_pairing_rounds, get_decklist_url_per_player
 
 RK9_URL = "https://rk9.gg/pairings/WCS01mIMYt8if4wVuaO0" # Worlds
 RK9_URL = "https://rk9.gg/pairings/AT01mlKrCumqFDXZi5Y1" # Atlanta
-NB_CONCURENCY = 10
+NB_CONCURRENCY = 10
 
 
-def download_urls(url_list: List[str]) -> None:
+def get_urls_of_tournament(url: str) -> List[str]:
     """
-    Ensure a list of URLs is downloaded by calling the `get_url` function.
+    Lists every page needed to analyze a tournament: the pairing page of every round played and every decklist.
+    The tournament and roster pages are downloaded on the way, since they are needed to find the rounds and the
+    decklist URLs. Rounds whose matches are embedded in the tournament page are not listed.
 
     Args:
-        url_list (List[str]): A list of URLs to download.
-    """
-    for url in url_list:
-        get_url(url)
-
-def split(lst: List[str], parts: int) -> List[List[str]]:
-    """
-    Splits a list into a specified number of nearly equal parts.
-
-    Args:
-        lst (List[str]): The list to split.
-        parts (int): The number of parts to split the list into.
+        url (str): The URL of the tournament.
 
     Returns:
-        List[List[str]]: A list of sublists, where each sublist is a chunk of the original list.
+        List[str]: The URLs of the pairing rounds followed by the URLs of the decklists.
     """
-    if parts <= 0:
-        raise ValueError("The number of parts must be greater than 0.")
-
-    chunk_size, remainder = divmod(len(lst), parts)
-    results = []
-
-    start = 0
-    for _ in range(parts):
-        end = start + chunk_size
-        results.append(lst[start:end])
-        start = end
-
-    if remainder > 0:
-        results[-1] += lst[-remainder:]
-
-    return results
+    round_url_list, match_list_per_embedded_round = discover_pairing_rounds(url)
+    decklist_url_per_player = get_decklist_url_per_player(url)
+    return [
+        round_url for round_index, round_url in enumerate(round_url_list)
+        if round_index not in match_list_per_embedded_round
+    ] + list(decklist_url_per_player.values())
 
 
 if __name__ == "__main__":
-    decklist_url_per_player = get_decklist_url_per_player(RK9_URL)
-    url_chunk = list(decklist_url_per_player.values())
-    random.shuffle(url_chunk) # Shuffling in case some url have already been downloaded
-
-    url_list_split = split(url_chunk, NB_CONCURENCY)
-    thread_list = []
-    for url_chunk in url_list_split:
-        thread = threading.Thread(target=download_urls, args=[url_chunk])
-        thread.start()
-        thread_list.append(thread)
-
-    for thread in thread_list:
-        thread.join()
-
-    print("Congratulations!! You downloaded your tournament :)")
+    url_list = get_urls_of_tournament(RK9_URL)
+    failures = download_urls(url_list, nb_concurrency=NB_CONCURRENCY)
+    if failures:
+        print(f"{len(failures)} pages could not be downloaded: {list(failures.keys())}")
+    else:
+        print("Congratulations!! You downloaded your tournament :)")
@@ -11,16 +11,24 @@ Example Usage:
     create_html_table(table_data, "matchups.html")
 """
 import os
+from array import array
 from collections import Counter
-from typing import Dict, List, Tuple
-from urllib.parse import quote
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urljoin
 import pickle
 
-from bs4 import BeautifulSoup
+import numpy as np
 from mlp.html_table import create_html_table
 
-from archetype_parser import parse_decklist_into_archetype
-from download_manager import get_soup_from_url
+from archetype_parser import classify_player_records, get_rules_version
+from card_catalog import DecklistView, PlayerRecord, pack_player_records, unpack_player_records
+import download_manager
+import instrumentation
+from download_manager import download_urls, get_url, get_url_digest, set_page_store
+from matchup_html import POKEMON_IMAGE_URL_FORMAT, export_matchup_table_html
+from matchup_tensor import MatchupTable
+from page_parser import parse_decklist_page, parse_pairings_page, parse_pairings_rounds, parse_roster_page
 
 RK9_URL = "https://rk9.gg/pairings/ORL01mtNi5LV1IgmscGJ" # Orlando
 RK9_URL = "https://rk9.gg/pairings/SAO01mt4psEefFM1ZHAx" # Sao Paulo
@@ -39,6 +47,39 @@ RK9_URL_LIST = [
     "https://rk9.gg/pairings/BE01wYmCBW1HzjObcfgo", # Belo Horizonte
     "https://rk9.gg/pairings/MK01mzXPKCuqXfZ1ay6j", # Milwaukee
 ]
+WINNER_TAGS = ("P1", "P2", "TIE")
+MAX_NUMBER_OF_ROUNDS = 18
+# The compact export builds the table in the browser from JSON, instead of writing every cell and tooltip
+COMPACT_HTML_EXPORT = True
+MIN_PLAYERS_FOR_PROCESS_POOL = 64
+
+
+def get_processed_database_path(url: str, extension: str) -> str:
+    """
+    Get the path where data processed from a tournament is saved.
+
+    Args:
+        url (str): The URL of the tournament.
+        extension (str): The extension of the file, telling which data it contains, e.g. ".pkl".
+
+    Returns:
+        str: The path of the file.
+    """
+    return "./processed_database/" + quote(url.replace("https://", ""), encoding="utf-8") + extension
+
+
+def read_url_file(path: str) -> List[str]:
+    """
+    Read the tournament URLs of a text file, for the scripts taking a list of tournaments.
+
+    Args:
+        path (str): A text file with one URL per line. Empty lines and lines starting with # are ignored.
+
+    Returns:
+        List[str]: The URLs.
+    """
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
 
 
 def get_decklist_from_url(url: str) -> List[Tuple[str, int]]:
@@ -55,30 +96,71 @@ def get_decklist_from_url(url: str) -> List[Tuple[str, int]]:
     Raises:
         ValueError: If the decklist does not have exactly 60 cards.
     """
-    soup = get_soup_from_url(url)
-    table = soup.find_all("table")[0]
-    all_card_lines = table.find_all("li")
-
-    decklist = {}
-    for card in all_card_lines:
-        card_name = card["data-cardname"]
-        card_set = card["data-setnum"]
-        quantity = int(card["data-quantity"])
-        card_type = card["data-cardtype"]
-        if card_type == "pokemon":
-            card_name = card_name + " " + card_set
-        if card_name in decklist.keys():
-            decklist[card_name] += quantity
-        else:
-            decklist[card_name] = quantity
-    decklist = list(decklist.items())
-    number_of_card_in_deck = sum([quantity for card, quantity in decklist])
+    return get_decklist_from_content(get_url(url))
+
+
+def get_decklist_from_content(content: bytes) -> List[Tuple[str, int]]:
+    """
+    Parse a player's decklist from the content of its page.
+
+    Args:
+        content (bytes): The content of the page https://rk9.gg/decklist/public/...
+
+    Returns:
+        List[Tuple[str, int]]: A list of cards and their quantities in the decklist.
+
+    Raises:
+        ValueError: If the decklist does not have exactly 60 cards.
+    """
+    return get_player_record_from_content(content).get_decklist()
+
+
+def get_player_record_from_content(content: bytes, playername: str = "",
+                                   decklist_url: Optional[str] = None) -> PlayerRecord:
+    """
+    Parse a player's decklist from the content of its page, as a compact record of the card catalog.
+
+    Args:
+        content (bytes): The content of the page https://rk9.gg/decklist/public/...
+        playername (str, optional): The name of the player.
+        decklist_url (Optional[str], optional): The URL of the page.
+
+    Returns:
+        PlayerRecord: The decklist of the player.
+
+    Raises:
+        ValueError: If the decklist does not have exactly 60 cards.
+    """
+    card_line_list = parse_decklist_page(content)
+    _check_number_of_cards(card_line_list)
+    return PlayerRecord.from_card_lines(playername, decklist_url, card_line_list)
+
+
+def _check_number_of_cards(card_line_list: List[Tuple[str, str, int, str]]) -> None:
+    """
+    Raises:
+        ValueError: If the card lines of a decklist page do not count exactly 60 cards.
+    """
+    number_of_card_in_deck = sum(quantity for card_name, card_set, quantity, card_type in card_line_list)
     if number_of_card_in_deck != 60:
         raise ValueError(f"The decklist doesn't count 60 cards! (Number of card found: {number_of_card_in_deck})")
-    return decklist
 
 
 
+def get_roster_url(url: str) -> str:
+    """
+    Get the URL of the roster page of a tournament, on the same host as the tournament.
+
+    Args:
+        url (str): The URL of the tournament.
+
+    Returns:
+        str: The URL of the roster page.
+    """
+    tournament_url_code = url.split("/")[-1]
+    return urljoin(url, f"/roster/{tournament_url_code}")
+
+
 def get_decklist_url_per_player(url: str) -> Dict[str, str]:
     """
     Retrieve a mapping of player names to their decklist URLs.
@@ -89,85 +171,431 @@ def get_decklist_url_per_player(url: str) -> Dict[str, str]:
     Returns:
         Dict[str, str]: A dictionary mapping player names to decklist URLs.
     """
-    tournament_url_code = url.split("/")[-1]
-    roster_url = f"https://rk9.gg/roster/{tournament_url_code}"
-    soup = get_soup_from_url(roster_url)
-
     decklist_url_per_player = {}
 
-    roster_table = soup.find_all("div", class_="card-body")[0].find_all("tbody")[0]
-    table_row_list = roster_table.find_all("tr")
-    for row in table_row_list:
-        row_infos = row.find_all("td")
-        first_name = row_infos[1].text.strip()
-        last_name = row_infos[2].text.strip()
-        country = row_infos[3].text.strip()
-        division = row_infos[4].text.strip()
-        decklist_slot = row_infos[5]
-        decklist_status = decklist_slot.text.strip()
+    roster = parse_roster_page(get_url(get_roster_url(url)))
+    for first_name, last_name, country, division, decklist_status, decklist_href in roster:
         if division != "Masters":
             continue
         if decklist_status == "View":
-            decklist_url = "https://rk9.gg" + decklist_slot.find_all("a")[0]["href"]
+            decklist_url = urljoin(url, decklist_href)
             player_name_whole = f"{first_name} {last_name} [{country}]"
             decklist_url_per_player[player_name_whole] = decklist_url
 
     return decklist_url_per_player
 
 
-def get_players_decklist_infos_from_tournament_url(url: str) -> Dict[str, Dict[str, List[str]]]:
+def _parse_decklist_of_player(player_and_decklist_url: Tuple[str, str]) -> Tuple[str, Optional[List],
+                                                                                  Optional[str]]:
     """
-    Get decklist and archetype of every players in a tournament.
+    Parse the decklist of a player. Runs in a worker process when parsing with a process pool.
+    Card ids are only valid in the process that interned them, so the card lines are sent back as they are.
+
+    Args:
+        player_and_decklist_url (Tuple[str, str]): The name of the player and the URL of their decklist.
+
+    Returns:
+        Tuple[str, Optional[List[Tuple[str, str, int, str]]], Optional[str]]: `(playername, card_lines, error)`.
+            When the decklist is invalid, card_lines is None and error explains why.
+    """
+    playername, decklist_url = player_and_decklist_url
+    try:
+        card_line_list = parse_decklist_page(get_url(decklist_url))
+        _check_number_of_cards(card_line_list)
+    except Exception as e:
+        return playername, None, f"{decklist_url}: {e}"
+    return playername, card_line_list, None
+
+
+def make_decklist_database(decklist_url_per_player: Dict[str, str],
+                           record_per_player: Dict[str, PlayerRecord],
+                           decklist_error_per_player: Dict[str, str]) -> Dict[str, Dict]:
+    """
+    Assemble a decklist database from its parts, e.g. decklists parsed elsewhere than here.
+
+    Args:
+        decklist_url_per_player (Dict[str, str]): The URL of the decklist of every player.
+        record_per_player (Dict[str, PlayerRecord]): The record of every valid decklist.
+        decklist_error_per_player (Dict[str, str]): Why the decklist of a player is invalid.
+
+    Returns:
+        Dict[str, Dict]: The decklist database, as returned by `get_decklist_database_from_tournament_url`.
+    """
+    return {
+        "decklist_url_per_player": decklist_url_per_player,
+        "player_record_per_player": record_per_player,
+        "decklist_per_player": DecklistView(record_per_player),
+        "decklist_error_per_player": decklist_error_per_player,
+    }
+
+
+def get_decklist_database_from_tournament_url(url: str, nb_processes: Optional[int] = None) -> Dict[str, Dict]:
+    """
+    Get the decklist of every player in a tournament. Decklists never change once published,
+    so they are parsed once and saved in the processed database, as records of the card catalog.
+    Decklist pages are first downloaded concurrently, then parsed by a pool of processes for big rosters, and
+    classified all at once. An invalid decklist is reported and its player left out, instead of stopping the whole
+    tournament.
 
     Args:
         url (str): The URL of the tournament.
+        nb_processes (Optional[int], optional): The number of processes parsing the decklists.
+            Defaults to the number of CPUs. With 1, or for small rosters, everything is parsed in this process.
 
     Returns:
-        Dict[str, Dict[str, List]]: A dictionary with player details, including decklist and archetype.
-            The returned dict is formatted as such:
-            `{"Player Name [COUNTRY]": {"decklist": [cards], "archetype": ["pokemon1", "pokemon2"]} }`
+        Dict[str, Dict]: The decklists and their URLs, formatted as such:
+            `{"decklist_url_per_player": {"Player Name [COUNTRY]": url},
+              "player_record_per_player": {"Player Name [COUNTRY]": PlayerRecord},
+              "decklist_per_player": {"Player Name [COUNTRY]": [cards]},
+              "decklist_error_per_player": {"Player Name [COUNTRY]": "why the decklist is invalid"}}`
+            decklist_per_player builds the `(card_name, quantity)` tuples of a decklist when it is accessed.
     """
-    path_on_disk = "./processed_database/" + quote(url.replace("https://", ""), encoding="utf-8") + ".pkl"
+    path_on_disk = get_processed_database_path(url, ".decklists.pkl")
     if os.path.exists(path_on_disk):
-        print(f"Player database exists on disk. Loading from {path_on_disk}")
+        print(f"Decklist database exists on disk. Loading from {path_on_disk}")
         with open(path_on_disk, "rb") as f:
             content = pickle.load(f)
-        return content
+        if "player_records" in content:
+            return make_decklist_database(content["decklist_url_per_player"],
+                                           unpack_player_records(content["player_records"]),
+                                           content["decklist_error_per_player"])
+        # Decklists saved as tuples before the card catalog: saved again as records
+        decklist_database = make_decklist_database(
+            content["decklist_url_per_player"],
+            {playername: PlayerRecord.from_decklist(playername, content["decklist_url_per_player"].get(playername),
+                                                    decklist)
+             for playername, decklist in content["decklist_per_player"].items()},
+            content["decklist_error_per_player"],
+        )
+        save_decklist_database(url, decklist_database)
+        return decklist_database
 
-    player_database = {}
     decklist_url_per_player = get_decklist_url_per_player(url)
+    record_per_player = {}
+    decklist_error_per_player = {}
+    legacy_path_on_disk = get_processed_database_path(url, ".pkl")
+    if os.path.exists(legacy_path_on_disk):
+        # Player database saved before decklists and archetypes were split: its decklists are still valid
+        print(f"Importing decklists from the legacy player database {legacy_path_on_disk}")
+        with open(legacy_path_on_disk, "rb") as f:
+            legacy_player_database = pickle.load(f)
+        record_per_player = {
+            playername: PlayerRecord.from_decklist(playername, decklist_url_per_player.get(playername),
+                                                   infos["decklist"])
+            for playername, infos in legacy_player_database.items()
+        }
+    else:
+        download_urls(decklist_url_per_player.values())
+        if nb_processes is None:
+            nb_processes = os.cpu_count() or 1
+        player_and_decklist_url_list = list(decklist_url_per_player.items())
+        if nb_processes > 1 and len(player_and_decklist_url_list) >= MIN_PLAYERS_FOR_PROCESS_POOL:
+            with Pool(nb_processes, initializer=set_page_store, initargs=(download_manager.page_store,)) as pool:
+                result_list = pool.map(_parse_decklist_of_player, player_and_decklist_url_list, chunksize=16)
+        else:
+            result_list = map(_parse_decklist_of_player, player_and_decklist_url_list)
+
+        for playername, card_line_list, error in result_list:
+            if error is not None:
+                decklist_error_per_player[playername] = error
+                continue
+            record_per_player[playername] = PlayerRecord.from_card_lines(
+                playername, decklist_url_per_player[playername], card_line_list
+            )
+        if decklist_error_per_player:
+            print(f"{len(decklist_error_per_player)} invalid decklists were left out:")
+            for playername, error in decklist_error_per_player.items():
+                print(f"    {playername}: {error}")
+        archetype_list = classify_player_records(list(record_per_player.values()))
+        save_archetype_per_player(url, dict(zip(record_per_player.keys(), archetype_list)))
+
+    decklist_database = make_decklist_database(decklist_url_per_player, record_per_player, decklist_error_per_player)
+    save_decklist_database(url, decklist_database)
+    return decklist_database
+
+
+def save_decklist_database(url: str, decklist_database: Dict[str, Dict]) -> None:
+    """
+    Save the decklists of a tournament, as returned by `get_decklist_database_from_tournament_url`.
+    The records are saved with the cards they use, see `pack_player_records`.
+
+    Args:
+        url (str): The URL of the tournament.
+        decklist_database (Dict[str, Dict]): The decklists and their URLs.
+    """
+    path_on_disk = get_processed_database_path(url, ".decklists.pkl")
+    os.makedirs(os.path.dirname(path_on_disk), exist_ok=True)
+    with open(path_on_disk, "wb") as f:
+        pickle.dump({
+            "decklist_url_per_player": decklist_database["decklist_url_per_player"],
+            "player_records": pack_player_records(decklist_database["player_record_per_player"]),
+            "decklist_error_per_player": decklist_database["decklist_error_per_player"],
+        }, f)
 
-    for playername, decklist_url in decklist_url_per_player.items():
-        decklist = get_decklist_from_url(decklist_url)
-        archetype = parse_decklist_into_archetype(decklist)
-        if archetype == ["unown"]:
-            print(decklist_url)
 
-        player_database[playername] = {"decklist": decklist, "archetype": archetype}
+def save_archetype_per_player(url: str, archetype_per_player: Dict[str, List[str]]) -> None:
+    """
+    Save the archetype of every player of a tournament, tagged with the current version of the archetype rules.
 
+    Args:
+        url (str): The URL of the tournament.
+        archetype_per_player (Dict[str, List[str]]): The archetype of every player.
+    """
+    path_on_disk = get_processed_database_path(url, ".archetypes.pkl")
     os.makedirs(os.path.dirname(path_on_disk), exist_ok=True)
     with open(path_on_disk, "wb") as f:
-        pickle.dump(player_database, f)
+        pickle.dump({"rules_version": get_rules_version(), "archetype_per_player": archetype_per_player}, f)
 
-    return player_database
 
+def _load_archetype_per_player(url: str) -> Optional[Dict[str, List[str]]]:
+    """
+    Args:
+        url (str): The URL of the tournament.
 
-def _max_round_from_soup(soup: BeautifulSoup) -> int:
+    Returns:
+        Optional[Dict[str, List[str]]]: The archetypes saved in the processed database, or None if they are missing
+            or were classified with other archetype rules.
     """
-    Determine the maximum number of rounds displayed in the given soup.
+    path_on_disk = get_processed_database_path(url, ".archetypes.pkl")
+    if not os.path.exists(path_on_disk):
+        return None
+    with open(path_on_disk, "rb") as f:
+        content = pickle.load(f)
+    if content["rules_version"] == get_rules_version():
+        return content["archetype_per_player"]
+    print(f"Archetype rules changed since {path_on_disk} was saved. Classifying the decklists again")
+    return None
+
+
+def get_archetype_per_player_from_tournament_url(url: str,
+                                                 decklist_database: Dict[str, Dict] = None) -> Dict[str, List[str]]:
+    """
+    Get the archetype of every player in a tournament.
+    Archetypes are saved with the version of the archetype rules that produced them. When the rules change,
+    the stored decklists are classified again in memory, without parsing any page.
 
     Args:
-        soup (BeautifulSoup): The tournament page.
+        url (str): The URL of the tournament.
+        decklist_database (Dict[str, Dict], optional): The result of `get_decklist_database_from_tournament_url`,
+            if already loaded.
 
     Returns:
-        int: The maximum round number.
+        Dict[str, List[str]]: The archetype of every player, e.g. `{"Player Name [COUNTRY]": ["pokemon1", "pokemon2"]}`
+    """
+    archetype_per_player = _load_archetype_per_player(url)
+    if archetype_per_player is not None:
+        return archetype_per_player
+
+    if decklist_database is None:
+        has_saved_archetypes = os.path.exists(get_processed_database_path(url, ".archetypes.pkl"))
+        decklist_database = get_decklist_database_from_tournament_url(url)
+        # Parsing the decklists of a new tournament classifies them too
+        if not has_saved_archetypes:
+            archetype_per_player = _load_archetype_per_player(url)
+            if archetype_per_player is not None:
+                return archetype_per_player
+    record_per_player = decklist_database["player_record_per_player"]
+    archetype_list = classify_player_records(list(record_per_player.values()))
+    archetype_per_player = dict(zip(record_per_player.keys(), archetype_list))
+    for playername, archetype in archetype_per_player.items():
+        if archetype == ["unown"]:
+            print(decklist_database["decklist_url_per_player"].get(playername, playername))
+
+    save_archetype_per_player(url, archetype_per_player)
+    return archetype_per_player
+
+
+def get_players_decklist_infos_from_tournament_url(url: str) -> Dict[str, Dict[str, List[str]]]:
     """
-    round_number = 1
-    while True:
-        round_n_div = soup.find("div", {"id": f"P2R{round_number}"})
-        if round_n_div is None:
-            return round_number-1
-        round_number += 1
+    Get decklist and archetype of every players in a tournament.
+
+    Args:
+        url (str): The URL of the tournament.
+
+    Returns:
+        Dict[str, Dict[str, List]]: A dictionary with player details, including decklist and archetype.
+            The returned dict is formatted as such:
+            `{"Player Name [COUNTRY]": {"decklist": [cards], "archetype": ["pokemon1", "pokemon2"]} }`
+    """
+    decklist_database = get_decklist_database_from_tournament_url(url)
+    archetype_per_player = get_archetype_per_player_from_tournament_url(url, decklist_database)
+    return {
+        playername: {"decklist": decklist, "archetype": archetype_per_player[playername]}
+        for playername, decklist in decklist_database["decklist_per_player"].items()
+    }
+
+
+def get_pairing_round_urls(tournament_url: str, max_number_of_rounds: int = MAX_NUMBER_OF_ROUNDS) -> List[str]:
+    """
+    Get the URL of the pairing page of every round of a tournament.
+
+    Args:
+        tournament_url (str): The URL of the tournament.
+        max_number_of_rounds (int, optional): The number of rounds to get. Defaults to MAX_NUMBER_OF_ROUNDS.
+
+    Returns:
+        List[str]: The URL of each round, in order.
+    """
+    return [tournament_url + "?pod=2&rnd=" + str(round_n) for round_n in range(1, max_number_of_rounds+1)]
+
+
+def discover_pairing_rounds(tournament_url: str) -> Tuple[List[str], Dict[int, List[Tuple[str, str, str]]]]:
+    """
+    Find the rounds of a tournament from its pairings page, fetched once.
+    The page has a tab per round played so far, and the rounds whose matches are embedded in the page don't need
+    their own page. If the page has no round tab, every round up to MAX_NUMBER_OF_ROUNDS is assumed.
+
+    Args:
+        tournament_url (str): The URL of the tournament.
+
+    Returns:
+        Tuple[List[str], Dict[int, List[Tuple[str, str, str]]]]: The URL of the pairing page of every round,
+            and the matches of the rounds embedded in the tournament page, per index of the round.
+    """
+    number_of_rounds, match_list_per_embedded_round = parse_pairings_rounds(get_url(tournament_url))
+    if number_of_rounds == 0:
+        print(f"No round found on {tournament_url}, trying {MAX_NUMBER_OF_ROUNDS} rounds")
+        return get_pairing_round_urls(tournament_url), {}
+    match_list_per_round_index = {
+        round_n - 1: match_list for round_n, match_list in match_list_per_embedded_round.items()
+    }
+    return get_pairing_round_urls(tournament_url, number_of_rounds), match_list_per_round_index
+
+
+def are_pages_unchanged(page_digest_per_url: Dict[str, str]) -> bool:
+    """
+    Args:
+        page_digest_per_url (Dict[str, str]): The digests of some pages, when they were parsed.
+
+    Returns:
+        bool: True if none of the pages changed since.
+    """
+    return all(get_url_digest(url) == page_digest for url, page_digest in page_digest_per_url.items())
+
+
+def _encode_pairings(round_history: List[List[Tuple[str, str, str]]]) -> Dict:
+    """
+    Encode the pairings of a tournament compactly: every player name is stored once,
+    and every round is a flat array of `(player1_index, player2_index, winner_index)`.
+
+    Args:
+        round_history (List[List[Tuple[str, str, str]]]): The matches per round.
+
+    Returns:
+        Dict: The encoded pairings, formatted as `{"players": [names], "rounds": [array]}`.
+    """
+    player_index = {}
+    encoded_round_list = []
+    for match_list in round_history:
+        encoded_round = array("i")
+        for player_name1, player_name2, winner_tag in match_list:
+            encoded_round.append(player_index.setdefault(player_name1, len(player_index)))
+            encoded_round.append(player_index.setdefault(player_name2, len(player_index)))
+            encoded_round.append(WINNER_TAGS.index(winner_tag))
+        encoded_round_list.append(encoded_round)
+    return {"players": list(player_index.keys()), "rounds": encoded_round_list}
+
+
+def decode_pairings(encoded_pairings: Dict) -> List[List[Tuple[str, str, str]]]:
+    """
+    Decode the pairings encoded by `_encode_pairings`.
+
+    Args:
+        encoded_pairings (Dict): The encoded pairings.
+
+    Returns:
+        List[List[Tuple[str, str, str]]]: The matches per round.
+    """
+    player_list = encoded_pairings["players"]
+    round_history = []
+    for encoded_round in encoded_pairings["rounds"]:
+        round_history.append([
+            (player_list[encoded_round[i]], player_list[encoded_round[i+1]], WINNER_TAGS[encoded_round[i+2]])
+            for i in range(0, len(encoded_round), 3)
+        ])
+    return round_history
+
+
+def load_saved_pairings(tournament_url: str) -> Optional[Dict]:
+    """
+    Load the pairings of a tournament from the processed database, if none of the pages they come from changed.
+
+    Args:
+        tournament_url (str): The URL of the tournament.
+
+    Returns:
+        Optional[Dict]: The encoded pairings, as returned by `get_encoded_pairings`, or None if they are missing or
+            outdated.
+    """
+    path_on_disk = get_processed_database_path(tournament_url, ".pairings.pkl")
+    if not os.path.exists(path_on_disk):
+        return None
+    with open(path_on_disk, "rb") as f:
+        saved_pairings = pickle.load(f)
+    # Pairings saved before the round discovery have a list of digests, and are parsed again
+    if isinstance(saved_pairings["page_digests"], dict) and are_pages_unchanged(saved_pairings["page_digests"]):
+        return saved_pairings
+    return None
+
+
+def get_encoded_pairings(tournament_url: str) -> Dict:
+    """
+    Retrieve all pairings of a tournament, encoded as by `_encode_pairings`.
+    The rounds are found with `discover_pairing_rounds`, and only the rounds not embedded in the tournament page
+    are fetched. Parsed pairings are saved in the processed database along with the digests of the pages they come
+    from, so the pages are parsed again only when one of them changed.
+
+    Args:
+        tournament_url (str): The URL of the tournament.
+
+    Returns:
+        Dict: The encoded pairings, formatted as
+            `{"players": [names], "rounds": [array], "page_digests": {url: digest}}`.
+            Every round is a flat array of `(player1_index, player2_index, winner_index)`,
+            where winner_index is the index of the winner tag in `WINNER_TAGS`.
+    """
+    saved_pairings = load_saved_pairings(tournament_url)
+    if saved_pairings is not None:
+        return saved_pairings
+
+    round_url_list, match_list_per_embedded_round = discover_pairing_rounds(tournament_url)
+    fetched_round_url_list = [
+        url for round_index, url in enumerate(round_url_list) if round_index not in match_list_per_embedded_round
+    ]
+    download_urls(fetched_round_url_list)
+
+    round_history = []
+    for round_index, url in enumerate(round_url_list):
+        if round_index in match_list_per_embedded_round:
+            match_list_of_this_round = match_list_per_embedded_round[round_index]
+        else:
+            match_list_of_this_round = parse_pairings_page(get_url(url))
+        print(f"Round number {round_index + 1}, nb matchs = {len(match_list_of_this_round)}")
+        round_history.append(match_list_of_this_round)
+
+    return save_pairings(tournament_url, round_history, [tournament_url] + fetched_round_url_list)
+
+
+def save_pairings(tournament_url: str, round_history: List[List[Tuple[str, str, str]]],
+                  page_url_list: List[str]) -> Dict:
+    """
+    Encode and save the pairings of a tournament, along with the digests of the pages they come from.
+
+    Args:
+        tournament_url (str): The URL of the tournament.
+        round_history (List[List[Tuple[str, str, str]]]): The matches per round.
+        page_url_list (List[str]): The pages the pairings were parsed from.
+
+    Returns:
+        Dict: The encoded pairings, as returned by `get_encoded_pairings`.
+    """
+    saved_pairings = _encode_pairings(round_history)
+    saved_pairings["page_digests"] = {url: get_url_digest(url) for url in page_url_list}
+    path_on_disk = get_processed_database_path(tournament_url, ".pairings.pkl")
+    os.makedirs(os.path.dirname(path_on_disk), exist_ok=True)
+    with open(path_on_disk, "wb") as f:
+        pickle.dump(saved_pairings, f)
+    return saved_pairings
 
 
 def get_all_pairings_per_round(tournament_url: str) -> List[List[Tuple[str, str, str]]]:
@@ -185,107 +613,131 @@ def get_all_pairings_per_round(tournament_url: str) -> List[List[Tuple[str, str,
             If player2 won, winner_tag is "P2"
             If there is a tie, winner_tag is "TIE"
     """
-    round_history = []
-    max_number_of_rounds = 18
-    for round_n in range(1, max_number_of_rounds+1):
-        url = tournament_url+ "?pod=2&rnd=" + str(round_n)
-        soup = get_soup_from_url(url)
-        # round_n_div = soup.find("div", {"id": f"P2R{round_n}"})
-        match_div_list = soup.find_all("div", class_="match")
-
-        match_list_of_this_round = []
-        print(f"Round number {round_n}, nb matchs = {len(match_div_list)}")
-        for div_match in match_div_list:
-            div_player1, div_table_number, div_player2 = div_match.find_all("div")
-            if div_table_number.text == "Table #":
-                continue
-            player_name1 = div_player1.find("span").text
-            if div_player2.text.strip() == "":
-                player_name2 = ""
-            else:
-                player_name2 = div_player2.find("span").text
-            if "winner" in div_player1["class"]:
-                winner_tag = "P1"
-            elif "tie" in div_player1["class"]:
-                winner_tag = "TIE"
-            elif "winner" in div_player2["class"]:
-                winner_tag = "P2"
-            else:
-                # This means the player dropped off. The website handles that by putting the player alone,
-                # on a table marked as complete, without any winner, loser or tie tag. We should handle that by
-                # ingoring it
-                continue
-            match_list_of_this_round.append((player_name1, player_name2, winner_tag))
-        round_history.append(match_list_of_this_round)
-    return round_history
+    return decode_pairings(get_encoded_pairings(tournament_url))
 
 
-def get_matchup_table(url_list: List[str], from_round_n: int = 0) -> Dict[str, Dict[str, List]]:
-    """Generate a matchup table from the RK9 tournament URL given
+def get_archetype_list(archetype_counts: Counter) -> List[str]:
+    """
+    Lists the archetypes of a matchup table. Archetypes played by one player only are labelled as "unown".
 
     Args:
-        url_list (List[str]): List of RK9 URLs
-        from_round_n (int, optional): The matchup table is going to be generated from the specified round onward.
-            This way, you can accept only players from day2. Defaults to 0.
+        archetype_counts (Counter): The number of players of every archetype.
 
     Returns:
-        Dict[Dict[List]]: The matchup table of all archetypes.
-        You can use: `wins, loses, ties = matchup_table[archetype1][archetype2]`
+        List[str]: The archetypes of the matchup table.
     """
-    archetype_list = []
-    for url in url_list:
-        players_infos = get_players_decklist_infos_from_tournament_url(url)
-
-        for infos in players_infos.values():
-            archetype = ", ".join(infos["archetype"])
-            archetype_list.append(archetype)
-
-    _archetype_counts = Counter(archetype_list)
-    list_of_archetypes_appearing_only_once = [archetype for archetype, count in _archetype_counts.items() if count == 1]
+    list_of_archetypes_appearing_only_once = [archetype for archetype, count in archetype_counts.items() if count == 1]
 
     print(
         "The following archetypes are only played by one player, "
         "they are going to be labelled as 'unown': "
         f"{list_of_archetypes_appearing_only_once}"
     )
-    archetype_list = list(set(archetype_list))
-    archetype_list = [archetype for archetype in archetype_list if not archetype in list_of_archetypes_appearing_only_once]
+    archetype_list = [archetype for archetype, count in archetype_counts.items() if count > 1]
     if list_of_archetypes_appearing_only_once != []:
         if not "unown" in archetype_list:
             archetype_list += ["unown"]
     print(f"List of archetypes processed: {archetype_list}")
+    return archetype_list
+
 
-    matchup_table = {}
-    for archetype in archetype_list:
-        archetype_matchup_scores = {}
-        for opposing_archetype in archetype_list:
-            archetype_matchup_scores[opposing_archetype] = [0, 0, 0]
-        matchup_table[archetype] = archetype_matchup_scores
+def make_matchup_table(archetype_per_player_list: List[Dict[str, str]]) -> Tuple[MatchupTable, Dict[str, int]]:
+    """
+    Args:
+        archetype_per_player_list (List[Dict[str, str]]): The joined archetype of every player, per tournament.
+
+    Returns:
+        Tuple[MatchupTable, Dict[str, int]]: An empty matchup table of the archetypes, and the index in the table of
+            every archetype, archetypes played once being "unown".
+    """
+    _archetype_counts = Counter(
+        archetype
+        for archetype_per_player in archetype_per_player_list
+        for archetype in archetype_per_player.values()
+    )
+    matchup_table = MatchupTable(get_archetype_list(_archetype_counts))
+    archetype_index = {
+        archetype: matchup_table.archetype_index.get(archetype, matchup_table.archetype_index.get("unown"))
+        for archetype in _archetype_counts
+    }
+    return matchup_table, archetype_index
+
+
+def add_tournament_matches(matchup_table: MatchupTable, archetype_index: Dict[str, int],
+                           archetype_per_player: Dict[str, str], encoded_pairings: Dict, from_round_n: int) -> None:
+    """
+    Adds the matches of a tournament to a matchup table.
+
+    Args:
+        matchup_table (MatchupTable): The table, as returned by `make_matchup_table`.
+        archetype_index (Dict[str, int]): The index of every archetype, as returned by `make_matchup_table`.
+        archetype_per_player (Dict[str, str]): The joined archetype of every player of the tournament.
+        encoded_pairings (Dict): The pairings of the tournament, as returned by `get_encoded_pairings`.
+        from_round_n (int): Only the rounds up to this one are added.
+    """
+    encoded_round_list = encoded_pairings["rounds"][:from_round_n]
+    if not encoded_round_list:
+        return
+    with instrumentation.stage("aggregation"):
+        # Archetype index of every player of the pairings, -1 for players without a decklist (and byes)
+        archetype_index_per_player = np.array([
+            archetype_index[archetype_per_player[playername]] if playername in archetype_per_player else -1
+            for playername in encoded_pairings["players"]
+        ], dtype=np.int64)
+
+        encoded_matches = np.concatenate([
+            np.asarray(encoded_round, dtype=np.int64) for encoded_round in encoded_round_list
+        ]).reshape(-1, 3)
+        archetype1_indices = archetype_index_per_player[encoded_matches[:, 0]]
+        archetype2_indices = archetype_index_per_player[encoded_matches[:, 1]]
+        both_known = (archetype1_indices >= 0) & (archetype2_indices >= 0)
+        matchup_table.add_matches(
+            archetype1_indices[both_known],
+            archetype2_indices[both_known],
+            encoded_matches[both_known, 2],
+        )
+    instrumentation.count("matches.aggregated", int(both_known.sum()))
+
+
+def get_matchup_table(url_list: List[str], from_round_n: int = 0, season_dataset=None,
+                      warehouse=None) -> MatchupTable:
+    """Generate a matchup table from the RK9 tournament URL given
+
+    Args:
+        url_list (List[str]): List of RK9 URLs. A tournament repeated in the list is counted once.
+        from_round_n (int, optional): The matchup table is going to be generated from the specified round onward.
+            This way, you can accept only players from day2. Defaults to 0.
+        season_dataset (SeasonDataset, optional): A season dataset holding the tournaments, to query instead of
+            the processed database. See `season_dataset.get_season_dataset`.
+        warehouse (TournamentWarehouse, optional): A warehouse where the tournaments are ingested, to query
+            instead of the processed database. See `tournament_warehouse.TournamentWarehouse`.
+
+    Returns:
+        MatchupTable: The matchup table of all archetypes.
+        You can use: `wins, loses, ties = matchup_table[archetype1][archetype2]`
+    """
+    url_list = list(dict.fromkeys(url_list))
+    if season_dataset is not None:
+        with instrumentation.stage("aggregation"):
+            return season_dataset.get_matchup_table(url_list, from_round_n)
+    if warehouse is not None:
+        with instrumentation.stage("aggregation"):
+            return warehouse.get_matchup_table(url_list, from_round_n)
+
+    archetype_per_player_per_url = {}
+    for url in url_list:
+        with instrumentation.stage("decklists"):
+            archetype_per_player = get_archetype_per_player_from_tournament_url(url)
+        archetype_per_player_per_url[url] = {
+            playername: ", ".join(archetype) for playername, archetype in archetype_per_player.items()
+        }
+    matchup_table, archetype_index = make_matchup_table(list(archetype_per_player_per_url.values()))
 
     for url in url_list:
-        players_infos = get_players_decklist_infos_from_tournament_url(url)
-
-        all_pairings_per_round = get_all_pairings_per_round(url)
-
-        for round_n, match_list in enumerate(all_pairings_per_round):
-            if round_n < from_round_n:
-                for (player1_name, player2_name, winner) in match_list:
-                    if player1_name in players_infos.keys() and player2_name in players_infos.keys():
-                        archetype_p1 = ", ".join(players_infos[player1_name]["archetype"])
-                        if archetype_p1 in list_of_archetypes_appearing_only_once:
-                            archetype_p1 = "unown"
-                        archetype_p2 = ", ".join(players_infos[player2_name]["archetype"])
-                        if archetype_p2 in list_of_archetypes_appearing_only_once:
-                            archetype_p2 = "unown"
-                        if winner == "P1":
-                            matchup_table[archetype_p1][archetype_p2][0] += 1
-                            matchup_table[archetype_p2][archetype_p1][1] += 1
-                        if winner == "P2":
-                            matchup_table[archetype_p2][archetype_p1][0] += 1
-                            matchup_table[archetype_p1][archetype_p2][1] += 1
-                        if winner == "TIE":
-                            matchup_table[archetype_p2][archetype_p1][2] += 1
-                            matchup_table[archetype_p1][archetype_p2][2] += 1
+        with instrumentation.stage("pairings"):
+            encoded_pairings = get_encoded_pairings(url)
+        add_tournament_matches(matchup_table, archetype_index, archetype_per_player_per_url[url], encoded_pairings,
+                                from_round_n)
 
     return matchup_table
 
@@ -302,7 +754,7 @@ def get_img_tags_for_archetype(archetype: str) -> str:
     """
     result = ""
     for pokemon in archetype.split(", "):
-        pokemon_png_url = f"https://r2.limitlesstcg.net/pokemon/gen9/{pokemon}.png"
+        pokemon_png_url = POKEMON_IMAGE_URL_FORMAT.format(pokemon)
         result += f"<img src={pokemon_png_url} style=\"35px;\">"
     return result
 
@@ -339,13 +791,14 @@ def parse_matchup_table_into_table_data(matchup_data: Dict[str, Dict[str, List[i
         return f"{100 * heat:.1f}".rstrip('0').rstrip('.') + "%"
 
     html_data = {}
+    img_tags_per_archetype = {archetype: get_img_tags_for_archetype(archetype) for archetype in archetype_list}
 
     for archetype_p1 in archetype_list:
-        p1_img_tags = get_img_tags_for_archetype(archetype_p1)
+        p1_img_tags = img_tags_per_archetype[archetype_p1]
         html_data[p1_img_tags] = {}
 
         for archetype_p2 in archetype_list:
-            p2_img_tags = get_img_tags_for_archetype(archetype_p2)
+            p2_img_tags = img_tags_per_archetype[archetype_p2]
             heat_value = matchup_ratio[archetype_p1][archetype_p2]
             formatted_text = format_text_for_heatmap(heat_value)
             tooltip_text = (
@@ -369,12 +822,14 @@ def remove_low_occurrences(matchup_table: Dict[str, Dict[str, List[int]]],
     Remove archetypes with low occurrences from the matchup table.
 
     Args:
-        matchup_table (Dict[str, Dict[str, List[int]]]): Matchup data by archetype.
+        matchup_table (Dict[str, Dict[str, List[int]]]): Matchup data by archetype, as nested dicts or MatchupTable.
         nb_occurence_min (int, optional): Minimum number of occurrences to keep an archetype.
 
     Returns:
         Dict[str, Dict[str, List[int]]]: Cleaned matchup table.
     """
+    if isinstance(matchup_table, MatchupTable):
+        return matchup_table.remove_low_occurrences(nb_occurence_min)
     for archetype1, matchup_of_archetype1 in matchup_table.items():
         for archetype2 in matchup_of_archetype1.keys():
             number_of_match_played = sum(matchup_table[archetype1][archetype2])
@@ -383,11 +838,18 @@ def remove_low_occurrences(matchup_table: Dict[str, Dict[str, List[int]]],
     return matchup_table
 
 if __name__ == "__main__":
-    print("Getting matchup table...")
-    matchup_table = get_matchup_table(RK9_URL_LIST, from_round_n=8)
-    print("Cleaning data...")
-    matchup_table = remove_low_occurrences(matchup_table, nb_occurence_min=1)
-    print("Parsing data...")
-    table_data = parse_matchup_table_into_table_data(matchup_table)
-    print("Creating html table...")
-    create_html_table(table_data, "matchups.html")
+    with instrumentation.profile(instrumentation.get_profile_path()):
+        print("Getting matchup table...")
+        matchup_table = get_matchup_table(RK9_URL_LIST, from_round_n=8)
+        print("Cleaning data...")
+        matchup_table = remove_low_occurrences(matchup_table, nb_occurence_min=1)
+        with instrumentation.stage("html export"):
+            if COMPACT_HTML_EXPORT:
+                print("Creating compact html table...")
+                export_matchup_table_html(matchup_table, "matchups.html")
+            else:
+                print("Parsing data...")
+                table_data = parse_matchup_table_into_table_data(matchup_table)
+                print("Creating html table...")
+                create_html_table(table_data, "matchups.html")
+    instrumentation.dump_json("instrumentation.json")
@@ -0,0 +1,227 @@
+"""
+Counters, latency histograms and stage timers of a run.
+
+The download manager, the page parsers and the matchup table generation report here what they do:
+    counters: cache hits and misses, bytes read from the cache and fetched from the network, requests, retries...
+    histograms: the latency of every page parse and every HTTP request, in log-scale buckets.
+    stages: the time spent in each stage of the pipeline, e.g. "decklists", "pairings", "aggregation".
+Comparing the time spent in the network, in the parsers and in the aggregation tells what a slow run is bound by.
+
+Everything is thread-safe. Work done in the worker processes of a `multiprocessing.Pool` is not gathered.
+
+Example Usage:
+    with instrumentation.profile("run.prof"):
+        with instrumentation.stage("matchup table"):
+            matchup_table = get_matchup_table(RK9_URL_LIST)
+    instrumentation.dump_json("instrumentation.json")
+
+Set the environment variable `MEWTWO_PROFILE` to a path to profile the scripts with cProfile.
+"""
+import cProfile
+import functools
+import json
+import os
+import pstats
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional
+
+# Upper bounds of the buckets of the histograms, in milliseconds. The last bucket has no upper bound.
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+PROFILE_ENVIRONMENT_VARIABLE = "MEWTWO_PROFILE"
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = defaultdict(float)
+_histograms: Dict[str, "Histogram"] = {}
+_stages: Dict[str, Dict[str, float]] = {}
+
+
+class Histogram:
+    """
+    Distribution of durations, counted in the buckets of `HISTOGRAM_BUCKETS_MS`.
+    """
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.
+        self.min_ms = float("inf")
+        self.max_ms = 0.
+
+    def add(self, duration_ms: float) -> None:
+        self.bucket_counts[bisect_left(HISTOGRAM_BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.min_ms = min(self.min_ms, duration_ms)
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def get_percentile(self, percentile: float) -> float:
+        """
+        Args:
+            percentile (float): Between 0 and 100.
+
+        Returns:
+            float: The upper bound of the bucket holding the percentile, in milliseconds.
+        """
+        rank = percentile / 100 * self.count
+        cumulated_count = 0
+        for upper_bound_ms, bucket_count in zip(HISTOGRAM_BUCKETS_MS + (self.max_ms,), self.bucket_counts):
+            cumulated_count += bucket_count
+            if cumulated_count >= rank:
+                return min(upper_bound_ms, self.max_ms)
+        return self.max_ms
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.count if self.count else 0.,
+            "min_ms": self.min_ms if self.count else 0.,
+            "max_ms": self.max_ms,
+            "p50_ms": self.get_percentile(50),
+            "p90_ms": self.get_percentile(90),
+            "p99_ms": self.get_percentile(99),
+            "buckets": {
+                **{f"<={upper_bound_ms}ms": bucket_count
+                   for upper_bound_ms, bucket_count in zip(HISTOGRAM_BUCKETS_MS, self.bucket_counts)},
+                f">{HISTOGRAM_BUCKETS_MS[-1]}ms": self.bucket_counts[-1],
+            },
+        }
+
+
+def count(name: str, value: float = 1) -> None:
+    """
+    Adds a value to a counter.
+
+    Args:
+        name (str): The name of the counter, e.g. "cache.hits".
+        value (float, optional): The value to add. Defaults to 1.
+    """
+    with _lock:
+        _counters[name] += value
+
+
+def observe(name: str, duration: float) -> None:
+    """
+    Adds a duration to a histogram.
+
+    Args:
+        name (str): The name of the histogram, e.g. "parse.decklist".
+        duration (float): The duration, in seconds.
+    """
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(1000 * duration)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """
+    Decorator adding the duration of every call of the function to a histogram.
+
+    Args:
+        name (str): The name of the histogram.
+
+    Returns:
+        Callable[[Callable], Callable]: The decorator.
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return timed_function
+    return decorator
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Adds the time spent in the block to a stage of the pipeline.
+
+    Args:
+        name (str): The name of the stage.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            stage_timing = _stages.setdefault(name, {"seconds": 0., "calls": 0})
+            stage_timing["seconds"] += elapsed
+            stage_timing["calls"] += 1
+
+
+def reset() -> None:
+    """
+    Forgets everything measured so far.
+    """
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _stages.clear()
+
+
+def get_report() -> Dict[str, Dict]:
+    """
+    Returns:
+        Dict[str, Dict]: Everything measured so far, as `{"counters", "histograms", "stages"}`.
+    """
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "histograms": {name: histogram.to_dict() for name, histogram in _histograms.items()},
+            "stages": {name: dict(stage_timing) for name, stage_timing in _stages.items()},
+        }
+
+
+def dump_json(path: str) -> None:
+    """
+    Saves everything measured so far as JSON.
+
+    Args:
+        path (str): The JSON file to write.
+    """
+    with open(path, "w") as f:
+        json.dump(get_report(), f, indent=2)
+    print(f"Instrumentation saved in {path}")
+
+
+@contextmanager
+def profile(path: Optional[str] = None, nb_lines: int = 20) -> Iterator[None]:
+    """
+    Profiles the block with cProfile, saves the stats and prints the most expensive functions.
+    Does nothing without a path, so that scripts can always wrap their work with it.
+
+    Args:
+        path (Optional[str], optional): The file to save the stats in, to open with `pstats` or snakeviz.
+        nb_lines (int, optional): The number of functions to print, by cumulative time.
+    """
+    if path is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        print(f"Profile saved in {path}")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(nb_lines)
+
+
+def get_profile_path() -> Optional[str]:
+    """
+    Returns:
+        Optional[str]: The path given by the environment variable `MEWTWO_PROFILE`, if set.
+    """
+    return os.environ.get(PROFILE_ENVIRONMENT_VARIABLE) or None
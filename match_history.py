@@ -0,0 +1,253 @@
+"""
+Match history of every player of a tournament.
+
+The pairings are stored round by round, so finding the matches of one player means scanning every round. Here, the
+matches of a tournament are indexed by player in one pass over its encoded pairings: both sides of every match become
+an entry of their player, and the entries are grouped by player as columns, so the matches of a player are a slice.
+Every entry has the round, the opponent, the result of the player and the archetype of the opponent.
+
+The index is saved in the processed database next to the decklists and the pairings of the tournament, with the
+digests of the pairing pages and the version of the archetype rules it was built from. It is built again when the
+pairings or the archetypes change.
+
+Example Usage:
+    match_index = get_match_index(RK9_TOURNAMENT_URL)
+    for match in match_index.get_match_history("Player Name [COUNTRY]"):
+        print(match.round_n, match.opponent, match.result, match.opponent_archetype)
+    match_index.get_opponents_by_result("Player Name [COUNTRY]", "lose")
+"""
+import os
+import pickle
+from array import array
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from archetype_parser import get_rules_version
+from generate_matchup_table import (
+    are_pages_unchanged,
+    get_archetype_per_player_from_tournament_url,
+    get_encoded_pairings,
+    get_processed_database_path,
+)
+
+# Results of a match for one player, in the order of the results in the matchup table
+MATCH_RESULTS = ("win", "lose", "tie")
+# Archetype of the opponents without a decklist (and of byes)
+NO_ARCHETYPE = ""
+# The result of player1 and of player2, per winner index ("P1", "P2", "TIE")
+_PLAYER1_RESULT = np.array([0, 1, 2], dtype=np.int8)
+_PLAYER2_RESULT = np.array([1, 0, 2], dtype=np.int8)
+
+
+class Match(NamedTuple):
+    """
+    A match, from the side of one player.
+    """
+    round_n: int
+    opponent: str
+    result: str
+    opponent_archetype: str
+
+
+class PlayerMatchIndex:
+    """
+    The matches of every player of a tournament, as columns grouped by player: the matches of player i are the
+    elements `offsets[i]` to `offsets[i + 1]` of `rounds`, `opponents` and `results`.
+    """
+
+    def __init__(self, player_list: List[str], archetype_list: List[str], offsets: array, rounds: array,
+                 opponents: array, results: array):
+        """
+        Args:
+            player_list (List[str]): The players of the pairings.
+            archetype_list (List[str]): The archetype of every player, joined as in the matchup table,
+                or `NO_ARCHETYPE`.
+            offsets (array): The `(nb_players + 1,)` offsets of the matches of every player.
+            rounds (array): The round of every match, from 1.
+            opponents (array): The opponent of every match, as an index in player_list.
+            results (array): The result of every match for the player, as an index in `MATCH_RESULTS`.
+        """
+        self.player_list = player_list
+        self.player_index = {playername: index for index, playername in enumerate(player_list)}
+        self.archetype_list = archetype_list
+        self.offsets = offsets
+        self.rounds = rounds
+        self.opponents = opponents
+        self.results = results
+
+    @classmethod
+    def from_encoded_pairings(cls, encoded_pairings: Dict,
+                              archetype_per_player: Dict[str, List[str]]) -> "PlayerMatchIndex":
+        """
+        Args:
+            encoded_pairings (Dict): The pairings of a tournament, as returned by `get_encoded_pairings`.
+            archetype_per_player (Dict[str, List[str]]): The archetype of every player with a decklist.
+
+        Returns:
+            PlayerMatchIndex: The index of the matches of the pairings.
+        """
+        player_list = encoded_pairings["players"]
+        encoded_round_list = encoded_pairings["rounds"]
+        nb_matches_per_round = [len(encoded_round) // 3 for encoded_round in encoded_round_list]
+        encoded_matches = np.concatenate(
+            [np.asarray(encoded_round, dtype=np.int64) for encoded_round in encoded_round_list]
+            or [np.zeros(0, dtype=np.int64)]
+        ).reshape(-1, 3)
+        match_rounds = np.repeat(np.arange(1, len(encoded_round_list) + 1), nb_matches_per_round)
+
+        # Both sides of every match, grouped by player in the order of the rounds
+        players = np.concatenate([encoded_matches[:, 0], encoded_matches[:, 1]])
+        opponents = np.concatenate([encoded_matches[:, 1], encoded_matches[:, 0]])
+        results = np.concatenate([_PLAYER1_RESULT[encoded_matches[:, 2]], _PLAYER2_RESULT[encoded_matches[:, 2]]])
+        rounds = np.concatenate([match_rounds, match_rounds])
+        order = np.lexsort((rounds, players))
+        offsets = np.zeros(len(player_list) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(players, minlength=len(player_list)))
+
+        return cls(
+            list(player_list),
+            [", ".join(archetype_per_player[playername]) if playername in archetype_per_player else NO_ARCHETYPE
+             for playername in player_list],
+            array("q", offsets.tolist()),
+            array("H", rounds[order].tolist()),
+            array("i", opponents[order].tolist()),
+            array("b", results[order].tolist()),
+        )
+
+    def __contains__(self, playername: object) -> bool:
+        return playername in self.player_index
+
+    def get_archetype(self, playername: str) -> str:
+        """
+        Returns:
+            str: The archetype of the player, joined as in the matchup table, or `NO_ARCHETYPE`.
+        """
+        return self.archetype_list[self.player_index[playername]]
+
+    def get_match_history(self, playername: str) -> List[Match]:
+        """
+        Args:
+            playername (str): The name of the player, e.g. "Player Name [COUNTRY]".
+
+        Returns:
+            List[Match]: The matches of the player, by round.
+        """
+        player_index = self.player_index[playername]
+        start, end = self.offsets[player_index], self.offsets[player_index + 1]
+        return [
+            Match(round_n, self.player_list[opponent], MATCH_RESULTS[result], self.archetype_list[opponent])
+            for round_n, opponent, result in zip(self.rounds[start:end], self.opponents[start:end],
+                                                 self.results[start:end])
+        ]
+
+    def get_opponents(self, playername: str) -> List[str]:
+        """
+        Returns:
+            List[str]: The opponents of the player, by round.
+        """
+        return [match.opponent for match in self.get_match_history(playername)]
+
+    def get_opponents_by_result(self, playername: str, result: str) -> List[Match]:
+        """
+        Args:
+            playername (str): The name of the player.
+            result (str): The result of the player, among `MATCH_RESULTS`, e.g. "lose" for what the player lost to.
+
+        Returns:
+            List[Match]: The matches of the player with this result.
+        """
+        if result not in MATCH_RESULTS:
+            raise ValueError(f"Unknown result {result}. Expected one of {MATCH_RESULTS}")
+        return [match for match in self.get_match_history(playername) if match.result == result]
+
+    def get_opponent_archetype_counter(self, playername: str) -> Counter:
+        """
+        Returns:
+            Counter: The number of matches of the player against every archetype.
+        """
+        return Counter(match.opponent_archetype for match in self.get_match_history(playername))
+
+    def to_dict(self) -> Dict:
+        return {
+            "players": self.player_list,
+            "archetypes": self.archetype_list,
+            "offsets": self.offsets,
+            "rounds": self.rounds,
+            "opponents": self.opponents,
+            "results": self.results,
+        }
+
+    @classmethod
+    def from_dict(cls, content: Dict) -> "PlayerMatchIndex":
+        return cls(content["players"], content["archetypes"], content["offsets"], content["rounds"],
+                   content["opponents"], content["results"])
+
+
+def _load_match_index(url: str) -> Optional[PlayerMatchIndex]:
+    """
+    Args:
+        url (str): The URL of the tournament.
+
+    Returns:
+        Optional[PlayerMatchIndex]: The index saved in the processed database, or None if it is missing, or was
+            built from pairing pages that changed since or with other archetype rules.
+    """
+    path_on_disk = get_processed_database_path(url, ".match_history.pkl")
+    if not os.path.exists(path_on_disk):
+        return None
+    with open(path_on_disk, "rb") as f:
+        content = pickle.load(f)
+    if content["rules_version"] == get_rules_version() and are_pages_unchanged(content["page_digests"]):
+        return PlayerMatchIndex.from_dict(content)
+    return None
+
+
+def _save_match_index(url: str, match_index: PlayerMatchIndex, page_digest_per_url: Dict[str, str]) -> None:
+    """
+    Args:
+        url (str): The URL of the tournament.
+        match_index (PlayerMatchIndex): The index of the tournament.
+        page_digest_per_url (Dict[str, str]): The digests of the pairing pages the index was built from.
+    """
+    path_on_disk = get_processed_database_path(url, ".match_history.pkl")
+    os.makedirs(os.path.dirname(path_on_disk), exist_ok=True)
+    with open(path_on_disk, "wb") as f:
+        pickle.dump({
+            "rules_version": get_rules_version(),
+            "page_digests": page_digest_per_url,
+            **match_index.to_dict(),
+        }, f)
+
+
+def get_match_index(url: str) -> PlayerMatchIndex:
+    """
+    Get the match history of every player of a tournament, from the processed database if it is up to date.
+
+    Args:
+        url (str): The URL of the tournament.
+
+    Returns:
+        PlayerMatchIndex: The index of the matches of the tournament.
+    """
+    match_index = _load_match_index(url)
+    if match_index is not None:
+        return match_index
+
+    encoded_pairings = get_encoded_pairings(url)
+    archetype_per_player = get_archetype_per_player_from_tournament_url(url)
+    match_index = PlayerMatchIndex.from_encoded_pairings(encoded_pairings, archetype_per_player)
+    _save_match_index(url, match_index, encoded_pairings["page_digests"])
+    return match_index
+
+
+def get_match_index_per_url(url_list: List[str]) -> Dict[str, PlayerMatchIndex]:
+    """
+    Args:
+        url_list (List[str]): List of RK9 URLs.
+
+    Returns:
+        Dict[str, PlayerMatchIndex]: The index of every tournament.
+    """
+    return {url: get_match_index(url) for url in url_list}
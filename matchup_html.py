@@ -0,0 +1,142 @@
+"""
+Compact HTML export of a matchup table.
+
+`create_html_table` writes every cell with its color, its text and a tooltip repeating the image tags of both
+archetypes, so the page grows with the square of the number of archetypes, image tags included.
+Here, the page holds the archetypes and the `(wins, loses, ties)` of every matchup once, as JSON, and a small script
+builds the table in the browser: the image tags are built once per archetype, and a single tooltip is filled on hover.
+The table looks the same as the one of `create_html_table`.
+
+This module only depends on the standard library, so it can be used without the scraping dependencies.
+
+Example Usage:
+    matchup_table = get_matchup_table(RK9_URL_LIST, from_round_n=8)
+    export_matchup_table_html(matchup_table, "matchups.html", title="Matchups of the season")
+"""
+import html
+import json
+from typing import Dict, List
+
+POKEMON_IMAGE_URL_FORMAT = "https://r2.limitlesstcg.net/pokemon/gen9/{}.png"
+
+_HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+  <head>
+    <meta charset="utf-8">
+    <title>__TITLE__</title>
+    <style>
+      html, body, table, #container { width: 100%; height: 100%; margin: 0; padding: 0; }
+      td { text-align: center; }
+      th, .archetype { background-color: #dddddd; }
+      .cell:hover { scale: 1.2; transition: scale 0.3s; }
+      #tooltip { display: none; position: absolute; width: max-content; padding: 5px; pointer-events: none; }
+    </style>
+  </head>
+  <body style="background-color:#aaaaaa">
+    <div id="container"><table><thead></thead><tbody></tbody></table></div>
+    <div id="tooltip"></div>
+    <script id="matchup-data" type="application/json">__DATA__</script>
+    <script>
+      const data = JSON.parse(document.getElementById("matchup-data").textContent);
+      const nb = data.archetypes.length;
+      const imgTags = data.archetypes.map(archetype => archetype.split(", ").map(
+        pokemon => '<img src="' + data.image_url.replace("{}", pokemon) + '">').join(""));
+      const LOW = [127, 50, 217], MID = [204, 197, 204], HIGH = [233, 170, 0];
+      function result(i, j) { const k = 3 * (i * nb + j); return data.counts.slice(k, k + 3); }
+      function heat(i, j) {
+        const [win, lose, tie] = result(i, j);
+        return win + lose + tie === 0 ? -1 : (win + tie / 3) / (win + lose + tie);
+      }
+      function color(h) {
+        const t = Math.max(h, 0), [from, to, u] = t < 0.5 ? [LOW, MID, 2 * t] : [MID, HIGH, 2 * t - 1];
+        return "rgb(" + from.map((c, k) => c + (to[k] - c) * u).join(", ") + ")";
+      }
+      function text(h) { return h === -1 ? "" : String(+(100 * h).toFixed(1)) + "%"; }
+
+      let head = '<tr><th width="180px"></th>';
+      for (let j = 0; j < nb; j++) head += '<th width="100px">' + imgTags[j] + "</th>";
+      document.querySelector("thead").innerHTML = head + "</tr>";
+      const rows = [];
+      for (let i = 0; i < nb; i++) {
+        let row = '<tr><td class="archetype">' + imgTags[i] + "</td>";
+        for (let j = 0; j < nb; j++) {
+          const h = heat(i, j);
+          row += '<td class="cell" data-i="' + i + '" data-j="' + j + '" style="background-color:' + color(h) + '">'
+            + text(h) + "</td>";
+        }
+        rows.push(row + "</tr>");
+      }
+      document.querySelector("tbody").innerHTML = rows.join("");
+
+      const tooltip = document.getElementById("tooltip");
+      document.querySelector("tbody").addEventListener("mouseover", event => {
+        const cell = event.target.closest(".cell");
+        if (!cell) { tooltip.style.display = "none"; return; }
+        const i = +cell.dataset.i, j = +cell.dataset.j, h = heat(i, j);
+        tooltip.innerHTML = imgTags[i] + " VS " + imgTags[j] + "<br>" + text(h) + "<br>" + result(i, j).join("-");
+        tooltip.style.backgroundColor = color(h);
+        const box = cell.getBoundingClientRect();
+        tooltip.style.display = "block";
+        tooltip.style.left = (window.scrollX + box.left + box.width / 2 - tooltip.offsetWidth / 2) + "px";
+        tooltip.style.top = (window.scrollY + box.bottom) + "px";
+      });
+      document.querySelector("tbody").addEventListener("mouseleave", () => { tooltip.style.display = "none"; });
+    </script>
+  </body>
+</html>
+"""
+
+
+def get_matchup_table_json_data(matchup_table: Dict[str, Dict[str, List[int]]]) -> Dict:
+    """
+    Flattens a matchup table for the renderer.
+
+    Args:
+        matchup_table (Dict[str, Dict[str, List[int]]]): Matchup data by archetype, as nested dicts or MatchupTable.
+            The correct format is `matchup_table[archetype_p1][archetype_p2] = (win, lose, tie)`
+
+    Returns:
+        Dict: `{"archetypes": [archetype], "counts": [int], "image_url": str}`, where counts holds the
+            `(win, lose, tie)` of archetype i against archetype j at `3 * (i * nb_archetypes + j)`.
+    """
+    archetype_list = list(matchup_table.keys())
+    counts = getattr(matchup_table, "counts", None)
+    if counts is not None:
+        flat_counts = counts.reshape(-1).tolist()
+    else:
+        flat_counts = [
+            int(result)
+            for archetype_p1 in archetype_list
+            for archetype_p2 in archetype_list
+            for result in matchup_table[archetype_p1][archetype_p2]
+        ]
+    return {"archetypes": archetype_list, "counts": flat_counts, "image_url": POKEMON_IMAGE_URL_FORMAT}
+
+
+def render_matchup_table_html(matchup_table: Dict[str, Dict[str, List[int]]], title: str = "Matchup table") -> str:
+    """
+    Args:
+        matchup_table (Dict[str, Dict[str, List[int]]]): Matchup data by archetype, as nested dicts or MatchupTable.
+        title (str, optional): The title of the page.
+
+    Returns:
+        str: The HTML page.
+    """
+    data = json.dumps(get_matchup_table_json_data(matchup_table), separators=(",", ":"))
+    # The data must not close the script tag holding it
+    data = data.replace("</", "<\\/")
+    return _HTML_TEMPLATE.replace("__TITLE__", html.escape(title)).replace("__DATA__", data)
+
+
+def export_matchup_table_html(matchup_table: Dict[str, Dict[str, List[int]]], path: str,
+                              title: str = "Matchup table") -> None:
+    """
+    Writes the compact HTML page of a matchup table.
+
+    Args:
+        matchup_table (Dict[str, Dict[str, List[int]]]): Matchup data by archetype, as nested dicts or MatchupTable.
+        path (str): The HTML file to write.
+        title (str, optional): The title of the page.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render_matchup_table_html(matchup_table, title))
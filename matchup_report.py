@@ -0,0 +1,230 @@
+"""
+Matchup reports rendered from a saved artifact, without the scraping dependencies.
+
+Rendering a matchup table again, e.g. with another `nb_occurence_min`, should not import bs4, requests and mlp nor go
+through the processed database. Here, the matches of a season are counted once per round into a JSON artifact, and
+reports are rendered from it with the standard library only: the rounds to count and the minimum number of matches
+of a matchup are chosen at render time, and the table is written as the compact HTML page of `matchup_html` or as CSV.
+
+The artifact holds the archetypes of the matchup table, as `get_matchup_table` lists them, and the results of every
+matchup played in every round: `[round_n, archetype1_index, archetype2_index, wins, loses, ties]`, from the side
+of archetype1, each matchup in both orders.
+
+Usage:
+    python matchup_report.py build [URL ...] [--artifact processed_database/matchups.json]
+    python matchup_report.py render [--artifact processed_database/matchups.json] [--from-round 8] [--min-round 1]
+        [--min-occurrences 1] [--archetypes "charizard, pidgeot" ...] [--format html|csv] [--output matchups.html]
+Only `build` imports the scraping dependencies. Without URLs, it counts the tournaments of `RK9_URL_LIST`.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Dict, List, Optional
+
+from matchup_html import export_matchup_table_html
+
+MATCHUP_ARTIFACT_PATH = os.path.join("processed_database", "matchups.json")
+ARTIFACT_FORMAT_VERSION = 1
+REPORT_FORMATS = ("html", "csv")
+CSV_COLUMNS = ("archetype", "opponent", "wins", "loses", "ties", "win_rate")
+
+
+def build_matchup_artifact(url_list: List[str], season_dataset=None) -> Dict:
+    """
+    Counts the matches of every round of tournaments. Missing data is processed as by `get_matchup_table`.
+
+    Args:
+        url_list (List[str]): List of RK9 URLs.
+        season_dataset (SeasonDataset, optional): The dataset of the tournaments. Defaults to the one of
+            `get_season_dataset`.
+
+    Returns:
+        Dict: The artifact, see the module docstring.
+    """
+    # The scraping stack is only needed to build the artifact
+    import numpy as np
+
+    from generate_matchup_table import get_archetype_list
+    from season_dataset import get_season_dataset
+
+    if season_dataset is None:
+        season_dataset = get_season_dataset(url_list)
+    archetype_list = get_archetype_list(season_dataset.get_archetype_counter(url_list))
+    matches = season_dataset.query_matches(url_list=url_list)
+    archetype_index_per_player = season_dataset.get_player_archetype_indices(archetype_list)
+    archetype1_indices = archetype_index_per_player[matches["match_player1"]]
+    archetype2_indices = archetype_index_per_player[matches["match_player2"]]
+    both_known = (archetype1_indices >= 0) & (archetype2_indices >= 0)
+
+    nb_archetypes = len(archetype_list)
+    nb_rounds = int(matches["match_round"].max(initial=0))
+    round_indices = matches["match_round"][both_known].astype(np.int64) - 1
+    archetype1_indices, archetype2_indices = archetype1_indices[both_known], archetype2_indices[both_known]
+    winner_indices = matches["match_winner"][both_known].astype(np.int64)
+    # Results from the side of player1, then of player2, per winner index ("P1", "P2", "TIE")
+    flat_indices = np.concatenate((
+        ((round_indices * nb_archetypes + archetype1_indices) * nb_archetypes + archetype2_indices) * 3
+        + np.array([0, 1, 2])[winner_indices],
+        ((round_indices * nb_archetypes + archetype2_indices) * nb_archetypes + archetype1_indices) * 3
+        + np.array([1, 0, 2])[winner_indices],
+    ))
+    counts = np.bincount(flat_indices, minlength=nb_rounds * nb_archetypes * nb_archetypes * 3)
+    counts = counts.reshape(nb_rounds, nb_archetypes, nb_archetypes, 3)
+    played_round_indices, played_archetype1_indices, played_archetype2_indices = np.nonzero(counts.sum(axis=3))
+    return {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "rules_version": season_dataset.rules_version,
+        "tournaments": list(url_list),
+        "nb_rounds": nb_rounds,
+        "archetypes": archetype_list,
+        "matchups": np.column_stack((
+            played_round_indices + 1, played_archetype1_indices, played_archetype2_indices,
+            counts[played_round_indices, played_archetype1_indices, played_archetype2_indices],
+        )).tolist(),
+    }
+
+
+def save_matchup_artifact(artifact: Dict, path: str = MATCHUP_ARTIFACT_PATH) -> None:
+    """
+    Args:
+        artifact (Dict): The artifact built by `build_matchup_artifact`.
+        path (str, optional): The JSON file to write.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, separators=(",", ":"))
+
+
+def load_matchup_artifact(path: str = MATCHUP_ARTIFACT_PATH) -> Dict:
+    """
+    Args:
+        path (str, optional): The JSON file written by `save_matchup_artifact`.
+
+    Returns:
+        Dict: The artifact.
+
+    Raises:
+        ValueError: If the artifact was saved in another format.
+    """
+    with open(path, encoding="utf-8") as f:
+        artifact = json.load(f)
+    if artifact.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(f"{path} has format version {artifact.get('format_version')}, "
+                         f"expected {ARTIFACT_FORMAT_VERSION}. Build it again")
+    return artifact
+
+
+def get_matchup_table_from_artifact(artifact: Dict,
+                                    from_round_n: Optional[int] = None,
+                                    min_round_n: int = 1,
+                                    nb_occurence_min: int = 0,
+                                    archetype_list: Optional[List[str]] = None) -> Dict[str, Dict[str, List[int]]]:
+    """
+    Args:
+        artifact (Dict): The artifact built by `build_matchup_artifact`.
+        from_round_n (Optional[int], optional): Only the rounds up to this one are counted, like in
+            `get_matchup_table`. Defaults to every round.
+        min_round_n (int, optional): The first round counted, e.g. the first round of day 2. Defaults to 1.
+        nb_occurence_min (int, optional): Matchups played fewer times are reset, like in `remove_low_occurrences`.
+        archetype_list (Optional[List[str]], optional): The archetypes of the table, in the order of the artifact.
+            Defaults to all of them.
+
+    Returns:
+        Dict[str, Dict[str, List[int]]]: The matchup table, `table[archetype1][archetype2] = [wins, loses, ties]`.
+    """
+    if from_round_n is None:
+        from_round_n = artifact["nb_rounds"]
+    if archetype_list is None:
+        archetype_list = artifact["archetypes"]
+    unknown_archetype_list = [archetype for archetype in archetype_list if archetype not in artifact["archetypes"]]
+    if unknown_archetype_list:
+        raise ValueError(f"Unknown archetypes: {unknown_archetype_list}")
+
+    kept_archetypes = set(archetype_list)
+    archetype_list = [archetype for archetype in artifact["archetypes"] if archetype in kept_archetypes]
+    matchup_table = {
+        archetype1: {archetype2: [0, 0, 0] for archetype2 in archetype_list} for archetype1 in archetype_list
+    }
+    archetype_names = artifact["archetypes"]
+    for round_n, archetype1_index, archetype2_index, wins, loses, ties in artifact["matchups"]:
+        if not min_round_n <= round_n <= from_round_n:
+            continue
+        archetype1, archetype2 = archetype_names[archetype1_index], archetype_names[archetype2_index]
+        if archetype1 in kept_archetypes and archetype2 in kept_archetypes:
+            results = matchup_table[archetype1][archetype2]
+            results[0] += wins
+            results[1] += loses
+            results[2] += ties
+
+    for matchup_of_archetype1 in matchup_table.values():
+        for archetype2, results in matchup_of_archetype1.items():
+            if sum(results) < nb_occurence_min:
+                matchup_of_archetype1[archetype2] = [0, 0, 0]
+    return matchup_table
+
+
+def export_matchup_table_csv(matchup_table: Dict[str, Dict[str, List[int]]], path: str) -> None:
+    """
+    Writes one row per matchup played, with the win rate counting a tie as a third of a win like the HTML table.
+
+    Args:
+        matchup_table (Dict[str, Dict[str, List[int]]]): Matchup data by archetype, as nested dicts.
+        path (str): The CSV file to write.
+    """
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for archetype1, matchup_of_archetype1 in matchup_table.items():
+            for archetype2, (wins, loses, ties) in matchup_of_archetype1.items():
+                nb_matches = wins + loses + ties
+                if nb_matches > 0:
+                    writer.writerow((archetype1, archetype2, wins, loses, ties,
+                                     f"{(wins + ties / 3) / nb_matches:.4f}"))
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Count the matches of tournaments into an artifact.")
+    build_parser.add_argument("urls", nargs="*", help="URLs of the tournaments.")
+    build_parser.add_argument("--artifact", default=MATCHUP_ARTIFACT_PATH, help="JSON file of the artifact.")
+    render_parser = subparsers.add_parser("render", help="Render a matchup table from an artifact.")
+    render_parser.add_argument("--artifact", default=MATCHUP_ARTIFACT_PATH, help="JSON file of the artifact.")
+    render_parser.add_argument("--from-round", type=int, help="Only the rounds up to this one are counted.")
+    render_parser.add_argument("--min-round", type=int, default=1, help="The first round counted.")
+    render_parser.add_argument("--min-occurrences", type=int, default=1,
+                               help="Matchups played fewer times are left empty.")
+    render_parser.add_argument("--archetypes", nargs="+", help="Archetypes of the table. Defaults to all of them.")
+    render_parser.add_argument("--format", choices=REPORT_FORMATS, default="html", help="Format of the report.")
+    render_parser.add_argument("--output", help="File of the report. Defaults to matchups.<format>.")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        from generate_matchup_table import RK9_URL_LIST
+
+        save_matchup_artifact(build_matchup_artifact(args.urls or RK9_URL_LIST), args.artifact)
+        print(f"Matchup artifact saved in {args.artifact}")
+        return
+
+    artifact = load_matchup_artifact(args.artifact)
+    try:
+        matchup_table = get_matchup_table_from_artifact(
+            artifact, args.from_round, args.min_round, args.min_occurrences, args.archetypes
+        )
+    except ValueError as error:
+        sys.exit(str(error))
+    output_path = args.output or f"matchups.{args.format}"
+    if args.format == "csv":
+        export_matchup_table_csv(matchup_table, output_path)
+    else:
+        export_matchup_table_html(matchup_table, output_path,
+                                  title=f"Matchups of {len(artifact['tournaments'])} tournaments")
+    print(f"Matchup table saved in {output_path}")
+
+
+if __name__ == "__main__":
+    main()
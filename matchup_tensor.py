@@ -0,0 +1,143 @@
+"""
+Matchup table stored as a NumPy array.
+
+Every archetype gets an integer index, and the results are stored in a `(n, n, 3)` integer array:
+`counts[i, j] = (wins, loses, ties)` of archetype i against archetype j.
+Matches are added in batches of archetype indices, with a single vectorized accumulation per batch.
+
+The table keeps the accessors of the nested dict it replaces, so existing code keeps working:
+    wins, loses, ties = matchup_table[archetype1][archetype2]
+    for archetype, matchup_data in matchup_table.items(): ...
+"""
+
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+# Column of the result of player1's archetype, then of player2's archetype, per winner index ("P1", "P2", "TIE")
+_PLAYER1_RESULT_COLUMN = np.array([0, 1, 2])
+_PLAYER2_RESULT_COLUMN = np.array([1, 0, 2])
+
+
+class MatchupRow:
+    """
+    The matchups of one archetype against every archetype, behaving like `matchup_table[archetype]` did.
+    """
+
+    def __init__(self, matchup_table: "MatchupTable", index: int):
+        self.matchup_table = matchup_table
+        self.index = index
+
+    def __getitem__(self, opposing_archetype: str) -> np.ndarray:
+        return self.matchup_table.counts[self.index, self.matchup_table.archetype_index[opposing_archetype]]
+
+    def __setitem__(self, opposing_archetype: str, results: List[int]) -> None:
+        self.matchup_table.counts[self.index, self.matchup_table.archetype_index[opposing_archetype]] = results
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.matchup_table.archetype_list)
+
+    def __len__(self) -> int:
+        return len(self.matchup_table.archetype_list)
+
+    def __contains__(self, opposing_archetype: str) -> bool:
+        return opposing_archetype in self.matchup_table.archetype_index
+
+    def keys(self) -> List[str]:
+        return list(self.matchup_table.archetype_list)
+
+    def values(self) -> List[np.ndarray]:
+        return list(self.matchup_table.counts[self.index])
+
+    def items(self) -> List[Tuple[str, np.ndarray]]:
+        return list(zip(self.matchup_table.archetype_list, self.matchup_table.counts[self.index]))
+
+
+class MatchupTable:
+    """
+    Results of every archetype against every archetype.
+    """
+
+    def __init__(self, archetype_list: List[str], counts: Optional[np.ndarray] = None):
+        """
+        Args:
+            archetype_list (List[str]): The archetypes, in the order of the indices.
+            counts (Optional[np.ndarray], optional): The `(n, n, 3)` results. Defaults to no match played.
+        """
+        self.archetype_list = list(archetype_list)
+        self.archetype_index = {archetype: index for index, archetype in enumerate(self.archetype_list)}
+        nb_archetypes = len(self.archetype_list)
+        if counts is None:
+            counts = np.zeros((nb_archetypes, nb_archetypes, 3), dtype=np.int64)
+        self.counts = counts
+
+    def add_matches(self, archetype1_indices: np.ndarray, archetype2_indices: np.ndarray,
+                    winner_indices: np.ndarray, nb_matches: Optional[np.ndarray] = None) -> None:
+        """
+        Adds a batch of matches to the table.
+
+        Args:
+            archetype1_indices (np.ndarray): The archetype index of player1 of every match.
+            archetype2_indices (np.ndarray): The archetype index of player2 of every match.
+            winner_indices (np.ndarray): The index of the winner tag of every match, in ("P1", "P2", "TIE").
+            nb_matches (Optional[np.ndarray], optional): How many times every match was played, when the matches
+                are already grouped. Defaults to once.
+        """
+        nb_archetypes = len(self.archetype_list)
+        archetype1_indices = np.asarray(archetype1_indices, dtype=np.int64)
+        archetype2_indices = np.asarray(archetype2_indices, dtype=np.int64)
+        winner_indices = np.asarray(winner_indices, dtype=np.int64)
+        flat_indices = np.concatenate((
+            (archetype1_indices * nb_archetypes + archetype2_indices) * 3 + _PLAYER1_RESULT_COLUMN[winner_indices],
+            (archetype2_indices * nb_archetypes + archetype1_indices) * 3 + _PLAYER2_RESULT_COLUMN[winner_indices],
+        ))
+        weights = None if nb_matches is None else np.tile(np.asarray(nb_matches, dtype=np.int64), 2)
+        added_counts = np.bincount(flat_indices, weights=weights, minlength=self.counts.size)
+        self.counts += added_counts.astype(np.int64).reshape(self.counts.shape)
+
+    def remove_low_occurrences(self, nb_occurence_min: int = 2) -> "MatchupTable":
+        """
+        Resets the matchups played fewer than `nb_occurence_min` times.
+
+        Args:
+            nb_occurence_min (int, optional): Minimum number of matches to keep a matchup.
+
+        Returns:
+            MatchupTable: The table itself, cleaned.
+        """
+        self.counts[self.counts.sum(axis=2) < nb_occurence_min] = 0
+        return self
+
+    def to_dict(self) -> Dict[str, Dict[str, List[int]]]:
+        """
+        Returns:
+            Dict[str, Dict[str, List[int]]]: The table as nested dicts, `table[archetype1][archetype2] = [w, l, t]`.
+        """
+        return {
+            archetype1: {
+                archetype2: self.counts[index1, index2].tolist()
+                for index2, archetype2 in enumerate(self.archetype_list)
+            }
+            for index1, archetype1 in enumerate(self.archetype_list)
+        }
+
+    def __getitem__(self, archetype: str) -> MatchupRow:
+        return MatchupRow(self, self.archetype_index[archetype])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.archetype_list)
+
+    def __len__(self) -> int:
+        return len(self.archetype_list)
+
+    def __contains__(self, archetype: str) -> bool:
+        return archetype in self.archetype_index
+
+    def keys(self) -> List[str]:
+        return list(self.archetype_list)
+
+    def values(self) -> List[MatchupRow]:
+        return [MatchupRow(self, index) for index in range(len(self.archetype_list))]
+
+    def items(self) -> List[Tuple[str, MatchupRow]]:
+        return list(zip(self.archetype_list, self.values()))
@@ -0,0 +1,236 @@
+"""
+Expected points of the archetypes against metagames, with NumPy.
+
+The average points of archetype i against archetype j form a `(n, n)` matrix, so the expected points of every
+archetype against a metagame, the share of every archetype, is a matrix-vector product. Many metagames are scored
+at once as a matrix product, e.g. to answer "what is the best deck if X rises by 5%" for every X together, to see
+how the ranking holds when the shares move a bit, or when the results of the matches are resampled.
+
+The metagame where no archetype does better than the others, its equilibrium, is solved by fictitious play:
+the metagame is the average of the best answers to the metagame so far.
+
+Example Usage:
+    solver = MetagameSolver(get_matchup_table(RK9_URL_LIST, from_round_n=8))
+    shares = solver.get_share_vector(archetype_repartition)
+    expected_points = solver.get_expected_points(shares)
+    expected_points_if_rising = solver.get_expected_points(solver.get_shifted_shares(shares, 0.05))
+    equilibrium_shares, exploitability = solver.solve_equilibrium()
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+WIN_POINTS  = 3
+TIE_POINTS  = 1
+LOSE_POINTS = 0
+NO_MATCH_POINTS = 0
+
+# Points of a result, in the order of the results in the matchup table: (wins, loses, ties)
+POINTS_PER_RESULT = np.array([WIN_POINTS, LOSE_POINTS, TIE_POINTS], dtype=np.float64)
+# The results of archetype j against archetype i, from the results of archetype i against archetype j
+_MIRRORED_RESULT_COLUMN = np.array([1, 0, 2])
+
+
+def get_points_matrix(counts: np.ndarray, no_match_points: float = NO_MATCH_POINTS) -> np.ndarray:
+    """
+    Args:
+        counts (np.ndarray): The `(..., n, n, 3)` results of a matchup table, `(wins, loses, ties)`.
+        no_match_points (float, optional): The points of a matchup without any match.
+
+    Returns:
+        np.ndarray: The `(..., n, n)` average points of archetype i against archetype j.
+    """
+    nb_matches = counts.sum(axis=-1)
+    points = counts @ POINTS_PER_RESULT
+    return np.where(nb_matches > 0, points / np.maximum(nb_matches, 1), no_match_points)
+
+
+def get_matchup_counts(matchup_table: Dict[str, Dict[str, List[int]]]) -> Tuple[List[str], np.ndarray]:
+    """
+    Args:
+        matchup_table (Dict[str, Dict[str, List[int]]]): Matchup data by archetype, as nested dicts or MatchupTable.
+
+    Returns:
+        Tuple[List[str], np.ndarray]: The archetypes, and their `(n, n, 3)` results.
+    """
+    archetype_list = list(matchup_table.keys())
+    counts = getattr(matchup_table, "counts", None)
+    if counts is None:
+        counts = np.array([
+            [matchup_table[archetype_p1][archetype_p2] for archetype_p2 in archetype_list]
+            for archetype_p1 in archetype_list
+        ], dtype=np.int64).reshape(len(archetype_list), len(archetype_list), 3)
+    return archetype_list, counts
+
+
+class MetagameSolver:
+    """
+    Scores metagames against the points matrix of a matchup table.
+    Shares are arrays over the archetypes of the table, in its order: `(n,)` for a metagame, `(m, n)` for m of them.
+    """
+
+    def __init__(self, matchup_table: Dict[str, Dict[str, List[int]]], no_match_points: float = NO_MATCH_POINTS):
+        """
+        Args:
+            matchup_table (Dict[str, Dict[str, List[int]]]): Matchup data by archetype, as nested dicts or
+                MatchupTable. The correct format is `matchup_table[archetype_p1][archetype_p2] = (win, lose, tie)`
+            no_match_points (float, optional): The points of a matchup without any match.
+        """
+        self.archetype_list, self.counts = get_matchup_counts(matchup_table)
+        self.archetype_index = {archetype: index for index, archetype in enumerate(self.archetype_list)}
+        self.no_match_points = no_match_points
+        self.points_matrix = get_points_matrix(self.counts, no_match_points)
+
+    def get_share_vector(self, archetype_repartition: Dict[str, float]) -> np.ndarray:
+        """
+        Args:
+            archetype_repartition (Dict[str, float]): The share of every archetype in a metagame. Archetypes missing
+                from the table count as "unown" if the table has it, and are left out otherwise.
+
+        Returns:
+            np.ndarray: The `(n,)` shares, normalized to sum to 1.
+        """
+        shares = np.zeros(len(self.archetype_list))
+        unown_index = self.archetype_index.get("unown")
+        for archetype, share in archetype_repartition.items():
+            index = self.archetype_index.get(archetype, unown_index)
+            if index is not None:
+                shares[index] += share
+        total = shares.sum()
+        return shares / total if total > 0 else shares
+
+    def get_expected_points(self, shares: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            shares (np.ndarray): The `(n,)` shares of a metagame, or the `(m, n)` shares of m metagames.
+
+        Returns:
+            np.ndarray: The `(n,)` or `(m, n)` average points per round of every archetype against the metagames.
+        """
+        return shares @ self.points_matrix.T
+
+    def get_score_per_archetype(self, archetype_repartition: Dict[str, float]) -> Dict[str, float]:
+        """
+        Args:
+            archetype_repartition (Dict[str, float]): The share of every archetype in the metagame.
+
+        Returns:
+            Dict[str, float]: The average points per round of every archetype against the metagame.
+        """
+        expected_points = self.get_expected_points(self.get_share_vector(archetype_repartition))
+        return dict(zip(self.archetype_list, expected_points.tolist()))
+
+    def get_shifted_shares(self, shares: np.ndarray, delta: float) -> np.ndarray:
+        """
+        The metagames where one archetype gains `delta` of the field, the others shrinking in proportion.
+
+        Args:
+            shares (np.ndarray): The `(n,)` shares of a metagame.
+            delta (float): The share gained, e.g. 0.05 for 5% of the field. Negative to lose some.
+
+        Returns:
+            np.ndarray: The `(n, n)` shares of the metagames, row i being the one where archetype i gained `delta`.
+        """
+        new_shares = np.clip(shares + delta, 0., 1.)
+        other_shares_left = 1. - shares
+        scale = np.divide(1. - new_shares, other_shares_left, out=np.zeros_like(shares), where=other_shares_left > 0)
+        shifted_shares = scale[:, None] * shares[None, :]
+        np.fill_diagonal(shifted_shares, new_shares)
+        return shifted_shares
+
+    def sample_metagames(self, shares: np.ndarray, nb_samples: int, concentration: float = 100.,
+                         seed: Optional[int] = None) -> np.ndarray:
+        """
+        Metagames drawn around a metagame, from a Dirichlet distribution. Archetypes absent from the metagame stay
+        absent.
+
+        Args:
+            shares (np.ndarray): The `(n,)` shares of the metagame.
+            nb_samples (int): The number of metagames to draw.
+            concentration (float, optional): How close the metagames are to the given one: the higher, the closer.
+                It is about the number of players the shares were measured on.
+            seed (Optional[int], optional): The seed of the random generator.
+
+        Returns:
+            np.ndarray: The `(nb_samples, n)` shares.
+        """
+        rng = np.random.default_rng(seed)
+        is_played = shares > 0
+        sampled_shares = np.zeros((nb_samples, len(shares)))
+        sampled_shares[:, is_played] = rng.dirichlet(concentration * shares[is_played], size=nb_samples)
+        return sampled_shares
+
+    def bootstrap_points_matrices(self, nb_samples: int, seed: Optional[int] = None) -> np.ndarray:
+        """
+        Points matrices of matchup tables whose matches are resampled: every matchup gets as many matches as it had,
+        drawn from its own results. The mirror matchups are kept as they are.
+
+        Args:
+            nb_samples (int): The number of matchup tables to draw.
+            seed (Optional[int], optional): The seed of the random generator.
+
+        Returns:
+            np.ndarray: The `(nb_samples, n, n)` average points of archetype i against archetype j.
+        """
+        rng = np.random.default_rng(seed)
+        row_indices, column_indices = np.triu_indices(len(self.archetype_list), k=1)
+        pair_counts = self.counts[row_indices, column_indices]
+        nb_matches = pair_counts.sum(axis=1)
+        result_probabilities = np.where(
+            nb_matches[:, None] > 0, pair_counts / np.maximum(nb_matches, 1)[:, None], [1., 0., 0.]
+        )
+        sampled_pair_counts = rng.multinomial(nb_matches, result_probabilities, size=(nb_samples, len(nb_matches)))
+        sampled_counts = np.repeat(self.counts[None], nb_samples, axis=0)
+        sampled_counts[:, row_indices, column_indices] = sampled_pair_counts
+        sampled_counts[:, column_indices, row_indices] = sampled_pair_counts[..., _MIRRORED_RESULT_COLUMN]
+        return get_points_matrix(sampled_counts, self.no_match_points)
+
+    def bootstrap_expected_points(self, shares: np.ndarray, nb_samples: int = 1000,
+                                  seed: Optional[int] = None) -> np.ndarray:
+        """
+        Args:
+            shares (np.ndarray): The `(n,)` shares of a metagame.
+            nb_samples (int, optional): The number of resampled matchup tables.
+            seed (Optional[int], optional): The seed of the random generator.
+
+        Returns:
+            np.ndarray: The `(nb_samples, n)` expected points of every archetype, one row per resampled table.
+        """
+        return self.bootstrap_points_matrices(nb_samples, seed) @ shares
+
+    def solve_equilibrium(self, nb_iterations: int = 20000, tolerance: float = 1e-3,
+                          candidate_archetype_list: Optional[List[str]] = None) -> Tuple[np.ndarray, float]:
+        """
+        Solves the metagame where no archetype does better than the archetypes played, by fictitious play.
+
+        Args:
+            nb_iterations (int, optional): The maximum number of iterations.
+            tolerance (float, optional): Stops when the best archetype gets at most this many points more than the
+                metagame itself.
+            candidate_archetype_list (Optional[List[str]], optional): The archetypes that can be played.
+                Defaults to all of them.
+
+        Returns:
+            Tuple[np.ndarray, float]: The `(n,)` equilibrium shares, and its exploitability: how many points per
+                round the best archetype gets more than the metagame itself.
+        """
+        if candidate_archetype_list is None:
+            candidate_indices = np.arange(len(self.archetype_list))
+        else:
+            candidate_indices = np.array([self.archetype_index[archetype] for archetype in candidate_archetype_list])
+        points_matrix = self.points_matrix[np.ix_(candidate_indices, candidate_indices)]
+
+        candidate_shares = np.full(len(candidate_indices), 1 / len(candidate_indices))
+        exploitability = np.inf
+        for iteration in range(1, nb_iterations + 1):
+            expected_points = points_matrix @ candidate_shares
+            best_index = np.argmax(expected_points)
+            exploitability = expected_points[best_index] - candidate_shares @ expected_points
+            if exploitability <= tolerance:
+                break
+            candidate_shares *= iteration / (iteration + 1)
+            candidate_shares[best_index] += 1 / (iteration + 1)
+
+        shares = np.zeros(len(self.archetype_list))
+        shares[candidate_indices] = candidate_shares
+        return shares, float(exploitability)
@@ -0,0 +1,189 @@
+"""
+Fast extractors for the pages of RK9.gg.
+
+Each extractor only builds the part of the HTML tree it reads, thanks to a `SoupStrainer`, and returns plain tuples
+instead of BeautifulSoup objects. lxml is used when it is installed, otherwise the standard `html.parser`.
+
+Functions:
+    parse_decklist_page(content: bytes) -> List[Tuple[str, str, int, str]]:
+        Extracts the card lines of a decklist page.
+
+    parse_roster_page(content: bytes) -> List[Tuple[str, str, str, str, str, Optional[str]]]:
+        Extracts the rows of a roster page.
+
+    parse_pairings_page(content: bytes) -> List[Tuple[str, str, str]]:
+        Extracts the finished matches of a pairings page.
+
+    parse_pairings_rounds(content: bytes) -> Tuple[int, Dict[int, List[Tuple[str, str, str]]]]:
+        Extracts the number of rounds of a pairings page, and the matches of the rounds embedded in it.
+"""
+
+import importlib.util
+import re
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+import instrumentation
+
+PARSER_FEATURES = "lxml" if importlib.util.find_spec("lxml") is not None else "html.parser"
+
+
+def _has_class(class_name: str) -> Callable[[Union[None, str, List[str]]], bool]:
+    """
+    Builds a filter matching a tag having the given class among its classes.
+    A plain `class_=...` strainer does not work here, because the class attribute is not split yet while parsing.
+
+    Args:
+        class_name (str): The class to look for.
+
+    Returns:
+        Callable[[Union[None, str, List[str]]], bool]: The filter, to use on the "class" attribute.
+    """
+    def class_filter(value: Union[None, str, List[str]]) -> bool:
+        if value is None:
+            return False
+        if isinstance(value, str):
+            value = value.split()
+        return class_name in value
+    return class_filter
+
+
+_DECKLIST_STRAINER = SoupStrainer("table")
+_ROSTER_STRAINER = SoupStrainer("div", attrs={"class": _has_class("card-body")})
+_PAIRINGS_STRAINER = SoupStrainer("div", attrs={"class": _has_class("match")})
+_ROUND_ID_PATTERN = re.compile(r"^P2R(\d+)$")
+_ROUNDS_STRAINER = SoupStrainer("div", attrs={"id": _ROUND_ID_PATTERN})
+
+
+@instrumentation.timed("parse.decklist")
+def parse_decklist_page(content: bytes) -> List[Tuple[str, str, int, str]]:
+    """
+    Extracts the card lines of the first table of a decklist page.
+
+    Args:
+        content (bytes): The content of the page https://rk9.gg/decklist/public/...
+
+    Returns:
+        List[Tuple[str, str, int, str]]: One `(card_name, card_set, quantity, card_type)` tuple per card line.
+    """
+    soup = BeautifulSoup(content, PARSER_FEATURES, parse_only=_DECKLIST_STRAINER)
+    table = soup.find("table")
+    return [
+        (card["data-cardname"], card["data-setnum"], int(card["data-quantity"]), card["data-cardtype"])
+        for card in table.find_all("li")
+    ]
+
+
+@instrumentation.timed("parse.roster")
+def parse_roster_page(content: bytes) -> List[Tuple[str, str, str, str, str, Optional[str]]]:
+    """
+    Extracts the rows of the roster table.
+
+    Args:
+        content (bytes): The content of the page https://rk9.gg/roster/...
+
+    Returns:
+        List[Tuple[str, str, str, str, str, Optional[str]]]: One tuple per player, formatted as
+            `(first_name, last_name, country, division, decklist_status, decklist_href)`.
+            `decklist_href` is None when the decklist can't be viewed.
+    """
+    soup = BeautifulSoup(content, PARSER_FEATURES, parse_only=_ROSTER_STRAINER)
+    roster_table = soup.find("div", class_="card-body").find("tbody")
+
+    row_list = []
+    for row in roster_table.find_all("tr"):
+        row_infos = row.find_all("td")
+        decklist_slot = row_infos[5]
+        decklist_status = decklist_slot.text.strip()
+        decklist_link = decklist_slot.find("a") if decklist_status == "View" else None
+        row_list.append((
+            row_infos[1].text.strip(),
+            row_infos[2].text.strip(),
+            row_infos[3].text.strip(),
+            row_infos[4].text.strip(),
+            decklist_status,
+            None if decklist_link is None else decklist_link["href"],
+        ))
+    return row_list
+
+
+@instrumentation.timed("parse.pairings")
+def parse_pairings_page(content: bytes) -> List[Tuple[str, str, str]]:
+    """
+    Extracts the finished matches of a pairings page.
+
+    Args:
+        content (bytes): The content of the page https://rk9.gg/pairings/...?pod=2&rnd=N
+
+    Returns:
+        List[Tuple[str, str, str]]: The matches, formatted as `(player_name1, player_name2, winner_tag)`.
+            winner_tag is "P1", "P2" or "TIE". player_name2 is empty for a bye.
+    """
+    soup = BeautifulSoup(content, PARSER_FEATURES, parse_only=_PAIRINGS_STRAINER)
+    return _parse_match_divs(soup.find_all("div", class_="match"))
+
+
+@instrumentation.timed("parse.tournament")
+def parse_pairings_rounds(content: bytes) -> Tuple[int, Dict[int, List[Tuple[str, str, str]]]]:
+    """
+    Extracts the rounds of a pairings page. The page has one `P2R{n}` div per round of the masters division,
+    which may or may not contain the matches of that round.
+
+    Args:
+        content (bytes): The content of a page https://rk9.gg/pairings/...
+
+    Returns:
+        Tuple[int, Dict[int, List[Tuple[str, str, str]]]]: The number of rounds, and the matches of every round
+            embedded in the page, formatted like in `parse_pairings_page`. Rounds without matches in the page
+            are not in the dict.
+    """
+    soup = BeautifulSoup(content, PARSER_FEATURES, parse_only=_ROUNDS_STRAINER)
+    round_div_per_round_number = {}
+    for round_div in soup.find_all("div", id=_ROUND_ID_PATTERN):
+        round_number = int(_ROUND_ID_PATTERN.match(round_div["id"]).group(1))
+        round_div_per_round_number.setdefault(round_number, round_div)
+
+    number_of_rounds = 0
+    while number_of_rounds + 1 in round_div_per_round_number:
+        number_of_rounds += 1
+
+    match_list_per_embedded_round = {}
+    for round_number in range(1, number_of_rounds + 1):
+        match_div_list = round_div_per_round_number[round_number].find_all("div", class_="match")
+        if match_div_list:
+            match_list_per_embedded_round[round_number] = _parse_match_divs(match_div_list)
+    return number_of_rounds, match_list_per_embedded_round
+
+
+def _parse_match_divs(match_div_list: list) -> List[Tuple[str, str, str]]:
+    """
+    Args:
+        match_div_list (list): The `div.match` tags of a pairings page.
+
+    Returns:
+        List[Tuple[str, str, str]]: The finished matches, formatted like in `parse_pairings_page`.
+    """
+    match_list = []
+    for div_match in match_div_list:
+        div_player1, div_table_number, div_player2 = div_match.find_all("div")
+        if div_table_number.text == "Table #":
+            continue
+        player_name1 = div_player1.find("span").text
+        if div_player2.text.strip() == "":
+            player_name2 = ""
+        else:
+            player_name2 = div_player2.find("span").text
+        if "winner" in div_player1["class"]:
+            winner_tag = "P1"
+        elif "tie" in div_player1["class"]:
+            winner_tag = "TIE"
+        elif "winner" in div_player2["class"]:
+            winner_tag = "P2"
+        else:
+            # This means the player dropped off. The website handles that by putting the player alone,
+            # on a table marked as complete, without any winner, loser or tie tag. We should handle that by
+            # ingoring it
+            continue
+        match_list.append((player_name1, player_name2, winner_tag))
+    return match_list
@@ -0,0 +1,357 @@
+"""
+Storage backends for the pages cached by `download_manager`.
+
+Every page is stored with the time it was fetched, its `ETag`/`Last-Modified` validators, a digest of its content
+and the time its content last changed, so that `download_manager` can decide when a cached page must be revalidated
+and processed data derived from a page can tell whether the page changed since.
+
+Two backends are available:
+    FilePageStore: The historical layout, one file per URL under a `quote()`-mangled path.
+    SQLitePageStore: A single indexed SQLite file, with every page compressed with zlib.
+        SQLite reads the pages through a memory map, so a cache hit costs one index lookup and a decompression.
+
+Usage to import an existing file-per-URL cache into the SQLite store:
+    python page_store.py migrate --source . --store page_store.sqlite
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, unquote
+
+COMPRESSION_LEVEL = 6
+MMAP_SIZE = 1 << 30
+
+
+class PageEntry(NamedTuple):
+    """
+    A cached page and the metadata needed to know whether it is still fresh.
+    `content` is None when the entry was loaded without its content.
+    """
+    content: Optional[bytes]
+    fetched_at: Optional[float]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    digest: Optional[str] = None
+    changed_at: Optional[float] = None
+
+
+def get_digest(content: bytes) -> str:
+    """
+    Args:
+        content (bytes): The content of a page.
+
+    Returns:
+        str: A digest identifying the content.
+    """
+    return hashlib.sha1(content).hexdigest()
+
+
+class PageStore:
+    """
+    Interface of a page cache: maps a URL to the raw content of its page.
+    """
+
+    def get(self, url: str) -> Optional[bytes]:
+        """
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            Optional[bytes]: The content of the page, or None if the page is not in the store.
+        """
+        entry = self.get_entry(url)
+        return None if entry is None else entry.content
+
+    def get_entry(self, url: str, with_content: bool = True) -> Optional[PageEntry]:
+        """
+        Args:
+            url (str): The URL of the page.
+            with_content (bool, optional): Whether to load the content, or only the metadata. Defaults to True.
+
+        Returns:
+            Optional[PageEntry]: The content of the page and its metadata, or None if the page is not in the store.
+        """
+        raise NotImplementedError
+
+    def put(self, url: str, content: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None,
+            fetched_at: Optional[float] = None) -> None:
+        """
+        Args:
+            url (str): The URL of the page.
+            content (bytes): The content of the page. Replaces any previous content of the same URL.
+            etag (Optional[str], optional): The `ETag` header sent with the page.
+            last_modified (Optional[str], optional): The `Last-Modified` header sent with the page.
+            fetched_at (Optional[float], optional): When the page was fetched. Defaults to now.
+        """
+        raise NotImplementedError
+
+    def touch(self, url: str) -> None:
+        """
+        Marks a page as fetched now, after the server confirmed the cached content is still valid.
+
+        Args:
+            url (str): The URL of the page.
+        """
+        raise NotImplementedError
+
+    def urls(self) -> Iterator[str]:
+        """
+        Returns:
+            Iterator[str]: Every URL in the store.
+        """
+        raise NotImplementedError
+
+    def __contains__(self, url: str) -> bool:
+        return self.get(url) is not None
+
+
+class FilePageStore(PageStore):
+    """
+    Stores every page in its own file, under the URL without its scheme, quoted.
+    For example, `https://rk9.gg/roster/XXX` is stored in `<root>/rk9.gg/roster/XXX`.
+    The fetch time is the modification time of the file, the digest is computed on every read,
+    and the validators and the time of the last change are not kept.
+    """
+
+    def __init__(self, root: str = ".", hosts: Optional[List[str]] = None):
+        """
+        Args:
+            root (str, optional): The directory containing the cache. Defaults to the working directory.
+            hosts (Optional[List[str]], optional): The hosts listed by `urls`, since the root directory also
+                contains unrelated files. Defaults to `["rk9.gg"]`.
+        """
+        self.root = root
+        self.hosts = ["rk9.gg"] if hosts is None else hosts
+
+    def _get_path(self, url: str) -> str:
+        return os.path.join(self.root, quote(url.replace("https://", ""), encoding="utf-8"))
+
+    def get(self, url: str) -> Optional[bytes]:
+        try:
+            with open(self._get_path(url), "rb") as f:
+                return f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+
+    def get_entry(self, url: str, with_content: bool = True) -> Optional[PageEntry]:
+        path_on_disk = self._get_path(url)
+        try:
+            with open(path_on_disk, "rb") as f:
+                content = f.read()
+                fetched_at = os.fstat(f.fileno()).st_mtime
+        except (FileNotFoundError, IsADirectoryError):
+            return None
+        return PageEntry(content if with_content else None, fetched_at, digest=get_digest(content))
+
+    def put(self, url: str, content: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None,
+            fetched_at: Optional[float] = None) -> None:
+        path_on_disk = self._get_path(url)
+        os.makedirs(os.path.dirname(path_on_disk), exist_ok=True)
+        # Written to a temporary file first, so that a concurrent reader never sees a half-written page
+        temporary_path = f"{path_on_disk}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(content)
+        if fetched_at is not None:
+            os.utime(temporary_path, (fetched_at, fetched_at))
+        os.replace(temporary_path, path_on_disk)
+
+    def touch(self, url: str) -> None:
+        os.utime(self._get_path(url))
+
+    def urls(self) -> Iterator[str]:
+        for host in self.hosts:
+            for directory, _, filename_list in os.walk(os.path.join(self.root, host)):
+                for filename in filename_list:
+                    if filename.endswith(".tmp"):
+                        continue
+                    relative_path = os.path.relpath(os.path.join(directory, filename), self.root)
+                    yield "https://" + unquote(relative_path.replace(os.sep, "/"), encoding="utf-8")
+
+
+class SQLitePageStore(PageStore):
+    """
+    Stores every page in a single SQLite file, compressed with zlib and indexed by URL.
+    Each thread gets its own connection, and the database runs in WAL mode so readers never wait on writers.
+    """
+
+    def __init__(self, path: str = "page_store.sqlite"):
+        """
+        Args:
+            path (str, optional): The path of the SQLite file. It is created on first use.
+        """
+        self.path = path
+        self._thread_local = threading.local()
+
+    def __getstate__(self):
+        # Connections can't be sent to another process, which opens its own
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    def _get_connection(self) -> sqlite3.Connection:
+        connection = getattr(self._thread_local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+            # Threads opening their connection together must not create or upgrade the table twice
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS pages ("
+                    "url TEXT PRIMARY KEY, "
+                    "content BLOB NOT NULL, "
+                    "size INTEGER NOT NULL"
+                    ") WITHOUT ROWID"
+                )
+                self._add_missing_columns(connection)
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+            self._thread_local.connection = connection
+        return connection
+
+    @staticmethod
+    def _add_missing_columns(connection: sqlite3.Connection) -> None:
+        """
+        Upgrades a store created by an older version, which did not keep the metadata of the pages.
+        """
+        existing_columns = {row[1] for row in connection.execute("PRAGMA table_info(pages)")}
+        for column, column_type in (("fetched_at", "REAL"), ("etag", "TEXT"), ("last_modified", "TEXT"),
+                                    ("digest", "TEXT"), ("changed_at", "REAL")):
+            if column not in existing_columns:
+                connection.execute(f"ALTER TABLE pages ADD COLUMN {column} {column_type}")
+
+    def get(self, url: str) -> Optional[bytes]:
+        row = self._get_connection().execute("SELECT content FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return zlib.decompress(row[0])
+
+    def get_entry(self, url: str, with_content: bool = True) -> Optional[PageEntry]:
+        row = self._get_connection().execute(
+            f"SELECT {'content' if with_content else 'NULL'}, fetched_at, etag, last_modified, digest, changed_at "
+            "FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        compressed_content, fetched_at, etag, last_modified, digest, changed_at = row
+        content = None if compressed_content is None else zlib.decompress(compressed_content)
+        if digest is None and with_content:
+            # Page stored by an older version of the store
+            digest = get_digest(content)
+        return PageEntry(content, fetched_at, etag, last_modified, digest, changed_at)
+
+    def put(self, url: str, content: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None,
+            fetched_at: Optional[float] = None) -> None:
+        if fetched_at is None:
+            fetched_at = time.time()
+        digest = get_digest(content)
+        connection = self._get_connection()
+        previous_row = connection.execute("SELECT digest, changed_at FROM pages WHERE url = ?", (url,)).fetchone()
+        if previous_row is not None and previous_row[0] == digest and previous_row[1] is not None:
+            changed_at = previous_row[1]
+        else:
+            changed_at = fetched_at
+        connection.execute(
+            "INSERT OR REPLACE INTO pages (url, content, size, fetched_at, etag, last_modified, digest, changed_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, zlib.compress(content, COMPRESSION_LEVEL), len(content), fetched_at, etag, last_modified,
+             digest, changed_at),
+        )
+
+    def touch(self, url: str) -> None:
+        self._get_connection().execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+
+    def put_many(self, page_list: Iterable[Tuple[str, PageEntry]]) -> int:
+        """
+        Inserts many pages in a single transaction.
+
+        Args:
+            page_list (Iterable[Tuple[str, PageEntry]]): The (url, entry) of every page to insert.
+
+        Returns:
+            int: The number of pages inserted.
+        """
+        connection = self._get_connection()
+        nb_pages = 0
+        connection.execute("BEGIN")
+        try:
+            for url, entry in page_list:
+                connection.execute(
+                    "INSERT OR REPLACE INTO pages "
+                    "(url, content, size, fetched_at, etag, last_modified, digest, changed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, zlib.compress(entry.content, COMPRESSION_LEVEL), len(entry.content),
+                     entry.fetched_at, entry.etag, entry.last_modified, get_digest(entry.content), entry.changed_at),
+                )
+                nb_pages += 1
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return nb_pages
+
+    def urls(self) -> Iterator[str]:
+        for (url,) in self._get_connection().execute("SELECT url FROM pages"):
+            yield url
+
+    def __contains__(self, url: str) -> bool:
+        return self._get_connection().execute("SELECT 1 FROM pages WHERE url = ?", (url,)).fetchone() is not None
+
+
+def migrate_file_cache(source: FilePageStore, destination: PageStore) -> int:
+    """
+    Imports every page of a file-per-URL cache into another store. Pages already in the destination are replaced.
+    The modification time of each file is kept as the time the page was fetched.
+
+    Args:
+        source (FilePageStore): The file-per-URL cache.
+        destination (PageStore): The store to import the pages into.
+
+    Returns:
+        int: The number of pages imported.
+    """
+    def iter_pages():
+        for url in source.urls():
+            entry = source.get_entry(url)
+            if entry is not None:
+                yield url, entry
+
+    if isinstance(destination, SQLitePageStore):
+        return destination.put_many(iter_pages())
+    nb_pages = 0
+    for url, entry in iter_pages():
+        destination.put(url, entry.content, entry.etag, entry.last_modified, entry.fetched_at)
+        nb_pages += 1
+    return nb_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="Import a file-per-URL cache into a SQLite store.")
+    migrate_parser.add_argument("--source", default=".", help="Directory containing the file-per-URL cache.")
+    migrate_parser.add_argument("--hosts", nargs="+", default=["rk9.gg"], help="Hosts to import.")
+    migrate_parser.add_argument("--store", default="page_store.sqlite", help="Path of the SQLite store.")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        nb_pages = migrate_file_cache(FilePageStore(args.source, args.hosts), SQLitePageStore(args.store))
+        print(f"Imported {nb_pages} pages into {args.store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Streaming pipeline from RK9.gg pages to a matchup table.
+
+`get_matchup_table` runs one stage at a time: every decklist of every tournament is parsed before the first pairing
+is read. Here, the decklist and pairing pages of all the tournaments are downloaded together, and every page is
+parsed, classified and accumulated as soon as it arrives, so the network and the CPU work overlap.
+Pages are handed over through a bounded queue, so only a few pages wait in memory at any time.
+
+A tournament is kept until all its pages have arrived. Its parsed data is then saved in the processed database like
+`get_matchup_table` would, and its decklists are dropped. Pages that could not be streamed are downloaded again one by
+one, and a page that still fails stops the pipeline, so a tournament is never left out of the table.
+Once every tournament is complete, the archetypes and matches are accumulated in the order of the tournaments, so the
+table does not depend on the order the pages arrived in. Data already in the processed database is loaded instead of
+streamed.
+
+Example Usage:
+    matchup_table = get_matchup_table_streaming(RK9_URL_LIST, from_round_n=8)
+"""
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import instrumentation
+from archetype_parser import classify_player_records
+from download_manager import NB_CONCURRENCY, download_urls, get_url, iter_urls
+from generate_matchup_table import (
+    RK9_URL_LIST,
+    WINNER_TAGS,
+    discover_pairing_rounds,
+    get_all_pairings_per_round,
+    get_archetype_list,
+    get_archetype_per_player_from_tournament_url,
+    get_decklist_url_per_player,
+    get_player_record_from_content,
+    get_processed_database_path,
+    get_roster_url,
+    make_decklist_database,
+    save_archetype_per_player,
+    save_decklist_database,
+    save_pairings,
+)
+from matchup_tensor import MatchupTable
+from page_parser import parse_pairings_page
+
+
+class _TournamentInProgress:
+    """
+    What has arrived so far of one tournament.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.decklist_database: Optional[Dict[str, Dict]] = None
+        self.archetype_per_player: Dict[str, List[str]] = {}
+        self.match_list_per_round: List[Optional[List[Tuple[str, str, str]]]] = []
+        self.pairings_page_url_list: Optional[List[str]] = None
+        self.nb_pages_left = 0
+
+
+def _load_or_plan_tournament(url: str, page_owner: Dict[str, Tuple[_TournamentInProgress, str, object]]) \
+        -> _TournamentInProgress:
+    """
+    Loads what the processed database already has of a tournament, and registers in `page_owner`
+    the pages left to stream. Rounds embedded in the tournament page are not streamed.
+
+    Args:
+        url (str): The URL of the tournament.
+        page_owner (Dict[str, Tuple[_TournamentInProgress, str, object]]): Filled with the page URLs to stream,
+            mapped to `(tournament, page_kind, key)`. page_kind is "decklist", with the player name as key,
+            or "pairings", with the index of the round as key.
+
+    Returns:
+        _TournamentInProgress: The tournament.
+    """
+    tournament = _TournamentInProgress(url)
+
+    if os.path.exists(get_processed_database_path(url, ".decklists.pkl")):
+        tournament.archetype_per_player = get_archetype_per_player_from_tournament_url(url)
+    else:
+        decklist_url_per_player = get_decklist_url_per_player(url)
+        tournament.decklist_database = make_decklist_database(decklist_url_per_player, {}, {})
+        for playername, decklist_url in decklist_url_per_player.items():
+            page_owner[decklist_url] = (tournament, "decklist", playername)
+            tournament.nb_pages_left += 1
+
+    if os.path.exists(get_processed_database_path(url, ".pairings.pkl")):
+        tournament.match_list_per_round = get_all_pairings_per_round(url)
+    else:
+        round_url_list, match_list_per_embedded_round = discover_pairing_rounds(url)
+        tournament.pairings_page_url_list = [url]
+        for round_index, round_url in enumerate(round_url_list):
+            tournament.match_list_per_round.append(match_list_per_embedded_round.get(round_index))
+            if round_index not in match_list_per_embedded_round:
+                page_owner[round_url] = (tournament, "pairings", round_index)
+                tournament.pairings_page_url_list.append(round_url)
+                tournament.nb_pages_left += 1
+    return tournament
+
+
+def _handle_page(tournament: _TournamentInProgress, page_kind: str, key: object, content: bytes) -> None:
+    """
+    Parses a page as soon as it arrives. Decklists are classified together once the tournament is complete.
+
+    Args:
+        tournament (_TournamentInProgress): The tournament the page belongs to.
+        page_kind (str): "decklist" or "pairings".
+        key (object): The player name for a decklist, the index of the round for pairings.
+        content (bytes): The content of the page.
+    """
+    if page_kind == "decklist":
+        decklist_url = tournament.decklist_database["decklist_url_per_player"][key]
+        try:
+            record = get_player_record_from_content(content, key, decklist_url)
+        except Exception as e:
+            print(f"Invalid decklist left out: {key}: {decklist_url}: {e}")
+            tournament.decklist_database["decklist_error_per_player"][key] = f"{decklist_url}: {e}"
+        else:
+            tournament.decklist_database["player_record_per_player"][key] = record
+    else:
+        tournament.match_list_per_round[key] = parse_pairings_page(content)
+    tournament.nb_pages_left -= 1
+
+
+def _finish_tournament(tournament: _TournamentInProgress) -> None:
+    """
+    Classifies the decklists of a complete tournament, in the order of its roster like `get_matchup_table`,
+    and saves what was parsed. Its decklists are then dropped.
+
+    Args:
+        tournament (_TournamentInProgress): The tournament, with all its pages.
+    """
+    if tournament.decklist_database is not None:
+        decklist_url_per_player = tournament.decklist_database["decklist_url_per_player"]
+        record_per_player = tournament.decklist_database["player_record_per_player"]
+        decklist_error_per_player = tournament.decklist_database["decklist_error_per_player"]
+        record_per_player = {
+            playername: record_per_player[playername]
+            for playername in decklist_url_per_player if playername in record_per_player
+        }
+        decklist_database = make_decklist_database(decklist_url_per_player, record_per_player, {
+            playername: decklist_error_per_player[playername]
+            for playername in decklist_url_per_player if playername in decklist_error_per_player
+        })
+        tournament.archetype_per_player = dict(zip(
+            record_per_player.keys(), classify_player_records(list(record_per_player.values()))
+        ))
+        save_decklist_database(tournament.url, decklist_database)
+        save_archetype_per_player(tournament.url, tournament.archetype_per_player)
+        tournament.decklist_database = None
+    if tournament.pairings_page_url_list is not None:
+        save_pairings(tournament.url, tournament.match_list_per_round, tournament.pairings_page_url_list)
+
+
+def _accumulate_tournament(tournament: _TournamentInProgress,
+                           from_round_n: int,
+                           raw_archetype_index: Dict[str, int],
+                           archetype_counter: Counter,
+                           encoded_match_list: List[np.ndarray]) -> None:
+    """
+    Counts the archetypes of a finished tournament, and encodes its matches with archetype indices.
+
+    Args:
+        tournament (_TournamentInProgress): The tournament, finished.
+        from_round_n (int): Only the rounds before this one are accumulated, like in `get_matchup_table`.
+        raw_archetype_index (Dict[str, int]): Index of every archetype seen so far. Updated.
+        archetype_counter (Counter): Number of players of every archetype seen so far. Updated.
+        encoded_match_list (List[np.ndarray]): The `(player1_archetype, player2_archetype, winner_index)` of the
+            matches accumulated so far. Updated.
+    """
+    archetype_index_per_player = {}
+    for playername, archetype in tournament.archetype_per_player.items():
+        archetype = ", ".join(archetype)
+        archetype_counter[archetype] += 1
+        archetype_index_per_player[playername] = raw_archetype_index.setdefault(archetype, len(raw_archetype_index))
+
+    encoded_matches = [
+        (archetype_index_per_player[player_name1], archetype_index_per_player[player_name2],
+         WINNER_TAGS.index(winner_tag))
+        for match_list in tournament.match_list_per_round[:from_round_n]
+        for player_name1, player_name2, winner_tag in match_list
+        if player_name1 in archetype_index_per_player and player_name2 in archetype_index_per_player
+    ]
+    encoded_match_list.append(np.array(encoded_matches, dtype=np.int64).reshape(-1, 3))
+
+
+def get_matchup_table_streaming(url_list: List[str],
+                                from_round_n: int = 0,
+                                nb_concurrency: int = NB_CONCURRENCY) -> MatchupTable:
+    """
+    Generate the same matchup table as `get_matchup_table`, streaming the pages of all the tournaments through
+    parsing, classification and accumulation.
+
+    Args:
+        url_list (List[str]): List of RK9 URLs. A tournament repeated in the list is counted once.
+        from_round_n (int, optional): Same as in `get_matchup_table`. Defaults to 0.
+        nb_concurrency (int, optional): The maximum number of requests in flight.
+
+    Returns:
+        MatchupTable: The matchup table of all archetypes.
+    """
+    # Every page belongs to one tournament in progress
+    url_list = list(dict.fromkeys(url_list))
+    # Rosters are needed to know which decklists to stream, and tournament pages to know which rounds to stream
+    download_urls(
+        [get_roster_url(url) for url in url_list
+         if not os.path.exists(get_processed_database_path(url, ".decklists.pkl"))]
+        + [url for url in url_list if not os.path.exists(get_processed_database_path(url, ".pairings.pkl"))],
+        nb_concurrency,
+    )
+    page_owner = {}
+    tournament_list = [_load_or_plan_tournament(url, page_owner) for url in url_list]
+
+    for tournament in tournament_list:
+        if tournament.nb_pages_left == 0:
+            _finish_tournament(tournament)
+
+    with instrumentation.stage("streaming"):
+        for page_url, content in iter_urls(list(page_owner), nb_concurrency):
+            tournament, page_kind, key = page_owner.pop(page_url)
+            _handle_page(tournament, page_kind, key, content)
+            if tournament.nb_pages_left == 0:
+                _finish_tournament(tournament)
+        # Pages that failed while streaming: a page failing again raises instead of leaving its tournament out
+        if page_owner:
+            print(f"{len(page_owner)} pages could not be streamed, downloading them again")
+        for page_url, (tournament, page_kind, key) in list(page_owner.items()):
+            _handle_page(tournament, page_kind, key, get_url(page_url))
+            del page_owner[page_url]
+            if tournament.nb_pages_left == 0:
+                _finish_tournament(tournament)
+
+    with instrumentation.stage("aggregation"):
+        raw_archetype_index = {}
+        archetype_counter = Counter()
+        encoded_match_list = []
+        for tournament in tournament_list:
+            _accumulate_tournament(
+                tournament, from_round_n, raw_archetype_index, archetype_counter, encoded_match_list
+            )
+        matchup_table = MatchupTable(get_archetype_list(archetype_counter))
+        final_index_per_raw_index = np.array([
+            matchup_table.archetype_index.get(archetype, matchup_table.archetype_index.get("unown", -1))
+            for archetype in raw_archetype_index
+        ], dtype=np.int64)
+        if encoded_match_list:
+            encoded_matches = np.concatenate(encoded_match_list)
+            matchup_table.add_matches(
+                final_index_per_raw_index[encoded_matches[:, 0]],
+                final_index_per_raw_index[encoded_matches[:, 1]],
+                encoded_matches[:, 2],
+            )
+            instrumentation.count("matches.aggregated", len(encoded_matches))
+    return matchup_table
+
+
+if __name__ == "__main__":
+    with instrumentation.profile(instrumentation.get_profile_path()):
+        matchup_table = get_matchup_table_streaming(RK9_URL_LIST, from_round_n=8)
+    for archetype, matchup_data in matchup_table.items():
+        print(archetype, {opposing_archetype: results.tolist() for opposing_archetype, results in matchup_data.items()})
+    instrumentation.dump_json("instrumentation.json")
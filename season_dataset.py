@@ -0,0 +1,387 @@
+"""
+Columnar dataset of a season, saved as a single `.npz` file.
+
+The processed database holds one pickle of nested dicts per tournament and per kind of data, so loading a season
+means unpickling many object graphs, and every question asked needs its own loops. Here, the players, decklists,
+archetypes and matches of all the tournaments are flat NumPy columns, with strings stored once in lookup tables:
+    tournaments: tournament_urls
+    archetypes: archetypes, the archetypes as joined by `get_matchup_table`, e.g. "gardevoir, drifloon"
+    cards: card_names
+    players: player_tournament, player_names, player_archetype (-1 without a valid decklist)
+    decklists: decklist_offsets, decklist_cards, decklist_quantities. The cards of player i are the rows
+        decklist_offsets[i] to decklist_offsets[i + 1] of decklist_cards and decklist_quantities.
+    matches: match_tournament, match_round (from 1), match_player1, match_player2 (player rows), match_winner
+        (index of the winner tag in `WINNER_TAGS`)
+    pairing pages: page_tournament, page_urls, page_digests, the digests of the pages the pairings were parsed from
+The file is saved without pickles, so a season loads in milliseconds. Like the processed database, it is built again
+when the pairing pages of one of its tournaments changed.
+
+Example Usage:
+    season_dataset = get_season_dataset(RK9_URL_LIST)
+    matches = season_dataset.query_matches("gardevoir, drifloon", "dragapult, pidgeot", min_round_n=9)
+    wins, loses, ties = count_results(matches)
+    matchup_table = get_matchup_table(RK9_URL_LIST, from_round_n=8, season_dataset=season_dataset)
+"""
+import os
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from archetype_parser import get_rules_version
+from generate_matchup_table import (
+    WINNER_TAGS,
+    are_pages_unchanged,
+    get_archetype_list,
+    get_archetype_per_player_from_tournament_url,
+    get_decklist_database_from_tournament_url,
+    get_encoded_pairings,
+)
+from matchup_tensor import MatchupTable
+
+SEASON_DATASET_PATH = os.path.join("processed_database", "season.npz")
+MATCH_COLUMNS = ("match_tournament", "match_round", "match_player1", "match_player2", "match_winner")
+# The winner index once player1 and player2 are swapped, per winner index ("P1", "P2", "TIE")
+_SWAPPED_WINNER = np.array([1, 0, 2], dtype=np.int8)
+
+
+class SeasonDataset:
+    """
+    The players, decklists, archetypes and matches of many tournaments, as columns.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        """
+        Args:
+            columns (Dict[str, np.ndarray]): The columns described in the module docstring, plus "rules_version".
+        """
+        self.columns = columns
+        self.tournament_urls: List[str] = columns["tournament_urls"].tolist()
+        self.tournament_index = {url: index for index, url in enumerate(self.tournament_urls)}
+        self.archetypes: List[str] = columns["archetypes"].tolist()
+        self.archetype_index = {archetype: index for index, archetype in enumerate(self.archetypes)}
+        self.rules_version = str(columns["rules_version"])
+
+    @classmethod
+    def load(cls, path: str = SEASON_DATASET_PATH) -> "SeasonDataset":
+        """
+        Args:
+            path (str, optional): The `.npz` file saved by `save`.
+
+        Returns:
+            SeasonDataset: The dataset.
+        """
+        with np.load(path, allow_pickle=False) as npz_file:
+            return cls({name: npz_file[name] for name in npz_file.files})
+
+    def save(self, path: str = SEASON_DATASET_PATH) -> None:
+        """
+        Args:
+            path (str, optional): The `.npz` file to write.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.savez(path, **self.columns)
+
+    def _get_tournament_mask(self, tournament_column: np.ndarray, url_list: Optional[List[str]]) -> np.ndarray:
+        if url_list is None:
+            return np.ones(len(tournament_column), dtype=bool)
+        return np.isin(tournament_column, [self.tournament_index[url] for url in url_list])
+
+    def get_archetype_counter(self, url_list: Optional[List[str]] = None) -> Counter:
+        """
+        Args:
+            url_list (Optional[List[str]], optional): The tournaments to count. Defaults to all of them.
+                A tournament repeated in the list is counted once.
+
+        Returns:
+            Counter: The number of players of every archetype, in the order `get_matchup_table` finds them.
+        """
+        tournament_indices = range(len(self.tournament_urls)) if url_list is None else \
+            list(dict.fromkeys(self.tournament_index[url] for url in url_list))
+        player_tournament = self.columns["player_tournament"]
+        player_archetype = self.columns["player_archetype"]
+        archetype_indices = np.concatenate([
+            player_archetype[player_tournament == tournament_index] for tournament_index in tournament_indices
+        ] or [np.zeros(0, dtype=np.int32)])
+        archetype_indices = archetype_indices[archetype_indices >= 0]
+        unique_indices, first_positions, counts = np.unique(archetype_indices, return_index=True, return_counts=True)
+        order = np.argsort(first_positions)
+        return Counter({self.archetypes[unique_indices[i]]: int(counts[i]) for i in order})
+
+    def get_player_archetype_indices(self, archetype_list: List[str]) -> np.ndarray:
+        """
+        Args:
+            archetype_list (List[str]): The archetypes of a matchup table. Missing archetypes count as "unown".
+
+        Returns:
+            np.ndarray: The index in `archetype_list` of the archetype of every player, -1 without decklist.
+        """
+        index_per_archetype = {archetype: index for index, archetype in enumerate(archetype_list)}
+        unown_index = index_per_archetype.get("unown", -1)
+        table_index_per_archetype = np.array(
+            [index_per_archetype.get(archetype, unown_index) for archetype in self.archetypes] + [-1], dtype=np.int64
+        )
+        # Players without archetype (-1) get the last element: -1
+        return table_index_per_archetype[self.columns["player_archetype"]]
+
+    def query_matches(self,
+                      archetype1: Optional[str] = None,
+                      archetype2: Optional[str] = None,
+                      url_list: Optional[List[str]] = None,
+                      min_round_n: Optional[int] = None,
+                      max_round_n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Selects matches. When archetypes are given, matches are oriented so that player1 plays archetype1.
+
+        Args:
+            archetype1 (Optional[str], optional): The archetype of one of the players, e.g. "gardevoir, drifloon".
+            archetype2 (Optional[str], optional): The archetype of the opponent.
+            url_list (Optional[List[str]], optional): The tournaments to select from. Defaults to all of them.
+            min_round_n (Optional[int], optional): The first round to select, from 1.
+            max_round_n (Optional[int], optional): The last round to select.
+
+        Returns:
+            Dict[str, np.ndarray]: The `MATCH_COLUMNS` of the selected matches.
+        """
+        columns = self.columns
+        mask = self._get_tournament_mask(columns["match_tournament"], url_list)
+        if min_round_n is not None:
+            mask &= columns["match_round"] >= min_round_n
+        if max_round_n is not None:
+            mask &= columns["match_round"] <= max_round_n
+        matches = {name: columns[name][mask] for name in MATCH_COLUMNS}
+        if archetype1 is None and archetype2 is None:
+            return matches
+
+        player_archetype = columns["player_archetype"]
+        archetype1_player1 = player_archetype[matches["match_player1"]]
+        archetype2_player1 = player_archetype[matches["match_player2"]]
+
+        def is_archetype(archetype_indices: np.ndarray, archetype: Optional[str]) -> np.ndarray:
+            if archetype is None:
+                return archetype_indices >= 0
+            return archetype_indices == self.archetype_index.get(archetype, -2)
+
+        is_in_order = is_archetype(archetype1_player1, archetype1) & is_archetype(archetype2_player1, archetype2)
+        is_swapped = is_archetype(archetype2_player1, archetype1) & is_archetype(archetype1_player1, archetype2)
+        # Mirror matches are in order
+        is_swapped &= ~is_in_order
+        matches["match_player1"], matches["match_player2"] = (
+            np.where(is_swapped, matches["match_player2"], matches["match_player1"]),
+            np.where(is_swapped, matches["match_player1"], matches["match_player2"]),
+        )
+        matches["match_winner"] = np.where(is_swapped, _SWAPPED_WINNER[matches["match_winner"]],
+                                           matches["match_winner"])
+        selected = is_in_order | is_swapped
+        return {name: column[selected] for name, column in matches.items()}
+
+    def get_matchup_table(self, url_list: Optional[List[str]] = None, from_round_n: int = 0) -> MatchupTable:
+        """
+        Generate the same matchup table as `get_matchup_table`.
+
+        Args:
+            url_list (Optional[List[str]], optional): The tournaments of the table. Defaults to all of them.
+                A tournament repeated in the list is counted once.
+            from_round_n (int, optional): Only the rounds up to this one are counted, like in `get_matchup_table`.
+
+        Returns:
+            MatchupTable: The matchup table of all archetypes.
+        """
+        matchup_table = MatchupTable(get_archetype_list(self.get_archetype_counter(url_list)))
+        matches = self.query_matches(url_list=url_list, max_round_n=from_round_n)
+        archetype_index_per_player = self.get_player_archetype_indices(matchup_table.archetype_list)
+        archetype1_indices = archetype_index_per_player[matches["match_player1"]]
+        archetype2_indices = archetype_index_per_player[matches["match_player2"]]
+        both_known = (archetype1_indices >= 0) & (archetype2_indices >= 0)
+        matchup_table.add_matches(
+            archetype1_indices[both_known], archetype2_indices[both_known], matches["match_winner"][both_known]
+        )
+        return matchup_table
+
+    def get_page_digests(self, url: str) -> Optional[Dict[str, str]]:
+        """
+        Args:
+            url (str): The URL of the tournament.
+
+        Returns:
+            Optional[Dict[str, str]]: The digest of every pairing page of the tournament when the dataset was built,
+                as in `get_encoded_pairings`. None for datasets saved before the digests were kept.
+        """
+        if "page_urls" not in self.columns:
+            return None
+        page_mask = self.columns["page_tournament"] == self.tournament_index[url]
+        return dict(zip(self.columns["page_urls"][page_mask].tolist(),
+                        self.columns["page_digests"][page_mask].tolist()))
+
+    def get_player_index(self, url: str, playername: str) -> int:
+        """
+        Args:
+            url (str): The URL of the tournament.
+            playername (str): The name of the player, e.g. "Player Name [COUNTRY]".
+
+        Returns:
+            int: The row of the player in the player columns.
+
+        Raises:
+            KeyError: If the player did not play the tournament.
+        """
+        player_indices = np.flatnonzero(
+            (self.columns["player_tournament"] == self.tournament_index[url])
+            & (self.columns["player_names"] == playername)
+        )
+        if len(player_indices) == 0:
+            raise KeyError(f"{playername} did not play {url}")
+        return int(player_indices[0])
+
+    def get_decklist(self, player_index: int) -> List[Tuple[str, int]]:
+        """
+        Args:
+            player_index (int): The row of the player.
+
+        Returns:
+            List[Tuple[str, int]]: The decklist of the player, as returned by `get_decklist_from_url`.
+                Empty without a valid decklist.
+        """
+        start, end = self.columns["decklist_offsets"][player_index:player_index + 2]
+        card_names = self.columns["card_names"]
+        return [
+            (str(card_names[card_index]), int(quantity))
+            for card_index, quantity in zip(self.columns["decklist_cards"][start:end],
+                                            self.columns["decklist_quantities"][start:end])
+        ]
+
+
+def count_results(matches: Dict[str, np.ndarray]) -> Tuple[int, int, int]:
+    """
+    Args:
+        matches (Dict[str, np.ndarray]): Matches selected by `SeasonDataset.query_matches`.
+
+    Returns:
+        Tuple[int, int, int]: The wins, loses and ties of player1.
+    """
+    wins, loses, ties = np.bincount(matches["match_winner"], minlength=len(WINNER_TAGS))
+    return int(wins), int(loses), int(ties)
+
+
+def build_season_dataset(url_list: List[str]) -> SeasonDataset:
+    """
+    Gathers the processed data of tournaments into a dataset. Missing data is processed as by `get_matchup_table`.
+
+    Args:
+        url_list (List[str]): List of RK9 URLs. A tournament repeated in the list is stored once.
+
+    Returns:
+        SeasonDataset: The dataset.
+    """
+    url_list = list(dict.fromkeys(url_list))
+    archetype_index: Dict[str, int] = {}
+    card_index: Dict[str, int] = {}
+    player_tournament, player_names, player_archetype = [], [], []
+    decklist_offsets, decklist_cards, decklist_quantities = [0], [], []
+    match_columns = {name: [] for name in MATCH_COLUMNS}
+    page_tournament, page_urls, page_digests = [], [], []
+
+    for tournament_index, url in enumerate(url_list):
+        decklist_database = get_decklist_database_from_tournament_url(url)
+        archetype_per_player = get_archetype_per_player_from_tournament_url(url, decklist_database)
+        encoded_pairings = get_encoded_pairings(url)
+        for page_url, page_digest in encoded_pairings["page_digests"].items():
+            page_tournament.append(tournament_index)
+            page_urls.append(page_url)
+            page_digests.append(page_digest)
+
+        # Players with a decklist first, in the order `get_matchup_table` counts them, then the others
+        player_index_per_name = {}
+        playername_list = list(decklist_database["decklist_per_player"]) + [
+            playername for playername in encoded_pairings["players"]
+            if playername not in decklist_database["decklist_per_player"]
+        ]
+        for playername in playername_list:
+            player_index_per_name[playername] = len(player_names)
+            player_tournament.append(tournament_index)
+            player_names.append(playername)
+            decklist = decklist_database["decklist_per_player"].get(playername, [])
+            archetype = archetype_per_player.get(playername)
+            if archetype is None or not decklist:
+                player_archetype.append(-1)
+            else:
+                player_archetype.append(archetype_index.setdefault(", ".join(archetype), len(archetype_index)))
+            for card_name, quantity in decklist:
+                decklist_cards.append(card_index.setdefault(card_name, len(card_index)))
+                decklist_quantities.append(quantity)
+            decklist_offsets.append(len(decklist_cards))
+
+        player_row_per_pairings_index = np.array(
+            [player_index_per_name[playername] for playername in encoded_pairings["players"]], dtype=np.int32
+        )
+        for round_index, encoded_round in enumerate(encoded_pairings["rounds"]):
+            encoded_matches = np.asarray(encoded_round, dtype=np.int64).reshape(-1, 3)
+            match_columns["match_tournament"].append(np.full(len(encoded_matches), tournament_index, dtype=np.int32))
+            match_columns["match_round"].append(np.full(len(encoded_matches), round_index + 1, dtype=np.int16))
+            match_columns["match_player1"].append(player_row_per_pairings_index[encoded_matches[:, 0]])
+            match_columns["match_player2"].append(player_row_per_pairings_index[encoded_matches[:, 1]])
+            match_columns["match_winner"].append(encoded_matches[:, 2].astype(np.int8))
+
+    match_dtypes = {"match_tournament": np.int32, "match_round": np.int16, "match_player1": np.int32,
+                    "match_player2": np.int32, "match_winner": np.int8}
+    columns = {
+        "rules_version": np.array(get_rules_version()),
+        "tournament_urls": np.array(url_list, dtype=str),
+        "archetypes": np.array(list(archetype_index), dtype=str),
+        "card_names": np.array(list(card_index), dtype=str),
+        "player_tournament": np.array(player_tournament, dtype=np.int32),
+        "player_names": np.array(player_names, dtype=str),
+        "player_archetype": np.array(player_archetype, dtype=np.int32),
+        "decklist_offsets": np.array(decklist_offsets, dtype=np.int64),
+        "decklist_cards": np.array(decklist_cards, dtype=np.int32),
+        "decklist_quantities": np.array(decklist_quantities, dtype=np.int16),
+        **{name: np.concatenate(column_list) if column_list else np.zeros(0, dtype=match_dtypes[name])
+           for name, column_list in match_columns.items()},
+        "page_tournament": np.array(page_tournament, dtype=np.int32),
+        "page_urls": np.array(page_urls, dtype=str),
+        "page_digests": np.array(page_digests, dtype=str),
+    }
+    return SeasonDataset(columns)
+
+
+def get_season_dataset(url_list: List[str], path: str = SEASON_DATASET_PATH) -> SeasonDataset:
+    """
+    Loads the dataset saved on disk if it has every tournament, the current archetype rules and none of its pairing
+    pages changed. Otherwise, builds it again and saves it: only the tournaments whose pages changed are parsed again,
+    the others are loaded from the processed database.
+
+    Args:
+        url_list (List[str]): List of RK9 URLs.
+        path (str, optional): The `.npz` file of the dataset.
+
+    Returns:
+        SeasonDataset: The dataset.
+    """
+    if os.path.exists(path):
+        season_dataset = SeasonDataset.load(path)
+        if season_dataset.rules_version != get_rules_version() \
+                or not all(url in season_dataset.tournament_index for url in url_list):
+            print(f"{path} is missing tournaments or was classified with other archetype rules. Building it again")
+        else:
+            changed_url_list = [
+                url for url in url_list
+                if season_dataset.get_page_digests(url) is None
+                or not are_pages_unchanged(season_dataset.get_page_digests(url))
+            ]
+            if not changed_url_list:
+                print(f"Season dataset exists on disk. Loading from {path}")
+                return season_dataset
+            print(f"Pairings of {len(changed_url_list)} tournaments changed since {path} was built. Building it again")
+    season_dataset = build_season_dataset(url_list)
+    season_dataset.save(path)
+    return season_dataset
+
+
+if __name__ == "__main__":
+    from generate_matchup_table import RK9_URL_LIST
+
+    season_dataset = get_season_dataset(RK9_URL_LIST)
+    print(f"{len(season_dataset.tournament_urls)} tournaments, {len(season_dataset.columns['player_names'])} players, "
+          f"{len(season_dataset.columns['match_winner'])} matches, {len(season_dataset.archetypes)} archetypes")
@@ -0,0 +1,219 @@
+"""
+Tournaments loaded once per process, with their derived views computed on first use.
+
+The scripts ask the processed database for the same tournament many times: its archetypes to count the metagame,
+then again to build its matchup table, then again to print how many players played every archetype. Here, a
+`Tournament` loads each of its decklists, archetypes and pairings once, and computes each of its views once: the
+archetype counter, the repartition of the archetypes, the match history of the players and the matchup table of
+every round cutoff asked for.
+
+Tournaments are kept in a registry bounded to the `TOURNAMENT_REGISTRY_SIZE` most recently used ones, so asking for a
+tournament again in the same process reloads nothing, and costs no request. Revalidating the views checks every pairing
+page, so it is only done when asked for, with `Tournament.revalidate` or `get_tournament(url, revalidate=True)`:
+views of the pairings are dropped when a pairing page changed, and views of the archetypes when the archetype rules
+changed.
+
+Example Usage:
+    tournament = get_tournament(RK9_URL)
+    tournament.archetype_counter["charizard, pidgeot"]
+    tournament = get_tournament(RK9_URL, revalidate=True)  # Follows the pairing pages changed since
+    matchup_table = tournament.get_matchup_table(from_round_n=8)
+"""
+import threading
+from collections import Counter, OrderedDict
+from functools import cached_property
+from typing import Dict, List, Tuple
+
+from archetype_parser import get_rules_version
+from generate_matchup_table import (
+    add_tournament_matches,
+    are_pages_unchanged,
+    decode_pairings,
+    get_archetype_per_player_from_tournament_url,
+    get_decklist_database_from_tournament_url,
+    get_encoded_pairings,
+    make_matchup_table,
+)
+from match_history import PlayerMatchIndex
+from matchup_tensor import MatchupTable
+
+TOURNAMENT_REGISTRY_SIZE = 32
+# The cached views computed from the pairings, and from the archetypes
+_PAIRINGS_VIEWS = ("encoded_pairings", "round_history", "match_index")
+_ARCHETYPE_VIEWS = ("archetype_per_player", "archetype_counter", "archetype_repartition", "match_index")
+
+
+class Tournament:
+    """
+    The processed data of a tournament, loaded from the processed database on first use.
+    Its views are computed once and not revalidated on access: call `revalidate` to drop the stale ones.
+    """
+
+    def __init__(self, url: str):
+        """
+        Args:
+            url (str): The URL of the tournament.
+        """
+        self.url = url
+        self._rules_version = None
+        self._matchup_table_per_round_n: Dict[int, MatchupTable] = {}
+
+    def revalidate(self) -> bool:
+        """
+        Drops the views computed from pairing pages that changed since, or with other archetype rules.
+
+        Returns:
+            bool: True if every view was still up to date.
+        """
+        stale_view_list = []
+        encoded_pairings = self.__dict__.get("encoded_pairings")
+        if encoded_pairings is not None and not are_pages_unchanged(encoded_pairings["page_digests"]):
+            stale_view_list += _PAIRINGS_VIEWS
+        if "archetype_per_player" in self.__dict__ and self._rules_version != get_rules_version():
+            stale_view_list += _ARCHETYPE_VIEWS
+        for view in stale_view_list:
+            self.__dict__.pop(view, None)
+        if stale_view_list:
+            self._matchup_table_per_round_n.clear()
+        return not stale_view_list
+
+    @cached_property
+    def decklist_database(self) -> Dict[str, Dict]:
+        """
+        The decklists of the players, as returned by `get_decklist_database_from_tournament_url`.
+        """
+        return get_decklist_database_from_tournament_url(self.url)
+
+    @cached_property
+    def archetype_per_player(self) -> Dict[str, List[str]]:
+        """
+        The archetype of every player with a valid decklist. The decklists are only loaded if the archetypes must be
+        classified again.
+        """
+        self._rules_version = get_rules_version()
+        return get_archetype_per_player_from_tournament_url(self.url, self.__dict__.get("decklist_database"))
+
+    @cached_property
+    def encoded_pairings(self) -> Dict:
+        """
+        The pairings, as returned by `get_encoded_pairings`.
+        """
+        return get_encoded_pairings(self.url)
+
+    @cached_property
+    def round_history(self) -> List[List[Tuple[str, str, str]]]:
+        """
+        The matches of every round, as returned by `get_all_pairings_per_round`.
+        """
+        return decode_pairings(self.encoded_pairings)
+
+    @cached_property
+    def archetype_counter(self) -> Counter:
+        """
+        The number of players of every archetype, joined as in the matchup table.
+        """
+        return Counter(", ".join(archetype) for archetype in self.archetype_per_player.values())
+
+    @cached_property
+    def archetype_repartition(self) -> Dict[str, float]:
+        """
+        The share of the players of every archetype.
+        """
+        nb_players = sum(self.archetype_counter.values())
+        return {archetype: count / nb_players for archetype, count in self.archetype_counter.items()}
+
+    @cached_property
+    def match_index(self) -> PlayerMatchIndex:
+        """
+        The match history of every player.
+        """
+        return PlayerMatchIndex.from_encoded_pairings(self.encoded_pairings, self.archetype_per_player)
+
+    def get_matchup_table(self, from_round_n: int = 0) -> MatchupTable:
+        """
+        Args:
+            from_round_n (int, optional): Same as in `get_matchup_table`. Defaults to 0.
+
+        Returns:
+            MatchupTable: The matchup table of the tournament, the same as `get_matchup_table([url], from_round_n)`
+                as of the last revalidation. It is a copy, so the caller can clean it in place.
+        """
+        matchup_table = self._matchup_table_per_round_n.get(from_round_n)
+        if matchup_table is None:
+            archetype_per_player = {
+                playername: ", ".join(archetype) for playername, archetype in self.archetype_per_player.items()
+            }
+            matchup_table, archetype_index = make_matchup_table([archetype_per_player])
+            add_tournament_matches(matchup_table, archetype_index, archetype_per_player, self.encoded_pairings,
+                                    from_round_n)
+            self._matchup_table_per_round_n[from_round_n] = matchup_table
+        return MatchupTable(matchup_table.archetype_list, matchup_table.counts.copy())
+
+
+class TournamentRegistry:
+    """
+    The most recently used tournaments of the process.
+    """
+
+    def __init__(self, max_size: int = TOURNAMENT_REGISTRY_SIZE):
+        """
+        Args:
+            max_size (int, optional): The number of tournaments kept. The least recently used one is dropped first.
+        """
+        self.max_size = max_size
+        self._tournament_per_url: "OrderedDict[str, Tournament]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str, revalidate: bool = False) -> Tournament:
+        """
+        Args:
+            url (str): The URL of the tournament.
+            revalidate (bool, optional): Drop the views made stale by changed pairing pages or archetype rules.
+                It checks every pairing page of the tournament. Defaults to False.
+
+        Returns:
+            Tournament: The tournament, the same object as long as it stays in the registry.
+        """
+        with self._lock:
+            tournament = self._tournament_per_url.get(url)
+            if tournament is None:
+                tournament = self._tournament_per_url[url] = Tournament(url)
+                if len(self._tournament_per_url) > self.max_size:
+                    self._tournament_per_url.popitem(last=False)
+            else:
+                self._tournament_per_url.move_to_end(url)
+        if revalidate:
+            tournament.revalidate()
+        return tournament
+
+    def forget(self, url: str) -> None:
+        """
+        Drops a tournament, e.g. to free its memory.
+        """
+        with self._lock:
+            self._tournament_per_url.pop(url, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tournament_per_url.clear()
+
+    def __contains__(self, url: str) -> bool:
+        return url in self._tournament_per_url
+
+    def __len__(self) -> int:
+        return len(self._tournament_per_url)
+
+
+tournament_registry = TournamentRegistry()
+
+
+def get_tournament(url: str, revalidate: bool = False) -> Tournament:
+    """
+    Args:
+        url (str): The URL of the tournament.
+        revalidate (bool, optional): Same as in `TournamentRegistry.get`. Defaults to False.
+
+    Returns:
+        Tournament: The tournament from the registry of the process.
+    """
+    return tournament_registry.get(url, revalidate)
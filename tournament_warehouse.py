@@ -0,0 +1,394 @@
+"""
+SQLite warehouse of the rosters, decklists, archetypes and matches of many tournaments.
+
+The processed database has one pickle per tournament and per kind of data, so every question about many tournaments
+loads them all and loops over them. Here, they are ingested once into indexed SQLite tables, and questions become
+queries:
+    tournaments: url, the version of the archetype rules of its archetypes, when it was ingested
+    archetypes: name, joined as in the matchup table, e.g. "gardevoir, drifloon"
+    players: tournament, name, archetype (NULL without a valid decklist), position in the roster, decklist URL
+    cards: name, set and type of every card, as in the card catalog
+    decklist_cards: player, card, quantity
+    rounds: tournament, round (from 1), digest of its matches
+    matches: tournament, round, table, player1, player2, winner (index of the winner tag in `WINNER_TAGS`)
+Tournaments, rounds, players and archetypes are indexed.
+
+Ingestion is incremental and idempotent: decklists are ingested with their tournament, archetypes again when the
+archetype rules changed, and a round only when it is new or its matches changed.
+
+Usage:
+    python tournament_warehouse.py [URL ...] [--url-file urls.txt] [--database processed_database/warehouse.sqlite]
+Without URLs, the tournaments of `RK9_URL_LIST` are ingested.
+
+Example Usage:
+    warehouse = TournamentWarehouse()
+    warehouse.ingest(RK9_URL_LIST)
+    matchup_table = warehouse.get_matchup_table(RK9_URL_LIST, from_round_n=8)
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import instrumentation
+from archetype_parser import get_rules_version
+from card_catalog import card_catalog
+from generate_matchup_table import (
+    RK9_URL_LIST,
+    get_archetype_list,
+    get_archetype_per_player_from_tournament_url,
+    get_decklist_database_from_tournament_url,
+    get_encoded_pairings,
+    read_url_file,
+)
+from matchup_tensor import MatchupTable
+
+WAREHOUSE_PATH = os.path.join("processed_database", "warehouse.sqlite")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tournaments (
+    tournament_id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    rules_version TEXT NOT NULL,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archetypes (
+    archetype_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS players (
+    player_id INTEGER PRIMARY KEY,
+    tournament_id INTEGER NOT NULL REFERENCES tournaments,
+    name TEXT NOT NULL,
+    archetype_id INTEGER REFERENCES archetypes,
+    position INTEGER,
+    decklist_url TEXT,
+    UNIQUE (tournament_id, name)
+);
+CREATE INDEX IF NOT EXISTS players_by_name ON players (name);
+CREATE INDEX IF NOT EXISTS players_by_archetype ON players (archetype_id, tournament_id);
+CREATE TABLE IF NOT EXISTS cards (
+    card_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    card_set TEXT NOT NULL,
+    card_type TEXT NOT NULL,
+    UNIQUE (name, card_set, card_type)
+);
+CREATE TABLE IF NOT EXISTS decklist_cards (
+    player_id INTEGER NOT NULL REFERENCES players,
+    card_id INTEGER NOT NULL REFERENCES cards,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (player_id, card_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS decklist_cards_by_card ON decklist_cards (card_id);
+CREATE TABLE IF NOT EXISTS rounds (
+    tournament_id INTEGER NOT NULL REFERENCES tournaments,
+    round_n INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (tournament_id, round_n)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS matches (
+    tournament_id INTEGER NOT NULL REFERENCES tournaments,
+    round_n INTEGER NOT NULL,
+    table_n INTEGER NOT NULL,
+    player1_id INTEGER NOT NULL REFERENCES players,
+    player2_id INTEGER NOT NULL REFERENCES players,
+    winner INTEGER NOT NULL,
+    PRIMARY KEY (tournament_id, round_n, table_n)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS matches_by_player1 ON matches (player1_id);
+CREATE INDEX IF NOT EXISTS matches_by_player2 ON matches (player2_id);
+"""
+
+
+class TournamentWarehouse:
+    """
+    The tournaments ingested in a SQLite file.
+    """
+
+    def __init__(self, path: str = WAREHOUSE_PATH):
+        """
+        Args:
+            path (str, optional): The path of the SQLite file. It is created on first use.
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def _get_tournament_id(self, url: str) -> Optional[int]:
+        row = self.connection.execute("SELECT tournament_id FROM tournaments WHERE url = ?", (url,)).fetchone()
+        return None if row is None else row[0]
+
+    def _get_archetype_id(self, archetype: List[str]) -> int:
+        name = ", ".join(archetype)
+        self.connection.execute("INSERT OR IGNORE INTO archetypes (name) VALUES (?)", (name,))
+        return self.connection.execute("SELECT archetype_id FROM archetypes WHERE name = ?", (name,)).fetchone()[0]
+
+    def _get_warehouse_card_ids(self, card_id_list: List[int]) -> Dict[int, int]:
+        """
+        Args:
+            card_id_list (List[int]): Ids of cards in `card_catalog`.
+
+        Returns:
+            Dict[int, int]: The id of every card in the cards table, inserting the missing ones.
+        """
+        warehouse_card_id_per_card_id = {}
+        for card_id in card_id_list:
+            card = card_catalog.get_card(card_id)
+            self.connection.execute("INSERT OR IGNORE INTO cards (name, card_set, card_type) VALUES (?, ?, ?)", card)
+            warehouse_card_id_per_card_id[card_id] = self.connection.execute(
+                "SELECT card_id FROM cards WHERE name = ? AND card_set = ? AND card_type = ?", card
+            ).fetchone()[0]
+        return warehouse_card_id_per_card_id
+
+    def _ingest_players(self, tournament_id: int, decklist_database: Dict[str, Dict],
+                        archetype_per_player: Dict[str, List[str]]) -> int:
+        """
+        Inserts the players of a new tournament, with their decklists and archetypes.
+
+        Returns:
+            int: The number of players inserted.
+        """
+        record_per_player = decklist_database["player_record_per_player"]
+        warehouse_card_id_per_card_id = self._get_warehouse_card_ids(
+            list({card_id for record in record_per_player.values() for card_id in record.card_ids})
+        )
+        decklist_url_per_player = decklist_database["decklist_url_per_player"]
+        # Classified players first, in the order `get_matchup_table` counts their archetypes
+        playername_list = list(dict.fromkeys([*archetype_per_player, *decklist_url_per_player]))
+        for position, playername in enumerate(playername_list):
+            archetype = archetype_per_player.get(playername)
+            decklist_url = decklist_url_per_player.get(playername)
+            player_id = self.connection.execute(
+                "INSERT INTO players (tournament_id, name, archetype_id, position, decklist_url) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (tournament_id, playername, None if archetype is None else self._get_archetype_id(archetype),
+                 position, decklist_url),
+            ).lastrowid
+            record = record_per_player.get(playername)
+            if record is not None:
+                self.connection.executemany(
+                    "INSERT INTO decklist_cards (player_id, card_id, quantity) VALUES (?, ?, ?)",
+                    [(player_id, warehouse_card_id_per_card_id[card_id], quantity)
+                     for card_id, quantity in zip(record.card_ids, record.quantities)],
+                )
+        return len(playername_list)
+
+    def _update_archetypes(self, tournament_id: int, archetype_per_player: Dict[str, List[str]]) -> None:
+        """
+        Classifies the players of a tournament again, after the archetype rules changed.
+        """
+        self.connection.execute("UPDATE players SET archetype_id = NULL WHERE tournament_id = ?", (tournament_id,))
+        self.connection.executemany(
+            "UPDATE players SET archetype_id = ? WHERE tournament_id = ? AND name = ?",
+            [(self._get_archetype_id(archetype), tournament_id, playername)
+             for playername, archetype in archetype_per_player.items()],
+        )
+
+    def _get_player_ids(self, tournament_id: int, playername_list: List[str]) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: The id of every player, inserting the players of the pairings missing from the roster.
+        """
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO players (tournament_id, name) VALUES (?, ?)",
+            [(tournament_id, playername) for playername in playername_list],
+        )
+        player_id_per_name = dict(self.connection.execute(
+            "SELECT name, player_id FROM players WHERE tournament_id = ?", (tournament_id,)
+        ))
+        return np.array([player_id_per_name[playername] for playername in playername_list], dtype=np.int64)
+
+    def _ingest_rounds(self, tournament_id: int, encoded_pairings: Dict) -> int:
+        """
+        Inserts the rounds of a tournament that are new or whose matches changed, and deletes the rounds that are
+        not in the pairings anymore.
+
+        Returns:
+            int: The number of rounds inserted.
+        """
+        player_ids = self._get_player_ids(tournament_id, encoded_pairings["players"])
+        digest_per_round = dict(self.connection.execute(
+            "SELECT round_n, digest FROM rounds WHERE tournament_id = ?", (tournament_id,)
+        ))
+        nb_rounds_ingested = 0
+        for round_n, encoded_round in enumerate(encoded_pairings["rounds"], start=1):
+            encoded_matches = np.asarray(encoded_round, dtype=np.int64).reshape(-1, 3)
+            match_rows = np.column_stack((
+                player_ids[encoded_matches[:, 0]], player_ids[encoded_matches[:, 1]], encoded_matches[:, 2]
+            ))
+            digest = hashlib.sha1(match_rows.tobytes()).hexdigest()
+            if digest_per_round.get(round_n) == digest:
+                continue
+            self.connection.execute("DELETE FROM matches WHERE tournament_id = ? AND round_n = ?",
+                                    (tournament_id, round_n))
+            self.connection.executemany(
+                "INSERT INTO matches (tournament_id, round_n, table_n, player1_id, player2_id, winner) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(tournament_id, round_n, table_n, *match_row)
+                 for table_n, match_row in enumerate(match_rows.tolist(), start=1)],
+            )
+            self.connection.execute("INSERT OR REPLACE INTO rounds (tournament_id, round_n, digest) VALUES (?, ?, ?)",
+                                    (tournament_id, round_n, digest))
+            nb_rounds_ingested += 1
+        nb_rounds = len(encoded_pairings["rounds"])
+        self.connection.execute("DELETE FROM matches WHERE tournament_id = ? AND round_n > ?", (tournament_id, nb_rounds))
+        self.connection.execute("DELETE FROM rounds WHERE tournament_id = ? AND round_n > ?", (tournament_id, nb_rounds))
+        return nb_rounds_ingested
+
+    def ingest_tournament(self, url: str) -> Dict[str, int]:
+        """
+        Ingests what is new of a tournament, in one transaction. Missing data is processed as by `get_matchup_table`,
+        before the transaction, so the database is only locked while writing.
+
+        Args:
+            url (str): The URL of the tournament.
+
+        Returns:
+            Dict[str, int]: `{"players": nb players inserted, "rounds": nb rounds inserted}`.
+        """
+        rules_version = get_rules_version()
+        result = {"players": 0, "rounds": 0}
+        # Tournaments are never removed: one ingested now is still there in the transaction
+        decklist_database = None
+        if self._get_tournament_id(url) is None:
+            decklist_database = get_decklist_database_from_tournament_url(url)
+        archetype_per_player = get_archetype_per_player_from_tournament_url(url, decklist_database)
+        encoded_pairings = get_encoded_pairings(url)
+
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            tournament_id = self._get_tournament_id(url)
+            if tournament_id is None:
+                tournament_id = self.connection.execute(
+                    "INSERT INTO tournaments (url, rules_version, ingested_at) VALUES (?, ?, ?)",
+                    (url, rules_version, time.time()),
+                ).lastrowid
+                result["players"] = self._ingest_players(tournament_id, decklist_database, archetype_per_player)
+            elif self.connection.execute("SELECT rules_version FROM tournaments WHERE tournament_id = ?",
+                                         (tournament_id,)).fetchone()[0] != rules_version:
+                self._update_archetypes(tournament_id, archetype_per_player)
+            result["rounds"] = self._ingest_rounds(tournament_id, encoded_pairings)
+            self.connection.execute("UPDATE tournaments SET rules_version = ?, ingested_at = ? WHERE tournament_id = ?",
+                                    (rules_version, time.time(), tournament_id))
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+        instrumentation.count("warehouse.rounds_ingested", result["rounds"])
+        return result
+
+    def ingest(self, url_list: List[str]) -> Dict[str, Dict[str, int]]:
+        """
+        Args:
+            url_list (List[str]): List of RK9 URLs.
+
+        Returns:
+            Dict[str, Dict[str, int]]: What was inserted for every tournament, see `ingest_tournament`.
+        """
+        result_per_url = {}
+        for url in url_list:
+            result_per_url[url] = result = self.ingest_tournament(url)
+            print(f"Ingested {url}: {result['players']} new players, {result['rounds']} new rounds")
+        return result_per_url
+
+    def _get_tournament_ids(self, url_list: List[str]) -> List[int]:
+        tournament_id_list = []
+        for url in dict.fromkeys(url_list):
+            tournament_id = self._get_tournament_id(url)
+            if tournament_id is None:
+                raise KeyError(f"{url} is not in the warehouse {self.path}, ingest it first")
+            tournament_id_list.append(tournament_id)
+        return tournament_id_list
+
+    def get_archetype_counter(self, url_list: List[str]) -> Counter:
+        """
+        Args:
+            url_list (List[str]): The tournaments to count. A tournament repeated in the list is counted once.
+
+        Returns:
+            Counter: The number of players of every archetype, in the order `get_matchup_table` finds them.
+        """
+        archetype_counter = Counter()
+        for tournament_id in self._get_tournament_ids(url_list):
+            for archetype, count in self.connection.execute(
+                "SELECT archetypes.name, COUNT(*) FROM players JOIN archetypes USING (archetype_id) "
+                "WHERE players.tournament_id = ? GROUP BY archetype_id ORDER BY MIN(players.position)",
+                (tournament_id,),
+            ):
+                archetype_counter[archetype] += count
+        return archetype_counter
+
+    def get_matchup_table(self, url_list: List[str], from_round_n: int = 0) -> MatchupTable:
+        """
+        Generate the same matchup table as `get_matchup_table`, counting the matches with one GROUP BY query.
+
+        Args:
+            url_list (List[str]): The tournaments of the table. A tournament repeated in the list is counted once.
+            from_round_n (int, optional): Only the rounds up to this one are counted, like in `get_matchup_table`.
+
+        Returns:
+            MatchupTable: The matchup table of all archetypes.
+        """
+        tournament_id_list = self._get_tournament_ids(url_list)
+        matchup_table = MatchupTable(get_archetype_list(self.get_archetype_counter(url_list)))
+        rows = self.connection.execute(
+            "SELECT archetype1.name, archetype2.name, matches.winner, COUNT(*) "
+            "FROM matches "
+            "JOIN players AS player1 ON player1.player_id = matches.player1_id "
+            "JOIN players AS player2 ON player2.player_id = matches.player2_id "
+            "JOIN archetypes AS archetype1 ON archetype1.archetype_id = player1.archetype_id "
+            "JOIN archetypes AS archetype2 ON archetype2.archetype_id = player2.archetype_id "
+            f"WHERE matches.tournament_id IN ({', '.join('?' * len(tournament_id_list))}) AND matches.round_n <= ? "
+            "GROUP BY player1.archetype_id, player2.archetype_id, matches.winner",
+            (*tournament_id_list, from_round_n),
+        ).fetchall()
+        if not rows:
+            return matchup_table
+
+        unown_index = matchup_table.archetype_index.get("unown")
+        archetype1_names, archetype2_names, winner_indices, nb_matches = zip(*rows)
+        matchup_table.add_matches(
+            [matchup_table.archetype_index.get(archetype, unown_index) for archetype in archetype1_names],
+            [matchup_table.archetype_index.get(archetype, unown_index) for archetype in archetype2_names],
+            winner_indices,
+            nb_matches,
+        )
+        return matchup_table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("urls", nargs="*", help="URLs of the tournaments.")
+    parser.add_argument("--url-file", help="Text file with one tournament URL per line.")
+    parser.add_argument("--database", default=WAREHOUSE_PATH, help="SQLite file of the warehouse.")
+    args = parser.parse_args()
+
+    url_list = list(args.urls)
+    if args.url_file is not None:
+        url_list += read_url_file(args.url_file)
+    if not url_list:
+        url_list = RK9_URL_LIST
+
+    warehouse = TournamentWarehouse(args.database)
+    try:
+        warehouse.ingest(url_list)
+    finally:
+        warehouse.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Live-tournament watch mode.
+
+During a tournament, the matchup table is kept up to date without rebuilding it: the watcher polls the latest round
+of the tournament and adds the matches finished since the last poll to a matchup table persisted in the processed
+database. The HTML page is rendered again only when new matches were added.
+
+A poll revalidates the tournament page, which tells the rounds played so far. Only if it changed, the pairing page
+of the latest round is revalidated too, unless its matches are embedded in the tournament page. When a new round
+starts, the previous round is polled one last time to catch its last matches. A round is parsed only if its page changed since the last poll,
+and only its matches not counted yet are added to the table.
+
+Constants:
+    RK9_URL (str): URL of the tournament to watch.
+    POLL_INTERVAL_SECONDS (float): Time between two polls.
+    WATCH_CACHE_POLICY (CachePolicy): Cache policy of the polled pages: always revalidated.
+
+Execution:
+    When executed directly, the script watches the tournament of RK9_URL and keeps matchups.html up to date,
+    until interrupted with Ctrl+C.
+"""
+import os
+import pickle
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from archetype_parser import get_rules_version
+from download_manager import CachePolicy, get_url, get_url_digest
+from generate_matchup_table import (
+    WINNER_TAGS,
+    discover_pairing_rounds,
+    get_archetype_list,
+    get_archetype_per_player_from_tournament_url,
+    get_pairing_round_urls,
+    get_processed_database_path,
+    remove_low_occurrences,
+)
+from matchup_html import export_matchup_table_html
+from matchup_tensor import MatchupTable
+from page_parser import parse_pairings_page
+
+RK9_URL = "https://rk9.gg/pairings/WCS01mIMYt8if4wVuaO0" # Worlds
+POLL_INTERVAL_SECONDS = 60.
+WATCH_CACHE_POLICY = CachePolicy("revalidate", max_age=0.)
+
+
+class TournamentWatcher:
+    """
+    The matchup table of a tournament in progress, updated round after round.
+    """
+
+    def __init__(self, url: str, max_round_n: Optional[int] = None):
+        """
+        Loads the state of the watcher from the processed database, or starts from an empty table.
+
+        Args:
+            url (str): The URL of the tournament.
+            max_round_n (Optional[int], optional): Only the rounds up to this one are counted,
+                e.g. 8 to keep day 1 only. Defaults to every round.
+        """
+        self.url = url
+        self.max_round_n = max_round_n
+        self.path_on_disk = get_processed_database_path(url, ".watch.pkl")
+
+        archetype_per_player = {
+            playername: ", ".join(archetype)
+            for playername, archetype in get_archetype_per_player_from_tournament_url(url).items()
+        }
+        self.matchup_table = MatchupTable(get_archetype_list(Counter(archetype_per_player.values())))
+        self.archetype_index_per_player = {
+            playername: self.matchup_table.archetype_index.get(
+                archetype, self.matchup_table.archetype_index.get("unown"))
+            for playername, archetype in archetype_per_player.items()
+        }
+
+        # First round that may still get new matches
+        self.current_round_n = 1
+        self.number_of_rounds = 0
+        self.embedded_round_set: Set[int] = set()
+        self.counted_pairs_per_round: Dict[int, Set[Tuple[str, str]]] = {}
+        self.page_digest_per_url: Dict[str, str] = {}
+        self._load()
+
+    def _load(self) -> None:
+        """
+        Loads the saved state, unless it was computed with other archetype rules or for other rounds.
+        """
+        if not os.path.exists(self.path_on_disk):
+            return
+        with open(self.path_on_disk, "rb") as f:
+            state = pickle.load(f)
+        if (state["rules_version"] != get_rules_version()
+                or state["max_round_n"] != self.max_round_n
+                or state["archetype_list"] != self.matchup_table.archetype_list):
+            print("The saved matchup table is outdated, starting from scratch")
+            return
+        print(f"Matchup table of the tournament loaded from {self.path_on_disk}")
+        self.matchup_table.counts = state["counts"]
+        self.current_round_n = state["current_round_n"]
+        self.number_of_rounds = state["number_of_rounds"]
+        self.embedded_round_set = state["embedded_round_set"]
+        self.counted_pairs_per_round = state["counted_pairs_per_round"]
+        self.page_digest_per_url = state["page_digest_per_url"]
+
+    def save(self) -> None:
+        """
+        Saves the state of the watcher in the processed database.
+        """
+        state = {
+            "rules_version": get_rules_version(),
+            "max_round_n": self.max_round_n,
+            "archetype_list": self.matchup_table.archetype_list,
+            "counts": self.matchup_table.counts,
+            "current_round_n": self.current_round_n,
+            "number_of_rounds": self.number_of_rounds,
+            "embedded_round_set": self.embedded_round_set,
+            "counted_pairs_per_round": self.counted_pairs_per_round,
+            "page_digest_per_url": self.page_digest_per_url,
+        }
+        os.makedirs(os.path.dirname(self.path_on_disk), exist_ok=True)
+        with open(self.path_on_disk, "wb") as f:
+            pickle.dump(state, f)
+
+    def _has_changed(self, url: str) -> bool:
+        """
+        Revalidates a page, and remembers its digest.
+
+        Args:
+            url (str): The URL of the page.
+
+        Returns:
+            bool: True if the page changed since the last poll.
+        """
+        page_digest = get_url_digest(url, WATCH_CACHE_POLICY)
+        if self.page_digest_per_url.get(url) == page_digest:
+            return False
+        self.page_digest_per_url[url] = page_digest
+        return True
+
+    def _add_new_matches(self, round_n: int, match_list: List[Tuple[str, str, str]]) -> int:
+        """
+        Adds the matches of a round not counted yet to the matchup table.
+
+        Args:
+            round_n (int): The number of the round.
+            match_list (List[Tuple[str, str, str]]): The finished matches of the round.
+
+        Returns:
+            int: The number of matches added to the table.
+        """
+        counted_pairs = self.counted_pairs_per_round.setdefault(round_n, set())
+        new_matches = []
+        for player_name1, player_name2, winner_tag in match_list:
+            if (player_name1, player_name2) in counted_pairs:
+                continue
+            counted_pairs.add((player_name1, player_name2))
+            if player_name1 in self.archetype_index_per_player and player_name2 in self.archetype_index_per_player:
+                new_matches.append((
+                    self.archetype_index_per_player[player_name1],
+                    self.archetype_index_per_player[player_name2],
+                    WINNER_TAGS.index(winner_tag),
+                ))
+        if new_matches:
+            encoded_matches = np.array(new_matches, dtype=np.int64)
+            self.matchup_table.add_matches(encoded_matches[:, 0], encoded_matches[:, 1], encoded_matches[:, 2])
+        return len(new_matches)
+
+    def poll(self) -> int:
+        """
+        Adds the matches finished since the last poll to the matchup table.
+
+        Returns:
+            int: The number of matches added to the table.
+        """
+        # RK9 updates the tournament page with every result: unchanged, there is no new match to look for
+        if not self._has_changed(self.url):
+            return 0
+        round_url_list, match_list_per_embedded_round = discover_pairing_rounds(self.url)
+        self.number_of_rounds = len(round_url_list)
+        self.embedded_round_set = {round_index + 1 for round_index in match_list_per_embedded_round}
+        round_n = self.number_of_rounds
+        if self.max_round_n is not None:
+            round_n = min(round_n, self.max_round_n)
+
+        nb_new_matches = 0
+        for polled_round_n in range(self.current_round_n, round_n + 1):
+            if polled_round_n in self.embedded_round_set:
+                # Embedded in the tournament page, parsed above
+                match_list = match_list_per_embedded_round.get(polled_round_n - 1, [])
+            else:
+                round_url = get_pairing_round_urls(self.url, polled_round_n)[-1]
+                if not self._has_changed(round_url):
+                    continue
+                match_list = parse_pairings_page(get_url(round_url))
+            nb_new_matches += self._add_new_matches(polled_round_n, match_list)
+
+        # Rounds before the latest one are over
+        for finished_round_n in range(self.current_round_n, round_n):
+            self.counted_pairs_per_round.pop(finished_round_n, None)
+        self.current_round_n = max(self.current_round_n, round_n)
+        return nb_new_matches
+
+    def render(self, output_path: str = "matchups.html", nb_occurence_min: int = 1) -> None:
+        """
+        Renders the matchup table as an HTML table.
+
+        Args:
+            output_path (str, optional): The HTML file to write. Defaults to "matchups.html".
+            nb_occurence_min (int, optional): Minimum number of matches to show a matchup.
+        """
+        matchup_table = MatchupTable(self.matchup_table.archetype_list, self.matchup_table.counts.copy())
+        matchup_table = remove_low_occurrences(matchup_table, nb_occurence_min=nb_occurence_min)
+        export_matchup_table_html(matchup_table, output_path, title="Matchups of the tournament in progress")
+
+
+def watch_tournament(url: str,
+                     output_path: str = "matchups.html",
+                     poll_interval: float = POLL_INTERVAL_SECONDS,
+                     max_round_n: Optional[int] = None) -> None:
+    """
+    Keeps the HTML matchup table of a tournament in progress up to date, until interrupted.
+
+    Args:
+        url (str): The URL of the tournament.
+        output_path (str, optional): The HTML file to write. Defaults to "matchups.html".
+        poll_interval (float, optional): Time between two polls, in seconds.
+        max_round_n (Optional[int], optional): Only the rounds up to this one are counted. Defaults to every round.
+    """
+    watcher = TournamentWatcher(url, max_round_n)
+    watcher.render(output_path)
+    while True:
+        nb_new_matches = watcher.poll()
+        if nb_new_matches > 0:
+            print(f"Round {watcher.current_round_n}: {nb_new_matches} new matches, updating {output_path}")
+            watcher.save()
+            watcher.render(output_path)
+        time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    try:
+        watch_tournament(RK9_URL)
+    except KeyboardInterrupt:
+        print("Stopped watching the tournament")
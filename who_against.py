@@ -1,22 +1,47 @@
+"""
+Who a player played against, and what the player lost to.
 
+Usage:
+    python who_against.py "Player Name [COUNTRY]" [...] [--url RK9_TOURNAMENT_URL]
+"""
+import argparse
+from typing import List
 
-from generate_matchup_table import (
-    get_all_pairings_per_round,
-    get_players_decklist_infos_from_tournament_url,
-)
+from match_history import PlayerMatchIndex, get_match_index
 
 RK9_TOURNAMENT_URL = "https://rk9.gg/pairings/LA01mwu6ugCwMEJxWT2H"
 
 
+def print_match_history(match_index: PlayerMatchIndex, playername: str) -> None:
+    """
+    Prints the matches of a player, then the archetypes the player lost to.
+
+    Args:
+        match_index (PlayerMatchIndex): The index of the tournament.
+        playername (str): The name of the player.
+    """
+    print(f"{playername} ({match_index.get_archetype(playername) or 'no decklist'})")
+    for match in match_index.get_match_history(playername):
+        print(f"    round {match.round_n:2}: {match.result:4} against {match.opponent} "
+              f"({match.opponent_archetype or 'no decklist'})")
+    lost_to_list: List[str] = [
+        match.opponent_archetype or "no decklist" for match in match_index.get_opponents_by_result(playername, "lose")
+    ]
+    print(f"    lost to: {', '.join(lost_to_list) or 'nobody'}")
+
 
 def main():
-    player_database = get_players_decklist_infos_from_tournament_url(RK9_TOURNAMENT_URL)
-    player_list = player_database.keys()
-    pairing_list = get_all_pairings_per_round(RK9_TOURNAMENT_URL)
-    match_history_per_player = dict.fromkeys(player_list, value={})
-    for round_n, round_pairings in enumerate(pairing_list):
-        print(round_pairings)
-        exit()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("players", nargs="+", help="Names of the players, e.g. \"Player Name [COUNTRY]\".")
+    parser.add_argument("--url", default=RK9_TOURNAMENT_URL, help="URL of the tournament.")
+    args = parser.parse_args()
+
+    match_index = get_match_index(args.url)
+    for playername in args.players:
+        if playername not in match_index:
+            print(f"{playername} is not in the pairings of {args.url}")
+            continue
+        print_match_history(match_index, playername)
 
 
 if __name__ == "__main__":